@@ -0,0 +1,72 @@
+# bench_concurrency.py
+# Throughput and latency of /query with many parallel clients, driven through
+# the ASGI app in-process. The result cache is switched off so every request
+# reaches SQLite; the template used (6.1) is not served by the cube.
+#
+#   CMS_DATA_DIR=./data CMS_DB_POOL_SIZE=1 python benchmarks/bench_concurrency.py
+#   CMS_DATA_DIR=./data CMS_DB_POOL_SIZE=8 python benchmarks/bench_concurrency.py
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("RESULT_CACHE_ENTRIES", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+import db  # noqa: E402
+from auth import create_access_token  # noqa: E402
+from main import app  # noqa: E402
+
+
+async def client_loop(client, headers, crews, month, requests, latencies, domain, sub):
+    for i in range(requests):
+        body = {"crew_id": crews[i % len(crews)], "month": month, "domain": domain, "sub": sub}
+        start = time.perf_counter()
+        response = await client.post("/query", json=body, headers=headers)
+        latencies.append((time.perf_counter() - start) * 1000)
+        response.raise_for_status()
+
+
+async def run(clients: int, requests: int, domain: str, sub: str) -> dict:
+    with db.read_connection() as conn:
+        month, = conn.execute("SELECT MAX(MONTH) FROM full_data").fetchone()
+        crews = [r[0] for r in conn.execute(
+            "SELECT DISTINCT CREW_ID_V FROM full_data WHERE MONTH = ? LIMIT 1000", (month,))]
+    headers = {"Authorization": "Bearer " + create_access_token({"sub": "admin"})}
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            client_loop(client, headers, crews[c:] + crews[:c], month, requests, latencies, domain, sub)
+            for c in range(clients)
+        ))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "pool_size": db.POOL_SIZE,
+        "clients": clients,
+        "requests": len(latencies),
+        "req_per_s": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p99_ms": round(latencies[int(0.99 * (len(latencies) - 1))], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/query throughput under parallel clients")
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=20, help="Requests per client")
+    parser.add_argument("--domain", default="6")
+    parser.add_argument("--sub", default="1")
+    args = parser.parse_args()
+    print(asyncio.run(run(args.clients, args.requests, args.domain, args.sub)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# bench_intent.py
+# Hit rate and accuracy of the intent fast path on a labelled question set, and
+# its p50/p99 latency next to a T5 generate (when a model is available).
+#
+#   python benchmarks/bench_intent.py
+#   NL2SQL_MODEL_DIR=./t5_sql_finetuned python benchmarks/bench_intent.py --with-model
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intent import IntentIndex  # noqa: E402
+
+# (question, expected (domain, sub) or None when it should go to the model)
+QUESTIONS = [
+    ("what is my total kms this month", ("3", "1")),
+    ("kms", ("3", "1")),
+    ("how many kilometres did I run", ("3", "1")),
+    ("footplate km", ("3", "2")),
+    ("freight kms", ("3", "3")),
+    ("coach km", ("3", "6")),
+    ("off duty kms", ("3", "7")),
+    ("spare kms", ("2", "5")),
+    ("show my sick leave", ("1", "1")),
+    ("absent days", ("1", "2")),
+    ("how many leave days did I take", ("1", "4")),
+    ("total leave", ("1", "5")),
+    ("total duty", ("2", "1")),
+    ("night duty", ("2", "7")),
+    ("how many nights did I work", ("2", "7")),
+    ("breach of rest count", ("2", "6")),
+    ("what was my RRA", ("2", "9")),
+    ("shunting duty count", ("2", "11")),
+    ("number of trips", ("4", "1")),
+    ("trip count", ("4", "2")),
+    ("my designation and cadre", ("5", "1")),
+    ("inactive status reason", ("5", "4")),
+    ("monthly trend", ("6", "2")),
+    ("national holidays", ("6", "3")),
+    ("which crew ran the most kms at BSP", None),
+    ("top 10 crew by total duty", None),
+    ("crew with total kms above 5000", None),
+    ("list all crew at TDL sorted by duty", None),
+    ("hello there", None),
+]
+
+
+def percentile(values: list[float], pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def time_calls(fn, inputs, repeat: int) -> list[float]:
+    latencies = []
+    for _ in range(repeat):
+        for text in inputs:
+            start = time.perf_counter()
+            fn(text)
+            latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Intent fast path hit rate and latency")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--with-model", action="store_true", help="Also time nlp_model.nl_to_sql")
+    args = parser.parse_args()
+
+    index = IntentIndex()
+    hits = correct = wrong = 0
+    for question, expected in QUESTIONS:
+        result = index.classify(question)
+        got = result[:2] if result else None
+        hits += got is not None
+        correct += got is not None and got == expected
+        wrong += got is not None and got != expected
+        if got != expected:
+            print(f"  mismatch: {question!r}: expected {expected}, got {got}")
+    routable = sum(expected is not None for _, expected in QUESTIONS)
+    print(f"hit rate {hits / len(QUESTIONS):.1%} ({hits}/{len(QUESTIONS)}), "
+          f"recall on template questions {correct / routable:.1%}, wrong routes {wrong}")
+
+    questions = [q for q, _ in QUESTIONS]
+    fast = time_calls(index.classify, questions, args.repeat)
+    print(f"intent  p50 {percentile(fast, 50):8.3f} ms  p99 {percentile(fast, 99):8.3f} ms")
+
+    if args.with_model:
+        import nlp_model
+
+        nlp_model.load_model()
+        # Bypass the LRU cache so every call pays for generation.
+        model_calls = time_calls(lambda q: nlp_model.generate_batch([q]), questions, 1)
+        print(f"T5      p50 {percentile(model_calls, 50):8.3f} ms  p99 {percentile(model_calls, 99):8.3f} ms")
+        print(f"p50 saved per hit: {percentile(model_calls, 50) - percentile(fast, 50):.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# bench_month_index.py
+# Per-query latency of the crew/month filter as full_data grows, comparing the
+# old STRFTIME predicate on an unindexed table with the materialized MONTH
+# column and the (CREW_ID_V, MONTH) index that db.py now builds.
+#
+#   python benchmarks/bench_month_index.py --rows 10000 100000 1000000
+
+import argparse
+import random
+import sqlite3
+import time
+
+OLD_SQL = ("SELECT SUM(TOTAL_KMS) AS TOTAL_KMS FROM full_data "
+           "WHERE CREW_ID_V = :crew_id AND STRFTIME('%Y-%m', DATE_TIME_D) = :month")
+NEW_SQL = ("SELECT SUM(TOTAL_KMS) AS TOTAL_KMS FROM full_data "
+           "WHERE CREW_ID_V = :crew_id AND MONTH = :month")
+MONTHS = ["2025-02", "2025-03", "2025-04", "2025-05", "2025-06"]
+
+
+def build_table(rows: int, crews: int, indexed: bool) -> sqlite3.Connection:
+    rng = random.Random(0)
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE full_data (CREW_ID_V TEXT, DATE_TIME_D TIMESTAMP, MONTH TEXT, TOTAL_KMS INTEGER)")
+    batch = []
+    for _ in range(rows):
+        month = rng.choice(MONTHS)
+        batch.append((f"TDL{rng.randrange(crews)}", f"{month}-{rng.randint(1, 28):02d} 10:00:00",
+                      month, rng.randint(0, 10000)))
+    conn.executemany("INSERT INTO full_data VALUES (?, ?, ?, ?)", batch)
+    if indexed:
+        conn.execute("CREATE INDEX idx_full_data_crew_month ON full_data (CREW_ID_V, MONTH)")
+        conn.execute("ANALYZE")
+    return conn
+
+
+def time_query(conn: sqlite3.Connection, sql: str, crews: int, repeat: int) -> float:
+    rng = random.Random(1)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        params = {"crew_id": f"TDL{rng.randrange(crews)}", "month": rng.choice(MONTHS)}
+        conn.execute(sql, params).fetchall()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crew/month filter latency vs. row count")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--crews", type=int, default=4000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'strftime (ms)':>15} {'indexed (ms)':>15} {'speedup':>9}")
+    for rows in args.rows:
+        old = time_query(build_table(rows, args.crews, indexed=False), OLD_SQL, args.crews, args.repeat)
+        new = time_query(build_table(rows, args.crews, indexed=True), NEW_SQL, args.crews, args.repeat)
+        print(f"{rows:>10} {old:>15.3f} {new:>15.3f} {old / new:>8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+# bench_nl2sql_batching.py
+# CPU throughput of nlp_model.nl_to_sql under concurrent load, per micro-batch size.
+# Every request uses a distinct question so the LRU cache is bypassed.
+#
+#   NL2SQL_MODEL_DIR=./t5_sql_finetuned python benchmarks/bench_nl2sql_batching.py --batch-sizes 1 4 8 16
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import nlp_model  # noqa: E402
+
+QUESTIONS = [
+    "total kms of crew {i} in june",
+    "night duty minutes for crew {i}",
+    "how many leave days did crew {i} take",
+    "footplate kms for crew {i} last month",
+]
+
+
+def run(batch_size: int, requests: int, clients: int, wait_ms: float) -> float:
+    nlp_model._batcher.max_batch_size = batch_size
+    nlp_model._batcher.max_wait_ms = wait_ms
+    questions = [QUESTIONS[i % len(QUESTIONS)].format(i=f"{batch_size}-{i}") for i in range(requests)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(nlp_model.nl_to_sql, questions))
+    return requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NL2SQL throughput vs. micro-batch size")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--wait-ms", type=float, default=nlp_model.MAX_WAIT_MS)
+    args = parser.parse_args()
+
+    nlp_model.load_model()
+    nlp_model.nl_to_sql("warm up")
+    print(f"{'batch':>6} {'req/s':>10}")
+    for batch_size in args.batch_sizes:
+        print(f"{batch_size:>6} {run(batch_size, args.requests, args.clients, args.wait_ms):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# bench_run_query.py
+# Per-request overhead of a single-row aggregate: the old pandas round-trip
+# (read_sql_query -> to_dict -> json) against the cursor fetch + orjson path
+# that query_logic.run_query now uses.
+#
+#   python benchmarks/bench_run_query.py --repeat 20000
+
+import argparse
+import json
+import random
+import sqlite3
+import time
+
+import orjson
+import pandas as pd
+
+SQL = ("SELECT SUM(SPARE_DUTY_MINS_N) AS SPARE_DUTY_MINS, SUM(SPARE_KMS_N) AS SPARE_KMS "
+       "FROM full_data WHERE CREW_ID_V = :crew_id AND MONTH = :month")
+
+
+def build_table(rows: int) -> sqlite3.Connection:
+    rng = random.Random(0)
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE full_data (CREW_ID_V TEXT, MONTH TEXT, SPARE_DUTY_MINS_N INTEGER, SPARE_KMS_N REAL)")
+    conn.executemany("INSERT INTO full_data VALUES (?, ?, ?, ?)", [
+        (f"TDL{rng.randrange(1000)}", "2025-06", rng.randint(0, 500), rng.random() * 100) for _ in range(rows)
+    ])
+    conn.execute("CREATE INDEX idx_full_data_crew_month ON full_data (CREW_ID_V, MONTH)")
+    return conn
+
+
+def pandas_path(conn, params) -> bytes:
+    df = pd.read_sql_query(SQL, conn, params=params)
+    return json.dumps(df.to_dict(orient="records")).encode()
+
+
+def cursor_path(conn, params) -> bytes:
+    cursor = conn.execute(SQL, params)
+    columns = [d[0] for d in cursor.description]
+    return orjson.dumps([dict(zip(columns, row)) for row in cursor.fetchall()])
+
+
+def bench(fn, conn, repeat: int) -> float:
+    params = {"crew_id": "TDL1", "month": "2025-06"}
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(conn, params)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Single-row aggregate: pandas vs. cursor + orjson")
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=5_000)
+    args = parser.parse_args()
+
+    conn = build_table(args.rows)
+    before = bench(pandas_path, conn, args.repeat)
+    after = bench(cursor_path, conn, args.repeat)
+    print(f"pandas + json   {before:8.1f} us/request")
+    print(f"cursor + orjson {after:8.1f} us/request  ({before / after:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
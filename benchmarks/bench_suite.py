@@ -0,0 +1,465 @@
+# bench_suite.py
+# End-to-end benchmark of the menu, NL and model endpoints on synthetic data.
+#
+# Builds, once per scale and seed (cached under --work-dir):
+#   - a full_data snapshot of --rows synthetic mileage rows joined with
+#     synthetic crew biodata and slot data, with the tables, indexes and cube
+#     db.build_snapshot writes;
+#   - a tiny randomly initialised T5 with its own small tokenizer, standing in
+#     for the fine-tuned model: generate() does real work per token, but the
+#     SQL it produces is noise, so /nlquery mostly ends in the keyword fallback.
+# Then loads both apps in this process (main.app, and model.api_with_model.app
+# as unified_main mounts it under /model) and drives /query, /nlquery,
+# /model/generate_sql and /model/query_crew_data through the ASGI transport
+# with concurrent clients. The request sequence depends only on --seed.
+# Throughput, latency percentiles, status codes and memory are printed as
+# JSON, written to --output, and compared with an earlier run by --compare.
+#
+#   python benchmarks/bench_suite.py --rows 100000 --output bench.json
+#   python benchmarks/bench_suite.py --rows 100000 --output new.json --compare bench.json
+#   python benchmarks/bench_suite.py --rows 10000000 --endpoints /query /model/query_crew_data
+
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from cube import build_cube, spec_key  # noqa: E402
+from ingest import apply_types, peak_rss_mb  # noqa: E402
+
+# Bump when the synthetic layout or values change, so cached snapshots are rebuilt.
+DATA_VERSION = "2"
+# Bump when the stand-in model or its tokenizer change.
+MODEL_VERSION = "2"
+HQS = ("TDL", "BSP")
+LAST_MONTH = "2025-06"
+CHUNK_ROWS = 250_000
+
+# Whole-number mileage columns and the (low, high) range they are drawn from.
+INT_COLUMNS = {
+    "TOTAL_DUTY": (0, 15000), "NON_OFF_KMS": (0, 3000), "OFF1_KMS": (0, 5000), "OFF2_KMS": (0, 500),
+    "ALKM_NON_LEAVE": (0, 500), "ALKM_LEAVE": (0, 500), "NRDA_KMS": (0, 300), "OSRA_KMS": (0, 300),
+    "TOTAL_KMS": (0, 9000), "BOR": (0, 5), "NGHT": (0, 4000), "NH": (0, 3), "SHUNT_COUNT": (0, 20),
+    "TRIP_COUNT": (0, 40),
+}
+INT_COLUMNS_2 = {
+    "RUN_DUTY_MIN": (0, 9000), "NON_RUN_DUTY_MIN": (0, 3000), "ABSENT": (0, 5), "SICK_LEAVE": (0, 5),
+    "LEAVE_DAYS": (0, 10), "STATIONAY_DUTY": (0, 2000), "TEST_TRNG": (0, 600), "OTHER_NON_LEAVE": (0, 5),
+}
+QUERY_TEMPLATES = [("3", "1"), ("1", "5"), ("2", "7"), ("6", "1"), ("5", "1"), ("6", "2")]
+NL_QUESTIONS = [
+    "what is my total kms",
+    "how many night duty minutes",
+    "sick leave days",
+    "which crew has the most total kms in {hq}",
+    "top crew by night duty in {hq}",
+    "crew with total duty above {n}",
+    "show all crew in {hq} sorted by trip count",
+    "footplate kms of crew {crew}",
+]
+CREW_FIELDS = ["total_duty", "total_kms", "total_trips"]
+
+
+# --- Synthetic data ---
+def months_list(months: int) -> list[pd.Period]:
+    return list(pd.period_range(end=LAST_MONTH, periods=months, freq="M"))
+
+
+def crew_ids(crews: int) -> list[str]:
+    return [f"{HQS[i % 2]}{1000 + i // 2}" for i in range(crews)]
+
+
+def make_crew(ids: list[str], rng: np.random.Generator) -> pd.DataFrame:
+    n = len(ids)
+    return pd.DataFrame({
+        "CREW_ID_V": ids,
+        "NAME_V": [f"CREW MEMBER {i}" for i in range(n)],
+        "HQ_CODE_C": [crew[:3] for crew in ids],
+        "ORG_TYPE_C": rng.choice(["LPP", "LPG", "ALP", "AGR"], n),
+        "CREW_DESIG_V": rng.choice(["LOCO PILOT PASSENGER", "LOCO PILOT GOODS", "ASST. LOCO PILOT", "ASST. GUARD"], n),
+        "INACTIVE_STTS_V": rng.choice(["ACTIVE", "INACTIVE"], n, p=[0.9, 0.1]),
+        "CREW_CADRE_V": rng.choice(["E", "T"], n),
+        "TRCTN_C": rng.choice(["ELEC", "DSL", "DSL+ELEC"], n),
+        "EMP_NO_V": [str(33200000000 + i) for i in range(n)],
+        "PF_CODE_N": "-",
+        "INACTIVE_RESN_V": rng.choice(["Select", "TEMP TRANSFER", "TEMPORARY INACTIVE"], n, p=[0.9, 0.05, 0.05]),
+        "MOBILE_NO_N": rng.integers(919000000000, 919999999999, n),
+        "CREW_BASE_ID_V": ids,
+        "IPAS_FLAG_C": rng.choice(["Y", "N"], n),
+        "AU_CODE_V": rng.integers(3200, 3500, n),
+        "ALCOHOL_C": rng.choice(["Y", "N"], n),
+        "FLAG_C": "L",
+        "VALID_FROM_DATETIME_D": pd.Timestamp("2018-01-01") + pd.to_timedelta(rng.integers(0, 2500 * 86400, n), unit="s"),
+        # Open-ended validity, as in the biodata export (outside the datetime64 range, so kept as text).
+        "VALID_TO_DATETIME_D": "3000-01-01 00:00:00",
+        "LI_ID_V": [f"LI{i % 500:04d}" for i in range(n)],
+    })
+
+
+def make_slots(months: list[pd.Period]) -> pd.DataFrame:
+    rows = []
+    for m, month in enumerate(months):
+        for h, hq in enumerate(HQS):
+            rows.append((100 + 2 * m + h, month.start_time, month.end_time.floor("s"), hq))
+    return pd.DataFrame(rows, columns=["SLOT_NUMBER_N", "MONTH_HRS_FROM_DATE_D", "MONTH_HRS_TO_DATE_D", "HQ_CODE_C"])
+
+
+def make_mileage(start: int, stop: int, ids: np.ndarray, emp_nos: np.ndarray, months: list[pd.Period],
+                 seed: int) -> pd.DataFrame:
+    """
+    Mileage rows start..stop-1, in the column order of the mileage sheets.
+    Row r belongs to crew r % crews in month (r // crews) % months, so every
+    crew gets about the same number of rows per month.
+    """
+    rng = np.random.default_rng([seed, start])
+    rows = np.arange(start, stop)
+    crew = rows % len(ids)
+    month = (rows // len(ids)) % len(months)
+    hq = crew % 2
+    n = len(rows)
+    month_starts = np.array([m.start_time.value for m in months], dtype="int64")
+    days = np.array([m.days_in_month for m in months])
+    dates = pd.to_datetime(month_starts[month] + rng.integers(0, days[month] * 86400, n) * 10**9)
+    frame = {"CREW_ID_V": ids[crew]}
+    frame.update({col: rng.integers(low, high, n) for col, (low, high) in INT_COLUMNS.items()})
+    frame.update({
+        "RRA": rng.integers(0, 4, n).astype("float64"),
+        "SLOT_NUMBER_N": 100 + 2 * month + hq,
+        "TENTATIVE_FLAG": rng.choice(["B", "F"], n),
+        "DATE_TIME_D": dates,
+    })
+    frame.update({col: rng.integers(low, high, n) for col, (low, high) in INT_COLUMNS_2.items()})
+    frame.update({
+        "FOOT_PLT_KM": np.round(rng.random(n) * 4000, 2),
+        "CREW_BASE_ID_V": ids[crew],
+        "SPARE_KMS_N": np.round(rng.random(n) * 100, 2),
+        "SPARE_DUTY_MINS_N": rng.integers(0, 600, n),
+        "NO_OF_TRIPS_N": rng.integers(0, 40, n),
+        "NH_DATES": None,
+        "HQ_CODE_C": np.array(HQS, dtype=object)[hq],
+        "EMP_NO_V": emp_nos[crew],
+        "COACH_RUN_DUTY_MIN_N": rng.integers(0, 6000, n),
+        "COACH_FOOT_PLT_KM_N": np.round(rng.random(n) * 4000, 2),
+    })
+    return pd.DataFrame(frame)
+
+
+def build_data(path: str, rows: int, crews: int, months: int, seed: int) -> dict:
+    """
+    Write the synthetic snapshot to `path`: full_data joined by
+    db.merge_frames, one mileage sheet per HQ, plus crew_data, slot_data,
+    db.create_indexes and the cube. Mileage rows are generated in chunks, so
+    memory stays flat however many rows are asked for.
+    """
+    import db
+
+    start = time.perf_counter()
+    ids = crew_ids(crews)
+    periods = months_list(months)
+    crew = make_crew(ids, np.random.default_rng([seed, 2**32]))
+    ids_array, emp_nos = crew["CREW_ID_V"].to_numpy(dtype=object), crew["EMP_NO_V"].to_numpy(dtype=object)
+    slots = make_slots(periods)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    conn = sqlite3.connect(tmp_path)
+    try:
+        for chunk_start in range(0, rows, CHUNK_ROWS):
+            mileage = make_mileage(chunk_start, min(rows, chunk_start + CHUNK_ROWS), ids_array, emp_nos, periods, seed)
+            merged = db.merge_frames([(hq, mileage[mileage["HQ_CODE_C"] == hq]) for hq in HQS], crew, slots)
+            merged.to_sql("full_data", conn, if_exists="append" if chunk_start else "replace", index=False)
+            print(f"[bench] {min(rows, chunk_start + CHUNK_ROWS)}/{rows} rows written", end="\r", flush=True)
+        crew.to_sql("crew_data", conn, if_exists="replace", index=False)
+        slots.to_sql("slot_data", conn, if_exists="replace", index=False)
+        db.create_indexes(conn)
+        build_cube(conn)
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
+    seconds = time.perf_counter() - start
+    print(f"[bench] Built {path}: {rows} rows, {crews} crew, {months} months in {seconds:.1f}s")
+    return {"seconds": round(seconds, 1)}
+
+
+def snapshot_file(work_dir: str, rows: int, crews: int, months: int, seed: int) -> str:
+    key = hashlib.sha256(f"{DATA_VERSION};{rows};{crews};{months};{seed};{spec_key()}".encode()).hexdigest()[:12]
+    return os.path.join(work_dir, f"full_data_bench_{key}.sqlite")
+
+
+def prepare_data(path: str, rows: int, crews: int, months: int, seed: int) -> dict:
+    info = {"cached": os.path.exists(path)}
+    if not info["cached"]:
+        info.update(build_data(path, rows, crews, months, seed))
+    info["snapshot_mb"] = round(os.path.getsize(path) / 2**20, 1)
+    return info
+
+
+def load_mileage(path: str):
+    """
+    The model app's mileage frame, read back from the synthetic snapshot in
+    the shape load_mileage_frame gives the workbook: (data, crew_index).
+    """
+    from model.api_with_model import compact_frame, index_by_crew
+
+    with sqlite3.connect(path) as conn:
+        columns = ["CREW_ID_V", *INT_COLUMNS, "RRA", "SLOT_NUMBER_N", "TENTATIVE_FLAG", "DATE_TIME_D",
+                   *INT_COLUMNS_2, "FOOT_PLT_KM", "CREW_BASE_ID_V_x AS CREW_BASE_ID_V", "SPARE_KMS_N",
+                   "SPARE_DUTY_MINS_N", "NO_OF_TRIPS_N", "NH_DATES", "HQ_CODE_C_x AS HQ_CODE_C",
+                   "EMP_NO_V_x AS EMP_NO_V", "COACH_RUN_DUTY_MIN_N", "COACH_FOOT_PLT_KM_N"]
+        frame = pd.read_sql_query(f"SELECT {', '.join(columns)} FROM full_data", conn)
+    return index_by_crew(compact_frame(apply_types(frame)))
+
+
+# --- Stand-in model ---
+def prepare_model(work_dir: str, seed: int, columns: list[str]) -> str:
+    """
+    A two-layer, 64-wide T5 and a 400-piece Unigram tokenizer trained on
+    generate_training_data.py examples, saved like a fine-tuned model.
+    """
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers, processors, trainers
+    import torch
+    from transformers import PreTrainedTokenizerFast, T5Config, T5ForConditionalGeneration
+
+    from model.generate_training_data import generate_examples
+
+    path = os.path.join(work_dir, f"tiny_t5_{MODEL_VERSION}_{seed}")
+    if os.path.exists(os.path.join(path, "config.json")):
+        return path
+    examples = generate_examples(2000, random.Random(seed))
+    corpus = [e["input"] for e in examples] + [e["output"] for e in examples] + NL_QUESTIONS + [" ".join(columns)]
+    tokenizer = Tokenizer(models.Unigram())
+    tokenizer.pre_tokenizer = pre_tokenizers.Metaspace()
+    # Decode like T5's SentencePiece tokenizer: '▁' back to spaces, no spaces added between pieces.
+    tokenizer.decoder = decoders.Metaspace()
+    tokenizer.train_from_iterator(corpus, trainers.UnigramTrainer(
+        vocab_size=400, special_tokens=["<pad>", "</s>", "<unk>"], unk_token="<unk>"))
+    tokenizer.post_processor = processors.TemplateProcessing(single="$A </s>", special_tokens=[("</s>", 1)])
+    fast = PreTrainedTokenizerFast(tokenizer_object=tokenizer, pad_token="<pad>", eos_token="</s>", unk_token="<unk>")
+    torch.manual_seed(seed)
+    config = T5Config(vocab_size=len(fast), d_model=64, d_ff=128, num_layers=2, num_heads=2, d_kv=32,
+                      decoder_start_token_id=0, pad_token_id=0, eos_token_id=1)
+    T5ForConditionalGeneration(config).save_pretrained(path)
+    fast.save_pretrained(path)
+    return path
+
+
+# --- Workload ---
+class Workload:
+    """
+    Request bodies per endpoint. Request i is the same in every run with the
+    same seed and scale; `distinct` bounds the keys in play (crew, question),
+    so the model caches see a realistic mix of hits and misses.
+    """
+
+    def __init__(self, crews: list[str], months: list[str], distinct: int, seed: int):
+        rng = random.Random(seed)
+        self.crews = rng.sample(crews, min(distinct, len(crews)))
+        self.months = months
+        self.questions = [q.format(hq=HQS[i % 2], n=1000 * (i % 9 + 1), crew=self.crews[i % len(self.crews)])
+                          for i, q in zip(range(distinct), itertools.cycle(NL_QUESTIONS))]
+
+    def body(self, endpoint: str, i: int) -> dict:
+        crew = self.crews[i % len(self.crews)]
+        month = self.months[i % len(self.months)]
+        if endpoint == "/query":
+            domain, sub = QUERY_TEMPLATES[i % len(QUERY_TEMPLATES)]
+            return {"crew_id": crew, "month": month, "domain": domain, "sub": sub}
+        if endpoint == "/nlquery":
+            return {"crew_id": crew, "month": month, "query": self.questions[i % len(self.questions)]}
+        if endpoint == "/model/generate_sql":
+            return {"natural_language_query": self.questions[i % len(self.questions)],
+                    "schema": {"crew_data": ["CREW_ID_V", "HQ_CODE_C", "TOTAL_KMS", "TOTAL_DUTY", "TRIP_COUNT"]}}
+        return {"crew_id": crew, "data_to_fetch": CREW_FIELDS[i % len(CREW_FIELDS)]}
+
+
+ENDPOINTS = ["/query", "/nlquery", "/model/generate_sql", "/model/query_crew_data"]
+
+
+def percentile(values: list[float], q: float) -> float:
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def memory() -> dict:
+    from serve import memory_mb
+
+    mem = memory_mb(os.getpid()) or {}
+    return {"rss_mb": round(mem.get("rss", 0), 1), "peak_rss_mb": round(peak_rss_mb() or 0, 1)}
+
+
+async def drive(client, path: str, headers: dict, workload: Workload, endpoint: str,
+                first: int, requests: int, clients: int) -> dict:
+    latencies = []
+    statuses = Counter()
+    indices = iter(range(first, first + requests))
+
+    async def client_loop():
+        for i in indices:
+            start = time.perf_counter()
+            response = await client.post(path, json=workload.body(endpoint, i), headers=headers)
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[str(response.status_code)] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "req_per_s": round(len(latencies) / elapsed, 1),
+        "mean_ms": round(sum(latencies) / len(latencies), 2),
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+        "max_ms": round(latencies[-1], 2),
+        "status": dict(sorted(statuses.items())),
+    }
+
+
+async def run_endpoints(apps: dict, headers: dict, workload: Workload, args) -> dict:
+    import httpx
+
+    results = {}
+    for endpoint in args.endpoints:
+        _, _, rest = endpoint.partition("/model/")
+        app, path = (apps["model"], "/" + rest) if rest else (apps["cmschat"], endpoint)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            await drive(client, path, headers, workload, endpoint, 0, args.warmup, args.clients)
+            result = await drive(client, path, headers, workload, endpoint, args.warmup, args.requests, args.clients)
+        result["memory"] = memory()
+        results[endpoint] = result
+        print(f"[bench] {endpoint:24s} {result['req_per_s']:9.1f} req/s  p50 {result['p50_ms']:8.2f} ms  "
+              f"p95 {result['p95_ms']:8.2f} ms  p99 {result['p99_ms']:8.2f} ms  {result['status']}")
+    return results
+
+
+def configure(snapshot: str, model_dir: str, work_dir: str, result_cache: bool):
+    """
+    Point db, nlp_model and api_with_model at the benchmark data and model.
+    Must run before any of them is imported: they read these at import time.
+    """
+    os.environ["CMS_SNAPSHOT_FILE"] = snapshot
+    os.environ["CMS_SNAPSHOT_DIR"] = work_dir
+    os.environ["NL2SQL_MODEL_DIR"] = model_dir
+    os.environ["SQL_MODEL_DIR"] = model_dir
+    os.environ["SQL_MILEAGE_FILE"] = snapshot
+    if not result_cache:
+        os.environ["RESULT_CACHE_ENTRIES"] = "0"
+
+
+def start_apps(snapshot: str):
+    """
+    Import both apps and load what their startup handlers would load.
+    """
+    import db
+    import nlp_model
+    from main import app as cmschat_app
+    from model import api_with_model
+    from model.registry import acquire_data
+
+    start = time.perf_counter()
+    nlp_model.load_model(db.columns)
+    # Loaded here from the snapshot; api_with_model then gets it from the registry under the same key.
+    mileage = acquire_data(snapshot, load_mileage, name="mileage")
+    api_with_model.load_resources()
+    if api_with_model.model is None or api_with_model.data is None:
+        sys.exit("[bench] api_with_model did not load its model and data")
+    load_seconds = time.perf_counter() - start
+    return {"cmschat": cmschat_app, "model": api_with_model.app}, mileage, load_seconds
+
+
+def git_revision() -> str | None:
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return rev.stdout.strip() + ("-dirty" if dirty else "")
+
+
+def compare(old: dict, new: dict):
+    print(f"[bench] vs {old['meta'].get('revision')} ({old['meta']['rows']} rows):")
+    for endpoint, result in new["endpoints"].items():
+        before = old["endpoints"].get(endpoint)
+        if before is None:
+            continue
+        parts = []
+        for metric in ("req_per_s", "p50_ms", "p95_ms", "p99_ms"):
+            change = (result[metric] - before[metric]) / before[metric] * 100 if before[metric] else 0.0
+            parts.append(f"{metric} {before[metric]} -> {result[metric]} ({change:+.1f}%)")
+        print(f"[bench] {endpoint:24s} " + ", ".join(parts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the menu, NL and model endpoints on synthetic data")
+    parser.add_argument("--rows", type=int, default=100_000, help="Synthetic mileage rows (10k to 10M)")
+    parser.add_argument("--crews", type=int, default=0, help="Crew members (default: rows / months)")
+    parser.add_argument("--months", type=int, default=6)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", default=os.path.join(ROOT, "bench_data"),
+                        help="Where the synthetic snapshots and stand-in model are cached")
+    parser.add_argument("--model-dir", default=None, help="Use this model instead of the tiny stand-in")
+    parser.add_argument("--endpoints", nargs="+", default=ENDPOINTS, choices=ENDPOINTS)
+    parser.add_argument("--requests", type=int, default=400, help="Measured requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=40, help="Unmeasured requests per endpoint first")
+    parser.add_argument("--clients", type=int, default=16, help="Concurrent clients")
+    parser.add_argument("--distinct", type=int, default=32, help="Distinct crew IDs and questions in the workload")
+    parser.add_argument("--result-cache", action="store_true", help="Keep the /query result cache on")
+    parser.add_argument("--output", default=None, help="Write the results as JSON here")
+    parser.add_argument("--compare", default=None, help="Earlier --output JSON to compare against")
+    args = parser.parse_args()
+    crews = args.crews or max(2, args.rows // args.months)
+
+    os.makedirs(args.work_dir, exist_ok=True)
+    model_dir = args.model_dir or prepare_model(args.work_dir, args.seed, list(INT_COLUMNS) + list(INT_COLUMNS_2))
+    snapshot = snapshot_file(args.work_dir, args.rows, crews, args.months, args.seed)
+    configure(snapshot, model_dir, args.work_dir, args.result_cache)
+    data_info = prepare_data(snapshot, args.rows, crews, args.months, args.seed)
+    apps, mileage, load_seconds = start_apps(snapshot)
+
+    from auth import create_access_token
+
+    headers = {"Authorization": "Bearer " + create_access_token({"sub": "admin"})}
+    workload = Workload(crew_ids(crews), [str(m) for m in months_list(args.months)], args.distinct, args.seed)
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "rows": args.rows, "crews": crews, "months": args.months, "seed": args.seed,
+            "model": "tiny-t5" if args.model_dir is None else os.path.abspath(model_dir),
+            "requests": args.requests, "warmup": args.warmup, "clients": args.clients,
+            "distinct": args.distinct, "result_cache": args.result_cache,
+        },
+        "setup": {"data": data_info, "load_seconds": round(load_seconds, 1), "memory": memory()},
+    }
+    report["endpoints"] = asyncio.run(run_endpoints(apps, headers, workload, args))
+    mileage.release()
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# cube.py
+# Per-crew, per-month aggregate cube for the SUM(...) menu templates.
+import re
+import sqlite3
+
+from query_templates import query_templates
+
+CUBE_TABLE = "crew_month_cube"
+
+_SUM_TEMPLATE = re.compile(r"^SELECT (?P<cols>SUM\(.+\) AS \w+) FROM full_data WHERE \{where\}$")
+_SUM_COLUMN = re.compile(r"^SUM\((?P<expr>.+)\) AS (?P<alias>\w+)$")
+
+
+def parse_sum_template(sql: str) -> list[tuple[str, str]] | None:
+    """
+    Return [(expr, alias), ...] for templates of the form
+    SELECT SUM(expr) AS alias[, ...] FROM full_data WHERE {where}, else None.
+    """
+    match = _SUM_TEMPLATE.match(sql)
+    if not match:
+        return None
+    columns = []
+    for part in re.split(r", (?=SUM\()", match.group("cols")):
+        col = _SUM_COLUMN.match(part)
+        if not col:
+            return None
+        columns.append((col.group("expr"), col.group("alias")))
+    return columns
+
+
+def cube_spec(templates: dict = query_templates):
+    """
+    Work out the cube layout from the templates.
+    Returns (columns, served): columns maps each distinct SUM expression to its
+    cube column name, served maps (domain, sub) to [(alias, cube column), ...].
+    """
+    columns = {}
+    served = {}
+    for domain, subs in templates.items():
+        for sub, sql in subs.items():
+            parsed = parse_sum_template(sql)
+            if parsed is None:
+                continue
+            for expr, alias in parsed:
+                if expr not in columns:
+                    name = alias
+                    while name in columns.values():
+                        name += "_"
+                    columns[expr] = name
+            served[(domain, sub)] = [(alias, columns[expr]) for expr, alias in parsed]
+    return columns, served
+
+
+def spec_key(templates: dict = query_templates) -> str:
+    """
+    Stable description of the cube layout; part of the snapshot key.
+    """
+    columns, _ = cube_spec(templates)
+    return ";".join(f"{name}={expr}" for expr, name in columns.items())
+
+
+def _cube_select(templates: dict) -> str:
+    columns, _ = cube_spec(templates)
+    sums = ", ".join(f"SUM({expr}) AS {name}" for expr, name in columns.items())
+    return f"SELECT CREW_ID_V, MONTH, {sums} FROM full_data"
+
+
+def build_cube(conn: sqlite3.Connection, templates: dict = query_templates):
+    """
+    Materialize every summed template column per (CREW_ID_V, MONTH) into CUBE_TABLE.
+    """
+    conn.execute(f"DROP TABLE IF EXISTS {CUBE_TABLE}")
+    conn.execute(f"CREATE TABLE {CUBE_TABLE} AS {_cube_select(templates)} GROUP BY CREW_ID_V, MONTH")
+    conn.execute(f"CREATE UNIQUE INDEX idx_{CUBE_TABLE} ON {CUBE_TABLE} (CREW_ID_V, MONTH)")
+
+
+def refresh_cube(conn: sqlite3.Connection, months: list[str], templates: dict = query_templates):
+    """
+    Recompute the cube rows of the given months after their full_data rows changed.
+    """
+    months = sorted(set(months))
+    if not months:
+        return
+    marks = ", ".join("?" for _ in months)
+    conn.execute(f"DELETE FROM {CUBE_TABLE} WHERE MONTH IN ({marks})", months)
+    conn.execute(
+        f"INSERT INTO {CUBE_TABLE} {_cube_select(templates)} WHERE MONTH IN ({marks}) GROUP BY CREW_ID_V, MONTH",
+        months,
+    )
+
+
+class Cube:
+    """
+    In-memory copy of CUBE_TABLE keyed by (crew_id, month).
+    """
+
+    def __init__(self, conn: sqlite3.Connection, templates: dict = query_templates):
+        _, served = cube_spec(templates)
+        cursor = conn.execute(f"SELECT * FROM {CUBE_TABLE}")
+        names = [d[0] for d in cursor.description]
+        self.rows = {(row[0], row[1]): row for row in cursor}
+        positions = {name: i for i, name in enumerate(names)}
+        self.served = {
+            key: [(alias, positions[name]) for alias, name in cols]
+            for key, cols in served.items()
+        }
+
+    def serves(self, domain: str, sub: str) -> bool:
+        return (domain, sub) in self.served
+
+    def lookup(self, domain: str, sub: str, crew_id: str, month: str) -> list[dict] | None:
+        """
+        Result rows for a cube-served template, shaped like the SQL result;
+        None if the template is not in the cube.
+        """
+        cols = self.served.get((domain, sub))
+        if cols is None:
+            return None
+        row = self.rows.get((crew_id, month))
+        # SUM over no rows is a single NULL row in SQL.
+        return [{alias: row[pos] if row is not None else None for alias, pos in cols}]
@@ -1,23 +1,531 @@
-import pandas as pd
+# db.py
+import hashlib
+import os
+import queue
 import sqlite3
-mileage_data = pd.read_excel("D://Documents//CRIS//1_TDL_BSP_5Month_MILEAGE_DATA.xlsx", sheet_name=None)
-crew_data = pd.read_excel("D://Documents//CRIS//1_TDL_BSP_Crew_Biodata.xlsx")
-slot_data = pd.read_excel("D://Documents//CRIS//Month_SLOT_DATA.xlsx")
-mileage_df = pd.concat([mileage_data["TDL"], mileage_data["BSP"]], ignore_index=True)
-merged_df = pd.merge(mileage_df, crew_data, on="CREW_ID_V", how="left")
-merged_df["HQ_CODE_C"] = merged_df["HQ_CODE_C_x"]
-merged_df = pd.merge(merged_df, slot_data, on=["SLOT_NUMBER_N", "HQ_CODE_C"], how="left")
-conn = sqlite3.connect(":memory:", check_same_thread=False)
-merged_df.to_sql("full_data", conn, if_exists="replace", index=False)
-schema_lines = ["CREATE TABLE full_data ("]
-for col, dtype in merged_df.dtypes.items():
-    sql_type = "TEXT"
-    if "int" in str(dtype):
-        sql_type = "INTEGER"
-    elif "float" in str(dtype):
-        sql_type = "REAL"
-    schema_lines.append(f"  {col} {sql_type},")
-schema_lines[-1] = schema_lines[-1].rstrip(",")  
-schema_lines.append(");")
-schema = "\n".join(schema_lines)
-db_conn = conn
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+from cube import Cube, build_cube, refresh_cube, spec_key
+from ingest import read_sheets
+
+# Source workbooks. CMS_DATA_DIR overrides the default export location.
+DATA_DIR = os.environ.get("CMS_DATA_DIR", "D://Documents//CRIS")
+MILEAGE_FILE = os.path.join(DATA_DIR, "1_TDL_BSP_5Month_MILEAGE_DATA.xlsx")
+CREW_FILE = os.path.join(DATA_DIR, "1_TDL_BSP_Crew_Biodata.xlsx")
+SLOT_FILE = os.path.join(DATA_DIR, "Month_SLOT_DATA.xlsx")
+SOURCE_FILES = [MILEAGE_FILE, CREW_FILE, SLOT_FILE]
+# One mileage sheet per HQ.
+MILEAGE_SHEETS = ["TDL", "BSP"]
+
+# Built snapshots live here, one SQLite file per source hash.
+SNAPSHOT_DIR = os.environ.get("CMS_SNAPSHOT_DIR", os.path.join(DATA_DIR, "snapshots"))
+# Holds the version every worker should be serving; rewritten after a refresh.
+CURRENT_FILE = os.path.join(SNAPSHOT_DIR, "CURRENT")
+# Bump whenever the layout of full_data in the snapshot changes.
+SNAPSHOT_VERSION = "4"
+MMAP_SIZE = 256 * 1024 * 1024
+# Serve SUM templates from the in-memory crew/month cube (CMS_CUBE=0 disables).
+CUBE_ENABLED = os.environ.get("CMS_CUBE", "1") != "0"
+# Read-only connections kept open against the snapshot.
+POOL_SIZE = int(os.environ.get("CMS_DB_POOL_SIZE", "8"))
+# How often a worker looks at CURRENT_FILE for a version published by another process.
+RELOAD_CHECK_S = float(os.environ.get("CMS_RELOAD_CHECK_S", "2"))
+# Older snapshot files kept around after a refresh.
+KEEP_SNAPSHOTS = int(os.environ.get("CMS_KEEP_SNAPSHOTS", "2"))
+# Serve this prebuilt snapshot file as it is instead of one built from the
+# workbooks (e.g. the synthetic data of benchmarks/bench_suite.py). The
+# workbooks are not read, and refresh and reload leave it in place.
+SNAPSHOT_FILE = os.environ.get("CMS_SNAPSHOT_FILE")
+
+# Bookkeeping tables stored next to full_data in every snapshot.
+MANIFEST_TABLE = "ingest_manifest"  # one row per (mileage sheet, month) with a hash of its rows
+SOURCES_TABLE = "ingest_sources"  # hash of the crew and slot workbooks the snapshot was joined against
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_hash(paths=None) -> str:
+    """
+    Hash of the source workbooks (plus snapshot layout and cube spec) used to key the snapshot.
+    """
+    digest = hashlib.sha256(SNAPSHOT_VERSION.encode())
+    digest.update(spec_key().encode())
+    for path in paths or SOURCE_FILES:
+        digest.update(file_hash(path).encode())
+    return digest.hexdigest()[:16]
+
+
+def snapshot_path(version: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, f"full_data_{version}.sqlite")
+
+
+def read_mileage(path: str = MILEAGE_FILE) -> dict[str, pd.DataFrame]:
+    return dict(zip(MILEAGE_SHEETS, read_sheets([(path, sheet) for sheet in MILEAGE_SHEETS])))
+
+
+def read_sources() -> tuple[dict[str, pd.DataFrame], pd.DataFrame, pd.DataFrame]:
+    """
+    (mileage sheets, crew biodata, slot data), all sheets parsed in parallel.
+    """
+    frames = read_sheets([(MILEAGE_FILE, sheet) for sheet in MILEAGE_SHEETS] + [(CREW_FILE, 0), (SLOT_FILE, 0)])
+    return dict(zip(MILEAGE_SHEETS, frames)), frames[-2], frames[-1]
+
+
+def month_groups(sheets: dict[str, pd.DataFrame]) -> dict[tuple[str, str], pd.DataFrame]:
+    """
+    Split the mileage sheets into {(sheet, month): rows}, the unit of incremental refresh.
+    """
+    groups = {}
+    for sheet, df in sheets.items():
+        months = pd.to_datetime(df["DATE_TIME_D"]).dt.strftime("%Y-%m")
+        for month, group in df.groupby(months, sort=True):
+            groups[(sheet, month)] = group
+    return groups
+
+
+def group_hash(df: pd.DataFrame) -> str:
+    digest = hashlib.sha256(",".join(map(str, df.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return digest.hexdigest()[:16]
+
+
+def merge_frames(parts: list[tuple[str, pd.DataFrame]], crew_data: pd.DataFrame,
+                 slot_data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Join (sheet, mileage rows) parts with the crew biodata and slot data into full_data rows.
+    """
+    mileage_df = pd.concat([df.assign(SOURCE_SHEET=sheet) for sheet, df in parts], ignore_index=True)
+    merged_df = pd.merge(mileage_df, crew_data, on="CREW_ID_V", how="left")
+    merged_df["HQ_CODE_C"] = merged_df["HQ_CODE_C_x"]
+    merged_df = pd.merge(merged_df, slot_data, on=["SLOT_NUMBER_N", "HQ_CODE_C"], how="left")
+    # Materialized so month filters can use an index instead of STRFTIME(DATE_TIME_D).
+    merged_df["MONTH"] = pd.to_datetime(merged_df["DATE_TIME_D"]).dt.strftime("%Y-%m")
+    return merged_df
+
+
+def create_indexes(conn: sqlite3.Connection):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_full_data_crew_month ON full_data (CREW_ID_V, MONTH)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_full_data_hq_month ON full_data (HQ_CODE_C, MONTH)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_full_data_sheet_month ON full_data (SOURCE_SHEET, MONTH)")
+
+
+def write_manifest(conn: sqlite3.Connection, groups: dict[tuple[str, str], pd.DataFrame]):
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {MANIFEST_TABLE} "
+                 f"(SHEET TEXT, MONTH TEXT, ROW_HASH TEXT, ROWS INTEGER, PRIMARY KEY (SHEET, MONTH))")
+    conn.executemany(
+        f"INSERT OR REPLACE INTO {MANIFEST_TABLE} VALUES (?, ?, ?, ?)",
+        [(sheet, month, group_hash(df), len(df)) for (sheet, month), df in groups.items()],
+    )
+
+
+def layout_key() -> str:
+    return hashlib.sha256(f"{SNAPSHOT_VERSION};{spec_key()}".encode()).hexdigest()[:16]
+
+
+def write_sources(conn: sqlite3.Connection):
+    """
+    Record what the snapshot was built against: the crew and slot workbooks
+    and the table layout. A refresh only reuses a snapshot that matches.
+    """
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {SOURCES_TABLE} (NAME TEXT PRIMARY KEY, HASH TEXT)")
+    conn.executemany(f"INSERT OR REPLACE INTO {SOURCES_TABLE} VALUES (?, ?)", [
+        ("layout", layout_key()),
+        ("crew", file_hash(CREW_FILE)),
+        ("slot", file_hash(SLOT_FILE)),
+    ])
+
+
+def build_snapshot(version: str | None = None) -> str:
+    """
+    Build the on-disk full_data snapshot for the current source files.
+    The file is written under a temporary name and renamed into place, so
+    concurrent workers never open a half-written snapshot.
+    """
+    version = version or source_hash()
+    path = snapshot_path(version)
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    sheets, crew_data, slot_data = read_sources()
+    merged_df = merge_frames(list(sheets.items()), crew_data, slot_data)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        merged_df.to_sql("full_data", conn, if_exists="replace", index=False)
+        # Cached so a refresh can join new mileage rows without re-reading these workbooks.
+        crew_data.to_sql("crew_data", conn, if_exists="replace", index=False)
+        slot_data.to_sql("slot_data", conn, if_exists="replace", index=False)
+        write_manifest(conn, month_groups(sheets))
+        write_sources(conn)
+        create_indexes(conn)
+        build_cube(conn)
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
+    return path
+
+
+def _apply_increment(conn: sqlite3.Connection, groups: dict[tuple[str, str], pd.DataFrame]) -> dict | None:
+    try:
+        stored = dict(conn.execute(f"SELECT NAME, HASH FROM {SOURCES_TABLE}"))
+    except sqlite3.OperationalError:
+        return None
+    expected = {"layout": layout_key(), "crew": file_hash(CREW_FILE), "slot": file_hash(SLOT_FILE)}
+    if any(stored.get(name) != h for name, h in expected.items()):
+        return None
+    old = dict(((sheet, month), h) for sheet, month, h in conn.execute(
+        f"SELECT SHEET, MONTH, ROW_HASH FROM {MANIFEST_TABLE}"))
+    hashes = {key: group_hash(df) for key, df in groups.items()}
+    changed = sorted(key for key, h in hashes.items() if old.get(key) != h)
+    removed = sorted(set(old) - set(hashes))
+
+    new_rows = None
+    if changed:
+        crew_data = pd.read_sql_query("SELECT * FROM crew_data", conn)
+        slot_data = pd.read_sql_query("SELECT * FROM slot_data", conn)
+        new_rows = merge_frames([(sheet, groups[(sheet, month)]) for sheet, month in changed],
+                                crew_data, slot_data)
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(full_data)")}
+        if not set(new_rows.columns) <= existing:
+            return None
+    for sheet, month in changed + removed:
+        conn.execute("DELETE FROM full_data WHERE SOURCE_SHEET = ? AND MONTH = ?", (sheet, month))
+        conn.execute(f"DELETE FROM {MANIFEST_TABLE} WHERE SHEET = ? AND MONTH = ?", (sheet, month))
+    if new_rows is not None:
+        # The full_data indexes are maintained by SQLite as the rows go in.
+        new_rows.to_sql("full_data", conn, if_exists="append", index=False)
+        write_manifest(conn, {key: groups[key] for key in changed})
+    refresh_cube(conn, [month for _, month in changed + removed])
+    conn.execute("ANALYZE")
+    return {"changed": [list(key) for key in changed], "removed": [list(key) for key in removed]}
+
+
+def apply_increment(base_path: str, version: str) -> dict | None:
+    """
+    Build the snapshot for `version` from a copy of the one at base_path,
+    replacing only the (sheet, month) groups of mileage rows whose hash
+    changed. Returns {"changed": [...], "removed": [...]}, or None when the
+    base cannot be reused (different crew/slot workbooks, layout or mileage
+    columns) and a full build is needed.
+    """
+    path = snapshot_path(version)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    groups = month_groups(read_mileage())
+    src = open_snapshot(base_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        src.backup(conn)
+        result = _apply_increment(conn, groups)
+        conn.commit()
+    finally:
+        src.close()
+        conn.close()
+    if result is None:
+        os.remove(tmp_path)
+        return None
+    os.replace(tmp_path, path)
+    return result
+
+
+def update_snapshot(version: str, base_version: str | None) -> dict:
+    """
+    Produce the snapshot for `version`: incrementally from base_version's
+    snapshot when possible, otherwise by a full build.
+    """
+    start = time.perf_counter()
+    result = {"version": version, "previous": base_version, "mode": "full", "changed": [], "removed": []}
+    increment = None
+    if base_version and os.path.exists(snapshot_path(base_version)):
+        increment = apply_increment(snapshot_path(base_version), version)
+    if increment is None:
+        build_snapshot(version)
+    else:
+        result.update(increment, mode="incremental")
+    result["seconds"] = round(time.perf_counter() - start, 2)
+    print(f"[db] Built snapshot {version} ({result['mode']}) in {result['seconds']}s")
+    return result
+
+
+def open_snapshot(path: str) -> sqlite3.Connection:
+    """
+    Open a snapshot read-only. Pages are memory-mapped, so workers on the
+    same host share them through the OS page cache.
+    """
+    uri = Path(path).resolve().as_uri() + "?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    return conn
+
+
+class ReadPool:
+    """
+    Fixed-size pool of read-only connections to one snapshot file. Each
+    connection is used by one thread at a time, so queries run in parallel
+    instead of serializing on a shared connection.
+    """
+
+    def __init__(self, path: str, size: int = POOL_SIZE):
+        self.path = path
+        self._idle = queue.LifoQueue()
+        for _ in range(size):
+            self._idle.put(open_snapshot(path))
+        self._lock = threading.Lock()
+        self._borrowed = 0
+        self._closed = False
+        self._on_closed = None
+
+    @contextmanager
+    def connection(self):
+        conn = self._idle.get()
+        if conn is None:
+            # Closed while this reader waited: use the pool that replaced it.
+            self._idle.put(None)
+            with pool.connection() as conn:
+                yield conn
+            return
+        with self._lock:
+            self._borrowed += 1
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    def _release(self, conn: sqlite3.Connection):
+        with self._lock:
+            self._borrowed -= 1
+            if not self._closed:
+                self._idle.put(conn)
+                return
+            done = self._borrowed == 0
+        conn.close()
+        if done:
+            self._finish_close()
+
+    def close(self, on_closed=None):
+        """
+        Close the idle connections now and the borrowed ones as their readers
+        return them; then call `on_closed()`. Readers still waiting for a
+        connection are sent to the current pool.
+        """
+        with self._lock:
+            self._closed = True
+            self._on_closed = on_closed
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+            self._idle.put(None)
+            done = self._borrowed == 0
+        if done:
+            self._finish_close()
+
+    def _finish_close(self):
+        callback, self._on_closed = self._on_closed, None
+        if callback is not None:
+            callback()
+
+
+def ensure_snapshot() -> tuple[str, str]:
+    """
+    Return (version, path) of the snapshot for the current sources, building it if missing.
+    """
+    if SNAPSHOT_FILE:
+        return Path(SNAPSHOT_FILE).stem, SNAPSHOT_FILE
+    version = source_hash()
+    path = snapshot_path(version)
+    if not os.path.exists(path):
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        update_snapshot(version, published_version())
+    publish(version)
+    return version, path
+
+
+def published_version() -> str | None:
+    try:
+        return Path(CURRENT_FILE).read_text().strip() or None
+    except OSError:
+        return None
+
+
+def publish(version: str):
+    """
+    Point CURRENT_FILE at `version` so other workers switch to it.
+    """
+    tmp_path = f"{CURRENT_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(version)
+    os.replace(tmp_path, CURRENT_FILE)
+
+
+def prune_snapshots(keep: int = KEEP_SNAPSHOTS):
+    """
+    Delete all but the newest `keep` old snapshot files. A file another worker
+    still has open cannot be removed on Windows; it is left for the next prune.
+    """
+    paths = sorted(Path(SNAPSHOT_DIR).glob("full_data_*.sqlite"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in [p for p in paths if str(p) != str(Path(data_path))][keep:]:
+        try:
+            old.unlink()
+        except OSError:
+            pass
+
+
+def table_schema(conn: sqlite3.Connection, table: str = "full_data") -> str:
+    schema_lines = [f"CREATE TABLE {table} ("]
+    for _, col, col_type, *_ in conn.execute(f"PRAGMA table_info({table})"):
+        sql_type = "TEXT"
+        if "INT" in col_type.upper():
+            sql_type = "INTEGER"
+        elif "REAL" in col_type.upper():
+            sql_type = "REAL"
+        schema_lines.append(f"  {col} {sql_type},")
+    schema_lines[-1] = schema_lines[-1].rstrip(",")
+    schema_lines.append(");")
+    return "\n".join(schema_lines)
+
+
+_swap_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+_load_lock = threading.Lock()
+_next_check = 0.0
+
+
+def activate(version: str, on_closed=None):
+    """
+    Switch this process to the snapshot for `version`. The new pool and cube
+    are fully loaded before any reader sees them; queries already holding a
+    connection finish on the old file, whose connections are closed as they
+    come back (then `on_closed()` runs). data_version changes last, so the
+    result cache is dropped once the new data is in place.
+    """
+    global pool, cube, schema, columns, data_path, data_version
+    old_pool = pool
+    path = snapshot_path(version)
+    new_pool = ReadPool(path)
+    with new_pool.connection() as conn:
+        new_schema = table_schema(conn)
+        new_columns = [row[1] for row in conn.execute("PRAGMA table_info(full_data)")]
+        new_cube = Cube(conn) if CUBE_ENABLED else None
+    pool, cube, schema, columns, data_path = new_pool, new_cube, new_schema, new_columns, path
+    data_version = version
+    print(f"[db] Serving snapshot {version}")
+    old_pool.close(on_closed)
+
+
+def check_current():
+    """
+    Pick up a version published by another worker (at most every RELOAD_CHECK_S).
+    """
+    global _next_check
+    load()
+    now = time.monotonic()
+    if now < _next_check or SNAPSHOT_FILE:
+        return
+    _next_check = now + RELOAD_CHECK_S
+    version = published_version()
+    if version and version != data_version and os.path.exists(snapshot_path(version)):
+        with _swap_lock:
+            if version != data_version:
+                activate(version)
+
+
+def refresh() -> dict:
+    """
+    Bring the snapshot up to date with the source workbooks and switch to it.
+    Only mileage (sheet, month) groups that are new or changed are re-joined
+    and re-inserted; the new snapshot is built off to the side, then swapped in.
+    """
+    load()
+    with _refresh_lock:
+        if SNAPSHOT_FILE:
+            return {"version": data_version, "previous": data_version, "mode": "pinned", "changed": [], "removed": []}
+        version = source_hash()
+        if version == data_version:
+            return {"version": version, "previous": data_version, "mode": "none", "changed": [], "removed": []}
+        if os.path.exists(snapshot_path(version)):
+            result = {"version": version, "previous": data_version, "mode": "existing", "changed": [], "removed": []}
+        else:
+            result = update_snapshot(version, data_version)
+        with _swap_lock:
+            # Old files are pruned once this process has closed its connections to them.
+            activate(version, on_closed=prune_snapshots)
+        publish(version)
+        return result
+
+
+# Pools opened before a fork; kept referenced so the child never closes the parent's connections.
+_inherited_pools = []
+
+
+def _reopen_after_fork():
+    """
+    SQLite connections must not be used across fork(), so a forked worker
+    opens its own pool; serve.py calls this in each worker it forks. The cube
+    and the mmap'd pages stay shared.
+    """
+    global pool
+    if "pool" not in globals():
+        return
+    _inherited_pools.append(pool)
+    pool = ReadPool(data_path)
+
+
+# Set by load(); reading any of them as db.<name> loads first.
+_SNAPSHOT_STATE = ("data_version", "data_path", "pool", "schema", "columns", "cube")
+
+
+def load():
+    """
+    Build the snapshot for the current sources if needed and open it. Runs on
+    first use of the snapshot state (db.columns, read_connection(), ...), so
+    importing db, e.g. for merge_frames or from the ingest worker processes
+    that re-import the main script under spawn, does not build anything.
+    """
+    global data_version, data_path, pool, schema, columns, cube
+    if "pool" in globals():
+        return
+    with _load_lock:
+        if "pool" in globals():
+            return
+        version, path = ensure_snapshot()
+        new_pool = ReadPool(path)
+        with new_pool.connection() as conn:
+            schema = table_schema(conn)
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(full_data)")]
+            cube = Cube(conn) if CUBE_ENABLED else None
+        data_version, data_path = version, path
+        pool = new_pool
+
+
+def __getattr__(name: str):
+    if name in _SNAPSHOT_STATE:
+        load()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def read_connection():
+    """
+    Borrow a read-only snapshot connection: `with read_connection() as conn: ...`
+    """
+    check_current()
+    return pool.connection()
+
+
+if __name__ == "__main__":
+    # Build step: `python db.py` builds the snapshot for the current sources if
+    # needed, incrementally from the last published one when it can.
+    load()
+    print(data_path)
@@ -0,0 +1,44 @@
+# executors.py
+# Sized thread pools for the blocking work behind the async endpoints: SQL
+# reads (one thread per pooled connection) and NL2SQL model calls.
+import asyncio
+import contextvars
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from db import POOL_SIZE
+from metrics import record
+
+DB_WORKERS = int(os.environ.get("CMS_DB_WORKERS", str(POOL_SIZE)))
+# Model calls mostly wait on the nlp_model batch queue, so more threads than cores is fine.
+MODEL_WORKERS = int(os.environ.get("CMS_MODEL_WORKERS", "16"))
+
+db_executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="db")
+model_executor = ThreadPoolExecutor(max_workers=MODEL_WORKERS, thread_name_prefix="model")
+
+
+def _timed_call(stage: str, fn, args, kwargs):
+    """
+    Callable for an executor: runs fn in a copy of the caller's context, so
+    stage timings reach the request, and records how long it waited for a thread.
+    """
+    context = contextvars.copy_context()
+    submitted = time.perf_counter()
+
+    def call():
+        record(stage, time.perf_counter() - submitted)
+        return fn(*args, **kwargs)
+
+    return functools.partial(context.run, call)
+
+
+async def run_db(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, _timed_call("db_wait", fn, args, kwargs))
+
+
+async def run_model(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(model_executor, _timed_call("model_wait", fn, args, kwargs))
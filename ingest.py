@@ -0,0 +1,163 @@
+# ingest.py
+# Excel ingestion shared by db.py and model/api_with_model.py: every sheet is
+# parsed in its own worker process (calamine engine when installed) and then
+# given explicit column types instead of pandas' object/float inference.
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+try:
+    import python_calamine  # noqa: F401
+    ENGINE = "calamine"
+except ImportError:
+    ENGINE = "openpyxl"
+
+# Worker processes for parsing (CMS_INGEST_WORKERS=0 parses in-process).
+WORKERS = int(os.environ.get("CMS_INGEST_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+CATEGORY = "category"
+INT32 = "int32"
+FLOAT64 = "float64"
+DATETIME = "datetime"
+
+# IDs, HQ codes and flags repeat heavily; store them as categoricals.
+_CATEGORY_COLUMNS = [
+    "CREW_ID_V", "CREW_BASE_ID_V", "HQ_CODE_C", "TENTATIVE_FLAG",
+    "ORG_TYPE_C", "CREW_DESIG_V", "INACTIVE_STTS_V", "CREW_CADRE_V", "TRCTN_C", "PF_CODE_N",
+    "INACTIVE_RESN_V", "IPAS_FLAG_C", "ALCOHOL_C", "FLAG_C", "LI_ID_V",
+]
+# Whole-number KM, minute and day counts.
+_INT32_COLUMNS = [
+    "TOTAL_DUTY", "NON_OFF_KMS", "OFF1_KMS", "OFF2_KMS", "ALKM_NON_LEAVE", "ALKM_LEAVE",
+    "NRDA_KMS", "OSRA_KMS", "TOTAL_KMS", "BOR", "NGHT", "NH", "SHUNT_COUNT", "TRIP_COUNT",
+    "SLOT_NUMBER_N", "RUN_DUTY_MIN", "NON_RUN_DUTY_MIN", "ABSENT", "SICK_LEAVE", "LEAVE_DAYS",
+    "STATIONAY_DUTY", "TEST_TRNG", "OTHER_NON_LEAVE", "SPARE_DUTY_MINS_N", "NO_OF_TRIPS_N",
+    "COACH_RUN_DUTY_MIN_N", "AU_CODE_V",
+]
+# Fractional KMs stay float64: float32 would change the SUMs the templates return.
+_FLOAT64_COLUMNS = ["RRA", "FOOT_PLT_KM", "SPARE_KMS_N", "COACH_FOOT_PLT_KM_N"]
+_DATETIME_COLUMNS = [
+    "DATE_TIME_D", "VALID_FROM_DATETIME_D", "VALID_TO_DATETIME_D",
+    "MONTH_HRS_FROM_DATE_D", "MONTH_HRS_TO_DATE_D",
+]
+
+COLUMN_TYPES = {
+    **{col: CATEGORY for col in _CATEGORY_COLUMNS},
+    **{col: INT32 for col in _INT32_COLUMNS},
+    **{col: FLOAT64 for col in _FLOAT64_COLUMNS},
+    **{col: DATETIME for col in _DATETIME_COLUMNS},
+}
+
+
+def peak_rss_mb() -> float | None:
+    """
+    Peak resident memory of this process in MB, where the platform reports it.
+    """
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / 2**20
+        except (ImportError, AttributeError):
+            return None
+    # ru_maxrss is in KB on Linux and in bytes on macOS.
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20
+
+
+def in_worker_process() -> bool:
+    """
+    True in a multiprocessing child, including a spawned one that is still
+    re-importing the main script (parent_process() is only set after that).
+    """
+    return multiprocessing.parent_process() is not None or multiprocessing.current_process().name != "MainProcess"
+
+
+def apply_types(df: pd.DataFrame, types: dict = COLUMN_TYPES) -> pd.DataFrame:
+    """
+    Convert the columns named in `types`. A column whose values do not fit
+    (e.g. blanks in an int32 column) keeps the type pandas inferred.
+    """
+    for col, kind in types.items():
+        if col not in df.columns:
+            continue
+        try:
+            if kind == DATETIME:
+                df[col] = pd.to_datetime(df[col])
+            elif kind == INT32:
+                values = pd.to_numeric(df[col])
+                if values.notna().all() and values.between(-2**31, 2**31 - 1).all() and (values % 1 == 0).all():
+                    df[col] = values.astype("int32")
+            elif kind == FLOAT64:
+                df[col] = pd.to_numeric(df[col]).astype("float64")
+            elif kind == CATEGORY:
+                df[col] = df[col].astype("category")
+        except (ValueError, TypeError) as e:
+            print(f"[ingest] Keeping inferred type for {col}: {e}")
+    return df
+
+
+def concat(frames: list[pd.DataFrame]) -> pd.DataFrame:
+    """
+    pd.concat that keeps categoricals: when sheets have different categories
+    (e.g. the TDL and BSP crew IDs) they are unioned instead of decaying to object.
+    """
+    frames = [df.copy(deep=False) for df in frames]
+    for col in {col for df in frames for col in df.columns if isinstance(df[col].dtype, pd.CategoricalDtype)}:
+        if not all(col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype) for df in frames):
+            continue
+        categories = pd.Index(pd.concat([df[col].cat.categories.to_series() for df in frames]).unique())
+        for df in frames:
+            df[col] = df[col].cat.set_categories(categories)
+    return pd.concat(frames, ignore_index=True)
+
+
+def read_sheet(path: str, sheet: str | int = 0, engine: str = ENGINE) -> tuple[pd.DataFrame, float]:
+    """
+    Parse and type one sheet. Returns (frame, seconds).
+    """
+    start = time.perf_counter()
+    df = apply_types(pd.read_excel(path, sheet_name=sheet, engine=engine))
+    return df, time.perf_counter() - start
+
+
+def read_sheets(sources: list[tuple[str, str | int]], workers: int = WORKERS,
+                engine: str = ENGINE) -> list[pd.DataFrame]:
+    """
+    Parse [(path, sheet), ...] concurrently, one worker process per sheet,
+    and return the frames in the same order. Prints rows/s and peak memory.
+    Inside a worker process the sheets are parsed in-process instead.
+    """
+    start = time.perf_counter()
+    processes = min(workers, len(sources)) if len(sources) > 1 and not in_worker_process() else 0
+    if processes:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(read_sheet, *zip(*sources), [engine] * len(sources)))
+    else:
+        results = [read_sheet(path, sheet, engine) for path, sheet in sources]
+    elapsed = time.perf_counter() - start
+
+    rows = sum(len(df) for df, _ in results)
+    # Only this process's own peak: a forked parser's ru_maxrss starts from its parent's.
+    peak = peak_rss_mb()
+    memory = f", peak RSS {peak:.0f} MB in this process" if peak is not None else ""
+    mode = f"{processes} worker process{'es' if processes > 1 else ''}" if processes else "in-process"
+    print(f"[ingest] {rows} rows from {len(sources)} sheets in {elapsed:.2f}s "
+          f"({rows / elapsed:.0f} rows/s, {engine}, {mode}{memory})")
+    return [df for df, _ in results]
+
+
+if __name__ == "__main__":
+    # `python ingest.py book.xlsx[:sheet] ...` times the ingest of the given sheets.
+    parsed = []
+    for arg in sys.argv[1:]:
+        path, _, sheet = arg.partition(":")
+        parsed.append((path, sheet or 0))
+    for df in read_sheets(parsed):
+        dtypes = pd.Series([dtype.name for dtype in df.dtypes]).value_counts().to_dict()
+        print(f"{len(df)} rows, {df.memory_usage(deep=True).sum() / 2**20:.1f} MB, {dtypes}")
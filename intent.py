@@ -0,0 +1,111 @@
+# intent.py
+# Fast path for /nlquery: a small TF-IDF index over the template descriptions
+# that maps high-confidence questions straight to a (domain, sub) template, so
+# only the remaining questions pay for a T5 generate.
+import math
+import os
+import re
+from collections import Counter
+
+from query_templates import template_descriptions
+
+# Minimum cosine similarity, and lead over the runner-up, to trust a match.
+THRESHOLD = float(os.environ.get("INTENT_THRESHOLD", "0.5"))
+MARGIN = float(os.environ.get("INTENT_MARGIN", "0.1"))
+
+STOPWORDS = {
+    "a", "an", "the", "of", "for", "in", "on", "to", "is", "are", "was", "what", "whats",
+    "how", "many", "much", "did", "do", "does", "i", "me", "my", "show", "give", "tell",
+    "get", "crew", "member", "this", "last", "month", "please", "have", "has", "by", "with",
+}
+
+# Questions about rankings or filters across crews are what the T5 model is
+# for; never short-circuit those to a single-crew template.
+MODEL_WORDS = {
+    "which", "who", "most", "least", "top", "highest", "lowest", "above", "below",
+    "between", "more", "less", "greater", "sort", "order", "rank", "all", "every",
+}
+
+# Maps user wording onto the vocabulary of the descriptions.
+SYNONYMS = {
+    "km": "kms", "kilometre": "kms", "kilometer": "kms", "kilometers": "kms", "mileage": "kms",
+    "absence": "absent", "absences": "absent",
+    "nights": "night", "sickness": "sick", "ill": "sick",
+    "holiday": "nh", "holidays": "nh",
+    "phone": "mobile", "contact": "mobile",
+    "running": "run", "shunting": "shunt",
+    "trips": "trip", "journeys": "trip", "journey": "trip",
+    "footplating": "footplate",
+    "training": "test", "headquarter": "hq", "headquarters": "hq", "depot": "hq",
+}
+
+
+def tokenize(text: str) -> list[str]:
+    tokens = []
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        word = SYNONYMS.get(word, word)
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = SYNONYMS.get(word[:-1], word[:-1])
+        tokens.append(word)
+    return tokens
+
+
+class IntentIndex:
+    """
+    TF-IDF vectors of every template description; `classify` returns the best
+    template and its cosine score, or None below THRESHOLD / MARGIN.
+    """
+
+    def __init__(self, descriptions: dict = template_descriptions,
+                 threshold: float = THRESHOLD, margin: float = MARGIN):
+        self.threshold = threshold
+        self.margin = margin
+        docs = {
+            (domain, sub): Counter(tokenize(text))
+            for domain, subs in descriptions.items()
+            for sub, text in subs.items()
+        }
+        df = Counter(token for counts in docs.values() for token in counts)
+        self.idf = {token: math.log((1 + len(docs)) / (1 + n)) + 1 for token, n in df.items()}
+        self.vectors = {key: self._vector(counts) for key, counts in docs.items()}
+        self.hits = 0
+        self.misses = 0
+
+    def _vector(self, counts: Counter) -> dict:
+        vec = {t: c * self.idf[t] for t, c in counts.items() if t in self.idf}
+        norm = math.sqrt(sum(v * v for v in vec.values())) or 1.0
+        return {t: v / norm for t, v in vec.items()}
+
+    def scores(self, text: str) -> list[tuple[float, tuple[str, str]]]:
+        query = self._vector(Counter(tokenize(text)))
+        ranked = [
+            (sum(w * vec.get(t, 0.0) for t, w in query.items()), key)
+            for key, vec in self.vectors.items()
+        ]
+        ranked.sort(reverse=True)
+        return ranked
+
+    def classify(self, text: str) -> tuple[str, str, float] | None:
+        if MODEL_WORDS.intersection(re.findall(r"[a-z]+", text.lower())):
+            self.misses += 1
+            return None
+        ranked = self.scores(text)
+        (best, key), (second, _) = ranked[0], ranked[1]
+        if best >= self.threshold and best - second >= self.margin:
+            self.hits += 1
+            return key[0], key[1], best
+        self.misses += 1
+        return None
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+
+intent_index = IntentIndex()
+
+
+def classify(text: str) -> tuple[str, str, float] | None:
+    return intent_index.classify(text)
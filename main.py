@@ -1,13 +1,25 @@
 # main.py
+import itertools
+import logging
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
+from responses import ORJSONResponse
 from auth import authenticate_user, create_access_token, verify_token
-from models import QueryRequest, NaturalQueryRequest
-from query_logic import run_dynamic_query, run_nl_query
-from db import db_conn
+from models import QueryRequest, NaturalQueryRequest, BatchQueryRequest, BulkQueryRequest
+from query_logic import (run_dynamic_query, run_nl_query, run_batch_query, bulk_query_sql, run_bulk_query,
+                         stream_dynamic_query, stream_nl_query)
+import db
+from executors import run_db, run_model
+from nlp_model import start_background_load, unload_model, is_ready as model_ready
+from intent import classify, intent_index
+from result_cache import result_cache
+from metrics import TimingMiddleware, metrics_response, stage
 import pandas as pd
 
+logger = logging.getLogger(__name__)
+
 app = FastAPI(title="Crew Chatbot API")
 
 # Allow frontend calls
@@ -18,6 +30,41 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Stage timings per request: Server-Timing header and /metrics histograms
+app.add_middleware(TimingMiddleware, name="cmschat")
+
+
+@app.on_event("startup")
+def start_model_loading():
+    # Open the data snapshot (building it if needed) before serving; the model
+    # warms up in the background and /nlquery uses the keyword fallback until it is ready.
+    db.load()
+    start_background_load(db.columns)
+
+
+@app.on_event("shutdown")
+def release_model():
+    unload_model()
+
+
+@app.get("/ready")
+def readiness():
+    return {
+        "query": True,
+        "data_version": db.data_version,
+        "nlquery_model": model_ready(),
+        "intent": intent_index.stats(),
+    }
+
+
+@app.get("/metrics")
+def metrics():
+    return metrics_response()
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    return result_cache.stats()
 
 
 @app.post("/token")
@@ -29,36 +76,100 @@ def login(form_data: OAuth2PasswordRequestForm = Depends()):
     return {"access_token": token, "token_type": "bearer"}
 
 
+async def stream_response(chunks) -> StreamingResponse:
+    """
+    Run the query (the first chunk) before responding, so SQL errors still
+    produce an error status; the remaining chunks are streamed.
+    """
+    try:
+        first = await run_db(next, chunks)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return StreamingResponse(itertools.chain([first], chunks), media_type="application/json")
+
+
 @app.post("/query")
-def query_info(request: QueryRequest, username: str = Depends(verify_token)):
-    return run_dynamic_query(request.domain, request.sub, request.crew_id, request.month)
+async def query_info(request: QueryRequest, username: str = Depends(verify_token)):
+    if request.stream:
+        return await stream_response(stream_dynamic_query(
+            request.domain, request.sub, request.crew_id, request.month, request.limit, request.cursor))
+    return ORJSONResponse(await run_db(run_dynamic_query, request.domain, request.sub, request.crew_id, request.month))
+
+
+@app.post("/query/batch")
+async def batch_query_info(request: BatchQueryRequest, username: str = Depends(verify_token)):
+    """
+     Answer a list of (domain, sub) pairs and/or a whole domain for one crew/month
+    """
+    items = [(item.domain, item.sub) for item in request.items]
+    return ORJSONResponse(await run_db(run_batch_query, request.crew_id, request.month, items, request.domain))
+
+
+@app.post("/query/bulk")
+def bulk_query_info(request: BulkQueryRequest, username: str = Depends(verify_token)):
+    """
+     One template for many crew members (crew_ids or a whole HQ), streamed as NDJSON
+    """
+    # Validate up front so errors are returned before the stream starts.
+    bulk_query_sql(request.domain, request.sub, request.month, request.crew_ids, request.hq_code)
+    rows = run_bulk_query(request.domain, request.sub, request.month, request.crew_ids, request.hq_code)
+    return StreamingResponse(rows, media_type="application/x-ndjson")
+
+
+@app.post("/admin/refresh")
+def refresh_data(username: str = Depends(verify_token)):
+    """
+     Ingest new or changed mileage months and switch to the new snapshot
+    """
+    try:
+        return db.refresh()
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/nlquery")
-def natural_language_query(request: NaturalQueryRequest, username: str = Depends(verify_token)):
+async def natural_language_query(request: NaturalQueryRequest, username: str = Depends(verify_token)):
     """
-     Default: Try fine-tuned T5 NL2SQL model first
+     Fast path: questions that clearly match a menu template skip the model
+     Default: Try fine-tuned T5 NL2SQL model next
      Fallback: keyword → dynamic query
     """
     if not request.crew_id or not request.query:
         raise HTTPException(status_code=400, detail="crew_id and query are required")
+    result = await _answer_nl_query(request)
+    return result if isinstance(result, Response) else ORJSONResponse(result)
 
-    # --- Use fine-tuned model as primary ---
-    try:
-        return run_nl_query(request.query)
-    except Exception as e:
-        print(f"[DEBUG] run_nl_query failed: {e}")
+
+async def _answer_nl_query(request: NaturalQueryRequest):
+    # --- Template intent match ---
+    with stage("intent"):
+        intent = classify(request.query)
+    if intent is not None:
+        domain, sub, _ = intent
+        return await run_db(run_dynamic_query, domain, sub, request.crew_id, request.month)
+
+    # --- Use fine-tuned model as primary (once it has loaded) ---
+    if model_ready():
+        try:
+            if request.stream:
+                chunks = await run_model(stream_nl_query, request.query, request.limit, request.cursor)
+                return await stream_response(chunks)
+            return await run_model(run_nl_query, request.query)
+        except Exception as e:
+            logger.debug("run_nl_query failed, using the keyword fallback: %s", e)
 
     # --- Fallback: keyword-based ---
     query_text = request.query.lower()
     if "total kms" in query_text or "kms" in query_text:
-        return run_dynamic_query("3", "1", request.crew_id, request.month)
+        return await run_db(run_dynamic_query, "3", "1", request.crew_id, request.month)
     elif "footplate" in query_text:
-        return run_dynamic_query("3", "2", request.crew_id, request.month)
+        return await run_db(run_dynamic_query, "3", "2", request.crew_id, request.month)
     elif "leave" in query_text:
-        return run_dynamic_query("1", "5", request.crew_id, request.month)
+        return await run_db(run_dynamic_query, "1", "5", request.crew_id, request.month)
     elif "night" in query_text:
-        return run_dynamic_query("2", "7", request.crew_id, request.month)
+        return await run_db(run_dynamic_query, "2", "7", request.crew_id, request.month)
 
     return {
         "fallback": True,
@@ -0,0 +1,172 @@
+# metrics.py
+# Per-request stage timings and Prometheus-style histograms for both apps.
+#
+# TimingMiddleware starts a timing record for every HTTP request in a context
+# variable; code along the request path wraps its work in `with stage("sql"):`
+# (or calls record()) and the durations are added to that record, including
+# from executor threads (executors.py copies the context into them). When the
+# response starts, the record is sent as a Server-Timing header, and when it
+# ends the request and stage durations go into histograms, served in the
+# Prometheus text format by metrics_response() on each app's /metrics.
+#
+# Metrics are per process: with several workers (serve.py, uvicorn --workers)
+# each one reports its own requests.
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from starlette.datastructures import MutableHeaders
+from starlette.responses import Response
+
+# Send stage timings to clients in a Server-Timing header (set to 0 to keep them internal).
+SERVER_TIMING = os.environ.get("CMS_SERVER_TIMING", "1") != "0"
+# Histogram bucket upper bounds, in seconds.
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram keyed by label values, rendered in the
+    Prometheus text exposition format.
+    """
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...], buckets=BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, seconds: float, *label_values: str):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[i] += 1
+                    break
+            series[1] += seconds
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(values, list(counts), total, count) for values, (counts, total, count) in self._series.items()]
+        for values, counts, total, count in sorted(series):
+            labels = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.labels, values))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total}")
+            lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+REQUEST_SECONDS = Histogram("cms_request_duration_seconds", "Time from request to the end of the response body.",
+                            ("app", "endpoint", "method", "status"))
+STAGE_SECONDS = Histogram("cms_stage_duration_seconds", "Time spent in one stage of handling a request.",
+                          ("app", "endpoint", "stage"))
+
+
+class RequestTimings:
+    """
+    Stage durations recorded while handling one request, in order of first use.
+    """
+
+    def __init__(self):
+        self.stages = {}
+
+    def add(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def header(self, total: float) -> str:
+        parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.stages.items()]
+        parts.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(parts)
+
+
+_current: ContextVar[RequestTimings | None] = ContextVar("request_timings", default=None)
+
+
+def record(name: str, seconds: float):
+    """
+    Add `seconds` to stage `name` of the current request. Outside a request
+    (startup, background threads) it goes straight into the histogram.
+    """
+    timings = _current.get()
+    if timings is None:
+        STAGE_SECONDS.observe(seconds, "-", "-", name)
+    else:
+        timings.add(name, seconds)
+
+
+@contextmanager
+def stage(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+class TimingMiddleware:
+    """
+    ASGI middleware: times each HTTP request and its stages, adds the
+    Server-Timing header and feeds the histograms. Requests are labelled by
+    route template (e.g. /query), so path parameters do not multiply series.
+    """
+
+    def __init__(self, app, name: str):
+        self.app = app
+        self.name = name
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if SERVER_TIMING:
+                    MutableHeaders(scope=message).append("Server-Timing", timings.header(time.perf_counter() - start))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            elapsed = time.perf_counter() - start
+            route = scope.get("route")
+            endpoint = getattr(route, "path", None) or "unmatched"
+            REQUEST_SECONDS.observe(elapsed, self.name, endpoint, scope["method"], str(status))
+            for name, seconds in timings.stages.items():
+                STAGE_SECONDS.observe(seconds, self.name, endpoint, name)
+            _current.reset(token)
+
+
+def metrics_response() -> Response:
+    """
+    Every histogram in the Prometheus text exposition format.
+    """
+    lines = REQUEST_SECONDS.render() + STAGE_SECONDS.render()
+    return Response("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -5,11 +5,20 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel, Field
 import torch
-from transformers import T5ForConditionalGeneration, T5Tokenizer
 import json
+import numpy as np
 import pandas as pd
 import io
 import os
+import threading
+from functools import lru_cache
+
+from ingest import concat, read_sheets
+from metrics import TimingMiddleware, metrics_response, stage
+from model.constrained import DECODING, build_grammar
+from model.inference import BACKEND
+from model.registry import acquire_data, acquire_model, acquire_tokenizer
+from nlp_model import MODEL_DIR as NL2SQL_MODEL_DIR
 
 # --- 1. Set up the FastAPI App ---
 # Create an instance of the FastAPI application.
@@ -17,53 +26,232 @@ app = FastAPI(
     title="SQL Query Generator & Executor API",
     description="An API that generates and executes SQL queries from natural language inputs."
 )
+# Stage timings per request: Server-Timing header and /metrics histograms
+app.add_middleware(TimingMiddleware, name="model")
+
+# Trained model directory. Defaults to the chat app's (NL2SQL_MODEL_DIR), so in
+# unified_main both apps share one copy of the weights through the registry.
+MODEL_DIR = os.environ.get("SQL_MODEL_DIR", NL2SQL_MODEL_DIR)
+# BSP + TDL mileage workbook behind /query_crew_data.
+MILEAGE_FILE = os.environ.get("SQL_MILEAGE_FILE", "1_TDL_BSP_5Month_MILEAGE_DATA.xlsx")
+# Distinct prompts whose generated SQL is kept (generation is deterministic beam search).
+GENERATION_CACHE_SIZE = int(os.environ.get("SQL_GENERATION_CACHE", "1024"))
 
 # Global variables to hold the loaded model and data
 model = None
 tokenizer = None
 data = None
+# CREW_ID_V -> slice of that crew's rows in `data`, which is sorted by crew.
+crew_index = {}
+# json.dumps of the query_crew_data schema, built once the data is loaded.
+crew_schema_json = None
 device = "cpu"
+# Set once load_resources() has finished, whether or not everything loaded.
+resources_loaded = threading.Event()
+# Registry handles behind model, tokenizer and data; released on shutdown.
+_handles = []
+
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Downcasts numeric columns to the smallest dtype that holds them: integers
+    to int8/16/32, floats to float32 (values are only displayed, never summed here).
+    """
+    for col in df.select_dtypes("integer").columns:
+        df[col] = pd.to_numeric(df[col], downcast="integer")
+    for col in df.select_dtypes("floating").columns:
+        df[col] = pd.to_numeric(df[col], downcast="float")
+    return df
+
+
+def index_by_crew(df: pd.DataFrame) -> tuple[pd.DataFrame, dict]:
+    """
+    Sorts the rows by CREW_ID_V (stable, so each crew keeps its original row
+    order) and returns the frame with a {crew_id: slice} index into it.
+    Rows without a crew ID are kept at the end but not indexed.
+    """
+    if not isinstance(df["CREW_ID_V"].dtype, pd.CategoricalDtype):
+        df["CREW_ID_V"] = df["CREW_ID_V"].astype("category")
+    df = df.sort_values("CREW_ID_V", kind="stable", ignore_index=True)
+    # Missing IDs have code -1 and sort last, so the indexed rows are a prefix.
+    codes = df["CREW_ID_V"].cat.codes.to_numpy()
+    codes = codes[codes != -1]
+    categories = df["CREW_ID_V"].cat.categories
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.array([], dtype=int)
+    ends = np.r_[starts[1:], len(codes)]
+    index = {categories[codes[start]]: slice(int(start), int(end)) for start, end in zip(starts, ends)}
+    return df, index
 
-# --- 2. Load the Trained Model and Data on Startup ---
+
+def load_mileage_frame(excel_file: str) -> tuple[pd.DataFrame, dict]:
+    """
+    The BSP + TDL mileage rows, compacted and indexed by crew: (data, crew_index).
+    """
+    # Both sheets are parsed in parallel and typed by ingest.COLUMN_TYPES.
+    bsp_data, tdl_data = read_sheets([(excel_file, "BSP"), (excel_file, "TDL")])
+    frame = concat([bsp_data, tdl_data])
+    raw_mb = frame.memory_usage(deep=True).sum() / 2**20
+    frame, index = index_by_crew(compact_frame(frame))
+    print(f"{len(frame)} rows, {len(index)} crew, "
+          f"{raw_mb:.1f} MB -> {frame.memory_usage(deep=True).sum() / 2**20:.1f} MB")
+    return frame, index
+
+
+# --- 2. Load the Trained Model and Data in the Background on Startup ---
 @app.on_event("startup")
+def start_loading_resources():
+    """
+    Starts loading the model and data on a background thread so the server can
+    accept connections (and answer /ready) while the weights are read.
+    """
+    threading.Thread(target=load_resources, name="model-loader", daemon=True).start()
+
+
 def load_resources():
     """
-    Loads the trained model, tokenizer, and data from CSV files when the application starts.
-    This ensures that resources are ready for all subsequent requests.
+    Loads the trained model, tokenizer, and data from the Excel file.
     """
-    global model, tokenizer, data, device
-    
+    global model, tokenizer, data, crew_index, crew_schema_json, device
+    if resources_loaded.is_set():
+        # Already loaded in this process, e.g. by serve.py before forking the workers.
+        return
+
     # Set the device for running the model
     device = "cuda" if torch.cuda.is_available() else "cpu"
     print(f"Using device: {device}")
     
     # Load the trained model and tokenizer from the local directory
     try:
-        print("⏳ Loading model and tokenizer...")
-        tokenizer = T5Tokenizer.from_pretrained("./trained_sql_model")
-        model = T5ForConditionalGeneration.from_pretrained("./trained_sql_model").to(device)
+        print(f"⏳ Loading model and tokenizer ({BACKEND} backend)...")
+        tokenizer_handle = acquire_tokenizer(MODEL_DIR)
+        try:
+            model_handle = acquire_model(MODEL_DIR, device=device)
+        except Exception:
+            tokenizer_handle.release()
+            raise
+        _handles.extend([tokenizer_handle, model_handle])
+        tokenizer, model = tokenizer_handle.value, model_handle.value
         print("✅ Model and tokenizer loaded successfully!")
     except Exception as e:
         print(f"❌ Error loading model: {e}")
-        print("Please ensure you have run 'train_model.py' to create the 'trained_sql_model' directory.")
-        model = None
+        print(f"Please ensure you have run 'train_model.py' to create the '{MODEL_DIR}' directory.")
+        model = tokenizer = None
     
     # Load the XLSX data into a pandas DataFrame
     try:
         print("⏳ Loading data from Excel files...")
-        excel_file = "1_TDL_BSP_5Month_MILEAGE_DATA.xlsx"
+        excel_file = MILEAGE_FILE
         if not os.path.exists(excel_file):
             raise FileNotFoundError(f"File '{excel_file}' not found.")
             
-        bsp_data = pd.read_excel(excel_file, sheet_name="BSP")
-        tdl_data = pd.read_excel(excel_file, sheet_name="TDL")
-        data = pd.concat([bsp_data, tdl_data], ignore_index=True)
+        data_handle = acquire_data(excel_file, load_mileage_frame, name="mileage")
+        _handles.append(data_handle)
+        data, crew_index = data_handle.value
+        crew_schema_json = json.dumps({"crew_data": list(data.columns)})
         print("✅ Data loaded successfully!")
     except Exception as e:
         print(f"❌ Error loading data: {e}")
         print("Please ensure '1_TDL_BSP_5Month_MILEAGE_DATA.xlsx' is in the same directory and has 'BSP' and 'TDL' sheets.")
         data = None
 
+    if model is not None:
+        print(f"Decoding mode: {DECODING}")
+        if crew_schema_json is not None:
+            schema_token_ids(crew_schema_json)
+            sql_grammar(crew_schema_json)
+
+    resources_loaded.set()
+
+
+@app.on_event("shutdown")
+def release_resources():
+    """
+    Hands the model, tokenizer and data back to the registry.
+    """
+    global model, tokenizer, data, crew_index, crew_schema_json
+    model = tokenizer = data = crew_schema_json = None
+    crew_index = {}
+    schema_token_ids.cache_clear()
+    sql_grammar.cache_clear()
+    generate_cached.cache_clear()
+    for handle in _handles:
+        handle.release()
+    _handles.clear()
+    resources_loaded.clear()
+
+
+@lru_cache(maxsize=32)
+def sql_grammar(schema_json: str):
+    """
+    Grammar constraint over a schema's table and column names (None in free
+    decoding mode), built once per distinct schema.
+    """
+    schema = json.loads(schema_json)
+    columns = []
+    for names in schema.values():
+        if isinstance(names, (list, dict)):
+            columns += [str(name) for name in names]
+    return build_grammar(tokenizer, columns, [str(table) for table in schema])
+
+
+def generation_kwargs(schema_json: str) -> dict:
+    """
+    Arguments for model.generate: the schema's grammar constraints, or the original free-running search.
+    """
+    kwargs = {"num_beams": 5, "early_stopping": True}
+    grammar = sql_grammar(schema_json)
+    if grammar is not None:
+        kwargs.update(grammar.generate_kwargs())
+    else:
+        kwargs["max_length"] = 512
+    return kwargs
+
+
+@lru_cache(maxsize=32)
+def schema_token_ids(schema_json: str) -> tuple[int, ...]:
+    """
+    Token IDs of a schema's JSON, encoded once per distinct schema.
+    """
+    return tuple(tokenizer(schema_json, add_special_tokens=False).input_ids)
+
+
+def encode_prompt(question: str, schema_json: str) -> list[int]:
+    """
+    Token IDs of f"generate sql: {question} | {schema_json}", the same as
+    tokenizer.encode(..., truncation=True), but only the question part is
+    tokenized per request. The split is at a space, where the T5 tokenizer's
+    pieces never cross, so the concatenation is exact.
+    """
+    ids = tokenizer(f"generate sql: {question} |", add_special_tokens=False).input_ids
+    ids = ids + list(schema_token_ids(schema_json))
+    return ids[:tokenizer.model_max_length - 1] + [tokenizer.eos_token_id]
+
+
+@lru_cache(maxsize=GENERATION_CACHE_SIZE)
+def generate_cached(question: str, schema_json: str) -> str:
+    """
+    Generated SQL for one prompt. The schema is a suffix of the prompt and the
+    T5 encoder attends in both directions, so its encoder states depend on the
+    question; reuse is per whole prompt, not per schema prefix.
+    """
+    with stage("encode"):
+        input_ids = torch.tensor([encode_prompt(question, schema_json)], device=device)
+    with stage("generate"), torch.no_grad():
+        outputs = model.generate(input_ids, **generation_kwargs(schema_json))
+    with stage("decode"):
+        return tokenizer.decode(outputs[0], skip_special_tokens=True)
+
+
+def require_resources(need_data: bool = False):
+    """
+    503 while resources are still loading, 500 if loading finished without them.
+    """
+    if not resources_loaded.is_set():
+        raise HTTPException(status_code=503, detail="Resources are still loading. Please retry shortly.")
+    if model is None:
+        raise HTTPException(status_code=500, detail=f"Model not loaded. Please ensure the '{MODEL_DIR}' directory exists.")
+    if need_data and data is None:
+        raise HTTPException(status_code=500, detail="Application resources not loaded. Please check the logs.")
+
 
 # --- 3. Define the Request Body Structure ---
 # Pydantic is used to define the data structure for the API's request body.
@@ -97,27 +285,38 @@ def read_root():
     """
     return {"message": "SQL Query Generator & Executor API is running!"}
 
+@app.get("/ready")
+def readiness():
+    """
+    Reports whether the model and data have finished loading.
+    """
+    return {
+        "loaded": resources_loaded.is_set(),
+        "model": model is not None,
+        "data": data is not None,
+    }
+
+@app.get("/metrics")
+def metrics():
+    """
+    Request and stage latency histograms in the Prometheus text format.
+    """
+    return metrics_response()
+
 @app.post("/generate_sql")
 def generate_sql_query(request: QueryRequest):
     """
     Generates an SQL query based on a natural language input and a database schema.
     This endpoint only generates the query, it does not execute it.
     """
-    if model is None:
-        raise HTTPException(status_code=500, detail="Model not loaded. Please ensure 'trained_sql_model' directory exists.")
+    require_resources()
 
-    # Format the input for the model.
-    input_text = f"generate sql: {request.natural_language_query} | {json.dumps(request.schema)}"
-    
-    # Tokenize the input string for the model
-    input_ids = tokenizer.encode(input_text, return_tensors="pt", truncation=True).to(device)
-    
-    # Use the model to generate an output.
-    with torch.no_grad():
-        outputs = model.generate(input_ids, max_length=512, num_beams=5, early_stopping=True)
-    
-    # Decode the generated tokens back into a string.
-    generated_sql = tokenizer.decode(outputs[0], skip_special_tokens=True)
+    # Generate from "generate sql: <query> | <schema JSON>"; the schema's tokens are cached per schema.
+    schema_json = json.dumps(request.schema)
+    generated_sql = generate_cached(request.natural_language_query, schema_json)
+    grammar = sql_grammar(schema_json)
+    if grammar is not None and not grammar.is_valid(generated_sql):
+        raise HTTPException(status_code=422, detail=f"Generated SQL is outside the supported grammar: {generated_sql}")
     
     return {"generated_sql": generated_sql}
 
@@ -128,8 +327,7 @@ def query_crew_data(request: CrewDataRequest):
     A new, chatbot-like endpoint that takes a crew ID and a specific query type from a "menu".
     It then returns the result directly by automatically generating and executing the query.
     """
-    if model is None or data is None:
-        raise HTTPException(status_code=500, detail="Application resources not loaded. Please check the logs.")
+    require_resources(need_data=True)
 
     # A simple mapping to translate menu choices to column names
     column_mapping = {
@@ -143,30 +341,22 @@ def query_crew_data(request: CrewDataRequest):
     if not column_to_fetch:
         raise HTTPException(status_code=400, detail="Invalid data_to_fetch value. Options are: total_duty, total_kms, total_trips.")
 
-    # 1. Dynamically generate the schema for the model
-    schema = {
-        "crew_data": list(data.columns)
-    }
+    # 1. The schema for the model (crew_schema_json) is built once at load time
 
     # 2. Formulate the natural language query for the model based on the user's input
     natural_language_query = f"What is the {request.data_to_fetch} for the crew member with ID '{request.crew_id}'?"
     
-    # 3. Format the input for the model
-    input_text = f"generate sql: {natural_language_query} | {json.dumps(schema)}"
-    input_ids = tokenizer.encode(input_text, return_tensors="pt", truncation=True).to(device)
+    # 3-4. Generate the SQL query; only the question part of the prompt is tokenized here
+    generated_sql = generate_cached(natural_language_query, crew_schema_json)
     
-    # 4. Generate the SQL query
-    with torch.no_grad():
-        outputs = model.generate(input_ids, max_length=512, num_beams=5, early_stopping=True)
-    generated_sql = tokenizer.decode(outputs[0], skip_special_tokens=True)
-    
-    # 5. Execute the query using pandas
+    # 5. Execute the query against the crew index
+    rows = crew_index.get(request.crew_id)
+    if rows is None:
+        raise HTTPException(status_code=404, detail=f"Crew ID '{request.crew_id}' not found.")
     try:
-        data_filtered = data[data['CREW_ID_V'] == request.crew_id]
-        if data_filtered.empty:
-            raise HTTPException(status_code=404, detail=f"Crew ID '{request.crew_id}' not found.")
-        
-        result_value = data_filtered[column_to_fetch].iloc[0]
+        # The crew's first row, read straight from the column; no row subset is built.
+        with stage("lookup"):
+            result_value = data[column_to_fetch].iat[rows.start]
         
     except KeyError:
         raise HTTPException(status_code=400, detail=f"Column '{column_to_fetch}' not found in data.")
@@ -0,0 +1,288 @@
+# constrained.py
+# Schema-aware constrained decoding for the T5 SQL generators.
+#
+# The models are trained on the narrow grammar produced by
+# generate_training_data.generate_sql_query: one SELECT column, a fixed table
+# map, an optional HQ filter, BETWEEN / >= / <= on a numeric column and an
+# optional ORDER BY. In constrained mode every generation step follows that
+# grammar (over the real full_data column names): the text generated so far
+# is run through a character-level automaton of the grammar, and only tokens
+# that keep it a prefix of some valid statement are allowed next. Generation
+# stops at ';' and is bounded by the longest statement the grammar can
+# produce; is_valid() is only a backstop for output cut off by that bound.
+#
+# NL2SQL_DECODING=constrained (default) or free.
+
+import os
+import re
+import string
+
+from model.generate_training_data import HQ_CODES, SELECT_COLUMNS, SORT_BYS
+
+DECODING = os.environ.get("NL2SQL_DECODING", "constrained")
+
+TABLES = ["TDL_MILEAGE_DATA", "BSP_MILEAGE_DATA", "CREW_MILEAGE_DATA", "full_data"]
+
+# Headroom on top of the longest grammar statement, in tokens.
+LENGTH_MARGIN = 8
+
+
+def _identifier_pattern(names) -> str:
+    return "|".join(re.escape(n) for n in sorted(set(names), key=len, reverse=True))
+
+
+def _longest(names) -> str:
+    return max(names, key=len)
+
+
+def _grammar_columns(columns=()) -> list[str]:
+    return sorted(set(SELECT_COLUMNS) | {c for c in SORT_BYS if c} | set(columns))
+
+
+def _grammar_hqs() -> list[str]:
+    return [h for h in HQ_CODES if h]
+
+
+def sql_pattern(columns=(), tables=()) -> re.Pattern:
+    """
+    Regex accepting exactly the statements of the training grammar.
+    """
+    col = _identifier_pattern(_grammar_columns(columns))
+    table = _identifier_pattern(TABLES + list(tables))
+    hq = _identifier_pattern(_grammar_hqs())
+    cond = (rf"(?:HQ_CODE_C = '(?:{hq})'"
+            rf"|(?:{col}) BETWEEN \d+ AND \d+"
+            rf"|(?:{col}) (?:>=|<=) \d+)")
+    return re.compile(
+        rf"^SELECT (?:{col}) FROM (?:{table})"
+        rf"(?: WHERE {cond}(?: AND {cond})*)?"
+        rf"(?: ORDER BY (?:{col}) (?:ASC|DESC))?;$"
+    )
+
+
+class Automaton:
+    """
+    Character-level NFA built from literals, alternatives, options and
+    repetitions, determinized lazily: a state is the frozenset of NFA nodes
+    reachable after the text read so far, and the empty set means the text
+    has left the language. Transitions are memoized, so each (state, char)
+    pair is worked out once.
+    """
+
+    def __init__(self):
+        self._edges = []  # node -> {char: [node, ...]}
+        self._eps = []    # node -> [node, ...]
+        self._steps = {}
+
+    def _node(self) -> int:
+        self._edges.append({})
+        self._eps.append([])
+        return len(self._edges) - 1
+
+    def chars(self, chars: str) -> tuple[int, int]:
+        start, end = self._node(), self._node()
+        for char in chars:
+            self._edges[start].setdefault(char, []).append(end)
+        return start, end
+
+    def lit(self, text: str) -> tuple[int, int]:
+        start = node = self._node()
+        for char in text:
+            nxt = self._node()
+            self._edges[node].setdefault(char, []).append(nxt)
+            node = nxt
+        return start, node
+
+    def seq(self, *frags) -> tuple[int, int]:
+        for (_, end), (start, _) in zip(frags, frags[1:]):
+            self._eps[end].append(start)
+        return frags[0][0], frags[-1][1]
+
+    def alt(self, *frags) -> tuple[int, int]:
+        start, end = self._node(), self._node()
+        for frag_start, frag_end in frags:
+            self._eps[start].append(frag_start)
+            self._eps[frag_end].append(end)
+        return start, end
+
+    def words(self, words) -> tuple[int, int]:
+        return self.alt(*(self.lit(word) for word in sorted(set(words))))
+
+    def opt(self, frag) -> tuple[int, int]:
+        start, end = self._node(), self._node()
+        self._eps[start] += [frag[0], end]
+        self._eps[frag[1]].append(end)
+        return start, end
+
+    def star(self, frag) -> tuple[int, int]:
+        start, end = self._node(), self._node()
+        self._eps[start] += [frag[0], end]
+        self._eps[frag[1]] += [frag[0], end]
+        return start, end
+
+    def closure(self, nodes) -> frozenset:
+        seen, todo = set(nodes), list(nodes)
+        while todo:
+            for nxt in self._eps[todo.pop()]:
+                if nxt not in seen:
+                    seen.add(nxt)
+                    todo.append(nxt)
+        return frozenset(seen)
+
+    def step(self, state: frozenset, char: str) -> frozenset:
+        key = (state, char)
+        nxt = self._steps.get(key)
+        if nxt is None:
+            nxt = self.closure([n for node in state for n in self._edges[node].get(char, ())])
+            self._steps[key] = nxt
+        return nxt
+
+    def advance(self, state: frozenset, text: str) -> frozenset:
+        for char in text:
+            if not state:
+                break
+            state = self.step(state, char)
+        return state
+
+    def alphabet(self) -> set:
+        return {char for edges in self._edges for char in edges}
+
+
+def statement_automaton(columns=(), tables=()) -> tuple[Automaton, frozenset, int]:
+    """
+    The grammar of sql_pattern() as an Automaton. Returns (automaton, start
+    state, accepting node). The optional leading space is the word-start
+    marker of the first SentencePiece token, which decoding strips.
+    """
+    a = Automaton()
+    col = lambda: a.words(_grammar_columns(columns))  # noqa: E731
+    num = lambda: a.seq(a.chars(string.digits), a.star(a.chars(string.digits)))  # noqa: E731
+
+    def cond():
+        return a.alt(
+            a.seq(a.lit("HQ_CODE_C = '"), a.words(_grammar_hqs()), a.lit("'")),
+            a.seq(col(), a.lit(" BETWEEN "), num(), a.lit(" AND "), num()),
+            a.seq(col(), a.lit(" "), a.words([">=", "<="]), a.lit(" "), num()),
+        )
+
+    start, end = a.seq(
+        a.opt(a.lit(" ")),
+        a.lit("SELECT "), col(), a.lit(" FROM "), a.words(TABLES + list(tables)),
+        a.opt(a.seq(a.lit(" WHERE "), cond(), a.star(a.seq(a.lit(" AND "), cond())))),
+        a.opt(a.seq(a.lit(" ORDER BY "), col(), a.lit(" "), a.words(["ASC", "DESC"]))),
+        a.lit(";"),
+    )
+    return a, a.closure([start]), end
+
+
+class SQLGrammar:
+    """
+    Token-level constraint of generation to the SQL grammar.
+    `generate_kwargs()` plugs it into Hugging Face `generate`.
+    """
+
+    def __init__(self, tokenizer, columns=(), tables=()):
+        self.columns = list(columns)
+        self.tables = TABLES + [t for t in tables if t not in TABLES]
+        self.pattern = sql_pattern(self.columns, self.tables)
+        self.automaton, self.start, self._accept = statement_automaton(self.columns, self.tables)
+        self.eos_token_id = tokenizer.eos_token_id
+        self.pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else self.eos_token_id
+        self._special = set(tokenizer.all_special_ids)
+
+        # Text of every token that only uses characters the grammar can contain,
+        # in a trie so each state's allowed tokens are found by walking both together.
+        alphabet = self.automaton.alphabet()
+        self._pieces = {}
+        self._trie = ({}, [])
+        for token, i in tokenizer.get_vocab().items():
+            piece = token.replace("▁", " ")
+            if i in self._special or not piece or not set(piece) <= alphabet:
+                continue
+            self._pieces[i] = piece
+            node = self._trie
+            for char in piece:
+                node = node[0].setdefault(char, ({}, []))
+            node[1].append(i)
+        self._allowed_by_state = {}
+        self._after = {}
+
+        # ';' ends the statement, so any piece ending in it is treated as EOS.
+        self.stop_ids = [self.eos_token_id] + sorted(i for i, piece in self._pieces.items() if piece.endswith(";"))
+
+        worst_case = (
+            f"SELECT {_longest(_grammar_columns(self.columns))} FROM {_longest(self.tables)} "
+            f"WHERE HQ_CODE_C = '{_longest(_grammar_hqs())}' "
+            f"AND {_longest(_grammar_columns(self.columns))} BETWEEN 100000 AND 100000 "
+            f"ORDER BY {_longest(_grammar_columns(self.columns))} DESC;"
+        )
+        self.max_new_tokens = len(tokenizer.encode(worst_case)) + LENGTH_MARGIN
+
+    def state(self, token_ids) -> frozenset | None:
+        """
+        Automaton state after the generated `token_ids`, or None once EOS has been generated.
+        """
+        state = self.start
+        for i in token_ids:
+            if i == self.eos_token_id:
+                return None
+            if i in self._special:
+                continue
+            key = (state, i)
+            nxt = self._after.get(key)
+            if nxt is None:
+                piece = self._pieces.get(i)
+                nxt = self.automaton.advance(state, piece) if piece is not None else frozenset()
+                self._after[key] = nxt
+            state = nxt
+        return state
+
+    def allowed_tokens(self, state: frozenset) -> list[int]:
+        """
+        Token ids that keep the text a prefix of a valid statement; only EOS once it is complete.
+        """
+        allowed = self._allowed_by_state.get(state)
+        if allowed is not None:
+            return allowed
+        if self._accept in state:
+            allowed = [self.eos_token_id]
+        else:
+            found, todo = [], [(self._trie, state)]
+            while todo:
+                (children, ids), node_state = todo.pop()
+                found += ids
+                for char, child in children.items():
+                    nxt = self.automaton.step(node_state, char)
+                    if nxt:
+                        todo.append((child, nxt))
+            # Only reachable if generation was forced off the grammar; end it there.
+            allowed = sorted(found) or [self.eos_token_id]
+        self._allowed_by_state[state] = allowed
+        return allowed
+
+    def _allowed(self, batch_id, input_ids):
+        state = self.state(input_ids.tolist())
+        if state is None:
+            return [self.pad_token_id]
+        return self.allowed_tokens(state)
+
+    def generate_kwargs(self) -> dict:
+        return {
+            "prefix_allowed_tokens_fn": self._allowed,
+            "eos_token_id": self.stop_ids,
+            "max_new_tokens": self.max_new_tokens,
+        }
+
+    def is_valid(self, sql: str) -> bool:
+        return self.pattern.match(sql.strip()) is not None
+
+
+def build_grammar(tokenizer, columns=(), tables=()):
+    """
+    SQLGrammar for the configured decoding mode, or None in free mode.
+    """
+    if DECODING == "free":
+        return None
+    if DECODING != "constrained":
+        raise ValueError(f"Unknown decoding mode '{DECODING}'. Options are: constrained, free.")
+    return SQLGrammar(tokenizer, columns, tables)
@@ -0,0 +1,125 @@
+# evaluate_backends.py
+# Compares the inference backends in model/inference.py on a held-out set from
+# generate_training_data.py: exact-match accuracy against the reference SQL,
+# agreement with the eager model, load time, latency and resident memory.
+#
+#   python -m model.evaluate_backends --model-dir ./trained_sql_model --examples 200
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import time
+
+import pandas as pd
+
+from ingest import peak_rss_mb
+
+
+def held_out_examples(num_examples: int, seed: int, training_csv: str) -> list:
+    """
+    Reproducible examples whose input never appears in the training CSV.
+    """
+    from model.generate_training_data import generate_examples
+
+    seen = set()
+    if os.path.exists(training_csv):
+        seen = set(pd.read_csv(training_csv)["input"])
+    rng = random.Random(seed)
+    examples = []
+    while len(examples) < num_examples:
+        examples += [ex for ex in generate_examples(num_examples, rng) if ex["input"] not in seen]
+    return examples[:num_examples]
+
+
+def _rss_mb() -> float | None:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return None
+
+
+def _run_backend(backend: str, model_dir: str, inputs: list, num_beams: int, max_length: int) -> dict:
+    # Runs in a fresh process so memory numbers are not shared between backends.
+    import torch
+    from transformers import AutoTokenizer
+
+    from model.inference import load_seq2seq
+
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    model = load_seq2seq(model_dir, backend=backend)
+    load_s = time.perf_counter() - start
+    rss_loaded = _rss_mb()
+
+    outputs, latencies = [], []
+    for text in inputs:
+        input_ids = tokenizer.encode(text, return_tensors="pt", truncation=True)
+        start = time.perf_counter()
+        with torch.no_grad():
+            generated = model.generate(input_ids, max_length=max_length, num_beams=num_beams, early_stopping=True)
+        latencies.append((time.perf_counter() - start) * 1000)
+        outputs.append(tokenizer.decode(generated[0], skip_special_tokens=True))
+
+    latencies.sort()
+    # The worker is spawned fresh, so its high-water mark is its own.
+    peak = peak_rss_mb()
+    return {
+        "backend": backend,
+        "load_s": round(load_s, 2),
+        "model_rss_mb": round(rss_loaded - rss_before, 1) if rss_before is not None else None,
+        "peak_rss_mb": round(peak, 1) if peak is not None else None,
+        "latency_ms_p50": round(statistics.median(latencies), 2),
+        "latency_ms_p95": round(latencies[int(0.95 * (len(latencies) - 1))], 2),
+        "outputs": outputs,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Accuracy/latency/memory comparison of inference backends")
+    parser.add_argument("--model-dir", default="./trained_sql_model")
+    parser.add_argument("--backends", nargs="+", default=["eager", "int8", "onnx"])
+    parser.add_argument("--examples", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--training-csv", default="training_data.csv")
+    parser.add_argument("--num-beams", type=int, default=5)
+    parser.add_argument("--max-length", type=int, default=512)
+    parser.add_argument("--json", help="Write the report to this file as well")
+    args = parser.parse_args()
+
+    examples = held_out_examples(args.examples, args.seed, args.training_csv)
+    inputs = [ex["input"] for ex in examples]
+    references = [ex["output"] for ex in examples]
+
+    ctx = multiprocessing.get_context("spawn")
+    results = {}
+    for backend in args.backends:
+        with ctx.Pool(1) as pool:
+            try:
+                results[backend] = pool.apply(
+                    _run_backend, (backend, args.model_dir, inputs, args.num_beams, args.max_length)
+                )
+            except Exception as e:
+                print(f"❌ {backend}: {e}")
+
+    baseline = results.get("eager", {}).get("outputs")
+    report = []
+    for backend, result in results.items():
+        outputs = result.pop("outputs")
+        result["exact_match"] = round(sum(o == r for o, r in zip(outputs, references)) / len(references), 4)
+        if baseline is not None:
+            result["agreement_with_eager"] = round(sum(o == b for o, b in zip(outputs, baseline)) / len(baseline), 4)
+        report.append(result)
+
+    print(pd.DataFrame(report).to_string(index=False))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
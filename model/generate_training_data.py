@@ -1,11 +1,20 @@
 # generate_training_data.py
 # This script creates a synthetic dataset for training a Seq2Seq model.
+#
+#   python generate_training_data.py                      # 10,000 rows -> training_data.csv
+#   python generate_training_data.py --examples 5000000 --shards 16 --output training_shards
 
-import pandas as pd
-import random
+import argparse
+import hashlib
 import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
 from typing import Dict, Any
 
+import pandas as pd
+
 # Define the full set of all possible menu choices
 SELECT_COLUMNS = ["CREW_ID_V", "TOTAL_KMS", "TOTAL_DUTY", "RUN_DUTY_MIN", "NON_RUN_DUTY_MIN"]
 HQ_CODES = ["TDL", "BSP", None]
@@ -61,37 +70,211 @@ def generate_sql_query(options: Dict[str, Any]) -> str:
     
     return " ".join(query_parts) + ";"
 
-# Generate 10,000 synthetic data examples
-training_data = []
-for _ in range(10000):
+def random_example(rng: random.Random = random) -> Dict[str, str]:
+    """
+    One synthetic {"input", "output"} example. The input is the options JSON
+    with sorted keys, so it doubles as the canonical key of the example.
+    """
     # Randomly select options for each field
     options = {
-        "select_column": random.choice(SELECT_COLUMNS),
-        "hq_code": random.choice(HQ_CODES),
-        "sort_by": random.choice(SORT_BYS),
-        "sort_order": random.choice(SORT_ORDERS)
+        "select_column": rng.choice(SELECT_COLUMNS),
+        "hq_code": rng.choice(HQ_CODES),
+        "sort_by": rng.choice(SORT_BYS),
+        "sort_order": rng.choice(SORT_ORDERS)
     }
-    
+
     # Add optional numeric filters
-    column_for_filter = random.choice(list(NUMERIC_RANGES.keys()) + [None])
+    column_for_filter = rng.choice(list(NUMERIC_RANGES.keys()) + [None])
     if column_for_filter:
         min_v, max_v = NUMERIC_RANGES[column_for_filter]
-        if random.random() > 0.5:  # 50% chance to have a min_value
-            options['min_value'] = random.randint(min_v, max_v)
-        if random.random() > 0.5:  # 50% chance to have a max_value
-            options['max_value'] = random.randint(min_v, max_v)
+        if rng.random() > 0.5:  # 50% chance to have a min_value
+            options['min_value'] = rng.randint(min_v, max_v)
+        if rng.random() > 0.5:  # 50% chance to have a max_value
+            options['max_value'] = rng.randint(min_v, max_v)
 
     # Clean up the options dictionary by removing None values for cleaner input
     clean_options = {k: v for k, v in options.items() if v is not None}
-    
+
     # Generate the SQL query from the clean options
     sql_query = generate_sql_query(clean_options)
-    
+
     # The input for the model is a stringified JSON of the menu options.
     input_string = json.dumps(clean_options, sort_keys=True)
-    training_data.append({"input": input_string, "output": sql_query})
+    return {"input": input_string, "output": sql_query}
+
+
+def generate_examples(num_examples: int = 10000, rng: random.Random = random) -> list:
+    """
+    Generates synthetic {"input", "output"} examples. Pass a seeded random.Random
+    for a reproducible set (e.g. a held-out evaluation set).
+    """
+    return [random_example(rng) for _ in range(num_examples)]
+
+
+# --- Streaming, sharded generation ---
+# Stage 1 (parallel): each chunk of examples is generated from its own seeded
+# RNG and spilled to one file per output shard, chosen by a hash of the
+# example's canonical key. Stage 2 (parallel): each shard reads its spills in
+# chunk order, drops keys it has already seen and writes the final shard. Every
+# duplicate lands in the same shard, so a shard's own key set is enough to
+# dedupe globally, and the output is the same for a given seed and chunk size
+# however many workers run.
+
+def _key_digest(key: str) -> bytes:
+    return hashlib.blake2b(key.encode(), digest_size=8).digest()
+
+
+def _spill_path(spill_dir: str, chunk: int, shard: int) -> str:
+    return os.path.join(spill_dir, f"chunk{chunk:06d}-shard{shard:04d}.tsv")
+
+
+def _generate_chunk(chunk: int, size: int, seed: int, shards: int, spill_dir: str) -> int:
+    rng = random.Random(f"{seed}:{chunk}")
+    files = [open(_spill_path(spill_dir, chunk, shard), "w", encoding="utf-8") for shard in range(shards)]
+    try:
+        for _ in range(size):
+            example = random_example(rng)
+            shard = int.from_bytes(_key_digest(example["input"])[:4], "little") % shards
+            files[shard].write(f"{example['input']}\t{example['output']}\n")
+    finally:
+        for f in files:
+            f.close()
+    return size
+
+
+class _JsonlWriter:
+    def __init__(self, path: str):
+        self._file = open(path, "w", encoding="utf-8")
+
+    def write(self, example: Dict[str, str]):
+        self._file.write(json.dumps(example) + "\n")
+
+    def close(self):
+        self._file.close()
+
+
+class _ParquetWriter:
+    ROW_GROUP = 100_000
+
+    def __init__(self, path: str):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Parquet shards need pyarrow: pip install pyarrow") from e
+        self._pa = pa
+        self._schema = pa.schema([("input", pa.string()), ("output", pa.string())])
+        self._writer = pq.ParquetWriter(path, self._schema)
+        self._rows = []
+
+    def write(self, example: Dict[str, str]):
+        self._rows.append(example)
+        if len(self._rows) >= self.ROW_GROUP:
+            self._flush()
+
+    def _flush(self):
+        if self._rows:
+            self._writer.write_table(self._pa.Table.from_pylist(self._rows, schema=self._schema))
+            self._rows = []
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+
+WRITERS = {"jsonl": _JsonlWriter, "parquet": _ParquetWriter}
+
+
+def _reduce_shard(shard: int, chunks: int, spill_dir: str, out_dir: str, fmt: str) -> tuple:
+    path = os.path.join(out_dir, f"shard-{shard:04d}.{fmt}")
+    seen = set()
+    written = total = 0
+    writer = WRITERS[fmt](path)
+    try:
+        for chunk in range(chunks):
+            spill = _spill_path(spill_dir, chunk, shard)
+            with open(spill, encoding="utf-8") as f:
+                for line in f:
+                    total += 1
+                    key, sql = line.rstrip("\n").split("\t", 1)
+                    digest = _key_digest(key)
+                    if digest in seen:
+                        continue
+                    seen.add(digest)
+                    writer.write({"input": key, "output": sql})
+                    written += 1
+            os.remove(spill)
+    finally:
+        writer.close()
+    return os.path.basename(path), written, total
+
+
+def generate_shards(out_dir: str, num_examples: int, shards: int = 16, workers: int = 0,
+                    seed: int = 0, fmt: str = "jsonl", chunk_size: int = 100_000) -> dict:
+    """
+    Generates num_examples candidate examples into `shards` deduplicated files
+    in out_dir, plus a manifest.json describing them. Nothing is held in memory
+    except each shard's set of 8-byte key digests while it is being written.
+    """
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown format {fmt!r}; choose from {sorted(WRITERS)}")
+    workers = workers or os.cpu_count() or 1
+    spill_dir = os.path.join(out_dir, "_spill")
+    os.makedirs(spill_dir, exist_ok=True)
+    chunks = (num_examples + chunk_size - 1) // chunk_size
+    sizes = [min(chunk_size, num_examples - i * chunk_size) for i in range(chunks)]
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        generated = sum(pool.map(_generate_chunk, range(chunks), sizes, [seed] * chunks,
+                                 [shards] * chunks, [spill_dir] * chunks))
+        generated_at = time.perf_counter()
+        results = list(pool.map(_reduce_shard, range(shards), [chunks] * shards, [spill_dir] * shards,
+                                [out_dir] * shards, [fmt] * shards))
+    os.rmdir(spill_dir)
+    elapsed = time.perf_counter() - start
+
+    manifest = {
+        "seed": seed,
+        "format": fmt,
+        "chunk_size": chunk_size,
+        "generated": generated,
+        "examples": sum(written for _, written, _ in results),
+        "shards": [{"file": name, "examples": written} for name, written, _ in results],
+    }
+    with open(os.path.join(out_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"✅ {manifest['examples']} unique of {generated} generated examples "
+          f"({1 - manifest['examples'] / max(generated, 1):.1%} duplicates) in {shards} {fmt} shards, "
+          f"{elapsed:.1f}s ({generated / elapsed:.0f} examples/s; "
+          f"generate {generated_at - start:.1f}s, dedupe+write {elapsed - (generated_at - start):.1f}s)")
+    return manifest
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate synthetic NL2SQL training data")
+    parser.add_argument("--examples", type=int, default=10000)
+    parser.add_argument("--output", default="training_data.csv",
+                        help="CSV file, or the shard directory with --shards")
+    parser.add_argument("--shards", type=int, default=0,
+                        help="Stream deduplicated examples into this many shard files instead of one CSV")
+    parser.add_argument("--format", choices=sorted(WRITERS), default="jsonl")
+    parser.add_argument("--workers", type=int, default=0, help="Worker processes (default: all cores)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for sharded generation")
+    parser.add_argument("--chunk-size", type=int, default=100_000)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.shards:
+        generate_shards(args.output, args.examples, args.shards, args.workers, args.seed,
+                        args.format, args.chunk_size)
+    else:
+        # Generate 10,000 synthetic data examples
+        training_data = generate_examples(args.examples)
 
-# Save the generated data to a CSV file
-df = pd.DataFrame(training_data)
-df.to_csv("training_data.csv", index=False)
-print("✅ Training data generated and saved to training_data.csv!")
\ No newline at end of file
+        # Save the generated data to a CSV file
+        df = pd.DataFrame(training_data)
+        df.to_csv(args.output, index=False)
+        print(f"✅ Training data generated and saved to {args.output}!")
@@ -0,0 +1,56 @@
+# inference.py
+# Pluggable CPU inference backends for the T5 SQL generators used by
+# nlp_model.py and model/api_with_model.py.
+#
+#   eager - full-precision PyTorch (the original behaviour)
+#   int8  - PyTorch dynamic int8 quantization of the Linear layers
+#   onnx  - exported graph run with ONNX Runtime (needs `optimum[onnxruntime]`)
+#
+# The backend is chosen with the NL2SQL_BACKEND environment variable.
+
+import os
+
+import torch
+from transformers import AutoModelForSeq2SeqLM
+
+BACKENDS = ("eager", "int8", "onnx")
+BACKEND = os.environ.get("NL2SQL_BACKEND", "eager")
+
+
+def _load_eager(model_dir: str, device):
+    return AutoModelForSeq2SeqLM.from_pretrained(model_dir).to(device).eval()
+
+
+def _load_int8(model_dir: str, device):
+    if str(device) != "cpu":
+        raise ValueError("The int8 backend only runs on CPU")
+    model = AutoModelForSeq2SeqLM.from_pretrained(model_dir).eval()
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _load_onnx(model_dir: str, device):
+    try:
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    except ImportError as e:
+        raise ImportError("The onnx backend needs `pip install optimum[onnxruntime]`") from e
+    # Export once next to the PyTorch weights and reuse the graph afterwards.
+    onnx_dir = os.path.join(model_dir, "onnx")
+    if os.path.isdir(onnx_dir):
+        return ORTModelForSeq2SeqLM.from_pretrained(onnx_dir)
+    model = ORTModelForSeq2SeqLM.from_pretrained(model_dir, export=True)
+    model.save_pretrained(onnx_dir)
+    return model
+
+
+_LOADERS = {"eager": _load_eager, "int8": _load_int8, "onnx": _load_onnx}
+
+
+def load_seq2seq(model_dir: str, backend: str | None = None, device="cpu"):
+    """
+    Load a seq2seq SQL generator with the requested backend. Every backend
+    exposes the Hugging Face `generate` API, so callers do not change.
+    """
+    backend = backend or BACKEND
+    if backend not in _LOADERS:
+        raise ValueError(f"Unknown inference backend '{backend}'. Options are: {', '.join(BACKENDS)}.")
+    return _LOADERS[backend](model_dir, device)
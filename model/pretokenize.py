@@ -0,0 +1,215 @@
+# pretokenize.py
+# Tokenizes a training corpus once with the fast tokenizer and stores the
+# token IDs in flat memory-mapped files, so train_model.py starts without
+# re-tokenizing and can train on corpora larger than RAM.
+#
+# A cache entry is a directory named after a hash of the tokenizer, the
+# max_length and the data, holding:
+#   inputs.bin, labels.bin            all examples' token IDs back to back
+#   input_offsets.npy, label_offsets.npy
+#                                     example i is ids[offsets[i]:offsets[i + 1]]
+#   meta.json                         key, example/token counts, dtype, source
+#
+#   python pretokenize.py --data training_data.csv --tokenizer t5-small
+#   python pretokenize.py --data training_shards --tokenizer ./trained_sql_model
+#
+# The source is either a CSV with input/output columns or a shard directory
+# written by `generate_training_data.py --shards N`.
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+from torch.utils.data import Dataset
+
+CACHE_DIR = "./token_cache"
+FORMAT_VERSION = "1"
+CHUNK_ROWS = 10_000
+
+
+def _hash_file(digest, path: str):
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+
+
+def _shard_files(source: str) -> tuple[str, list[str]]:
+    with open(os.path.join(source, "manifest.json")) as f:
+        manifest = json.load(f)
+    return manifest["format"], [os.path.join(source, shard["file"]) for shard in manifest["shards"]]
+
+
+def cache_key(source: str, tokenizer, max_length: int) -> str:
+    """
+    Hash of everything the token IDs depend on: the tokenizer definition
+    (vocabulary, normalizer, special tokens), max_length and the data bytes.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{FORMAT_VERSION}:{max_length}:".encode())
+    # The serialized tokenizer also records the truncation/padding left by its last call; leave those out.
+    definition = json.loads(tokenizer.backend_tokenizer.to_str())
+    definition.pop("truncation", None)
+    definition.pop("padding", None)
+    digest.update(json.dumps(definition, sort_keys=True).encode())
+    digest.update(json.dumps(tokenizer.special_tokens_map, sort_keys=True).encode())
+    if os.path.isdir(source):
+        _hash_file(digest, os.path.join(source, "manifest.json"))
+        for path in _shard_files(source)[1]:
+            _hash_file(digest, path)
+    else:
+        _hash_file(digest, source)
+    return digest.hexdigest()
+
+
+def iter_chunks(source: str, rows: int = CHUNK_ROWS):
+    """
+    Yields (inputs, outputs) lists of up to `rows` examples from a CSV file or a shard directory.
+    """
+    if not os.path.isdir(source):
+        for df in pd.read_csv(source, chunksize=rows):
+            yield list(df["input"]), list(df["output"])
+        return
+    fmt, files = _shard_files(source)
+    inputs, outputs = [], []
+    for path in files:
+        if fmt == "parquet":
+            import pyarrow.parquet as pq
+
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=rows, columns=["input", "output"]):
+                yield batch.column("input").to_pylist(), batch.column("output").to_pylist()
+            continue
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                row = json.loads(line)
+                inputs.append(row["input"])
+                outputs.append(row["output"])
+                if len(inputs) == rows:
+                    yield inputs, outputs
+                    inputs, outputs = [], []
+    if inputs:
+        yield inputs, outputs
+
+
+def build(source: str, tokenizer, max_length: int, path: str) -> dict:
+    """
+    Tokenizes `source` chunk by chunk into the cache directory `path`. Only the
+    per-example lengths are kept in memory; the IDs go straight to disk.
+    """
+    dtype = np.uint16 if len(tokenizer) <= np.iinfo(np.uint16).max + 1 else np.uint32
+    tmp = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    start = time.perf_counter()
+    input_lengths, label_lengths = [], []
+    with open(os.path.join(tmp, "inputs.bin"), "wb") as inputs_file, \
+            open(os.path.join(tmp, "labels.bin"), "wb") as labels_file:
+        for inputs, outputs in iter_chunks(source):
+            for texts, target, out, lengths in ((inputs, False, inputs_file, input_lengths),
+                                                (outputs, True, labels_file, label_lengths)):
+                kwargs = {"text_target": texts} if target else {"text": texts}
+                ids = tokenizer(**kwargs, truncation=True, max_length=max_length).input_ids
+                lengths.append(np.fromiter(map(len, ids), dtype=np.int64, count=len(ids)))
+                out.write(np.fromiter(itertools.chain.from_iterable(ids), dtype=dtype).tobytes())
+
+    meta = {"source": os.path.abspath(source), "max_length": max_length, "dtype": np.dtype(dtype).name}
+    for name, lengths in (("input", input_lengths), ("label", label_lengths)):
+        offsets = np.zeros(sum(map(len, lengths)) + 1, dtype=np.int64)
+        if len(offsets) > 1:
+            np.cumsum(np.concatenate(lengths), out=offsets[1:])
+        np.save(os.path.join(tmp, f"{name}_offsets.npy"), offsets)
+        meta[f"{name}_tokens"] = int(offsets[-1])
+    meta["examples"] = len(offsets) - 1
+    meta["key"] = os.path.basename(path)
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+
+    try:
+        os.rename(tmp, path)
+    except OSError:
+        # Another process finished the same entry first; theirs is identical.
+        shutil.rmtree(tmp, ignore_errors=True)
+    elapsed = time.perf_counter() - start
+    print(f"✅ Tokenized {meta['examples']} examples ({meta['input_tokens']} input, {meta['label_tokens']} label tokens) "
+          f"in {elapsed:.1f}s ({meta['examples'] / max(elapsed, 1e-9):.0f} examples/s) -> {path}")
+    return meta
+
+
+def pretokenize(source: str, tokenizer, max_length: int = 512, cache_dir: str = CACHE_DIR) -> str:
+    """
+    Cache directory holding `source` tokenized by `tokenizer`, building it if
+    this tokenizer, max_length and data have not been seen before.
+    """
+    if not tokenizer.is_fast:
+        raise ValueError("pretokenize needs a fast tokenizer (AutoTokenizer with use_fast=True)")
+    path = os.path.join(cache_dir, cache_key(source, tokenizer, max_length))
+    if os.path.exists(os.path.join(path, "meta.json")):
+        print(f"✅ Using pre-tokenized corpus {path}")
+        return path
+    os.makedirs(cache_dir, exist_ok=True)
+    build(source, tokenizer, max_length, path)
+    return path
+
+
+class MemmapSQLDataset(Dataset):
+    """
+    Random access to a pretokenize() cache entry. Token IDs stay on disk and
+    are paged in by the OS as batches touch them; only the offsets are read
+    up front. Pickles by path, so DataLoader workers reopen the files rather
+    than receiving a copy.
+    """
+    def __init__(self, path, limit=0):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.limit = min(limit, self.meta["examples"]) if limit else self.meta["examples"]
+        self._open()
+
+    def _open(self):
+        dtype = np.dtype(self.meta["dtype"])
+        self.input_offsets = np.load(os.path.join(self.path, "input_offsets.npy"), mmap_mode="r")
+        self.label_offsets = np.load(os.path.join(self.path, "label_offsets.npy"), mmap_mode="r")
+        # np.memmap refuses empty files, which an empty corpus produces.
+        self.inputs = np.memmap(os.path.join(self.path, "inputs.bin"), dtype=dtype, mode="r") \
+            if self.meta["input_tokens"] else np.empty(0, dtype=dtype)
+        self.labels = np.memmap(os.path.join(self.path, "labels.bin"), dtype=dtype, mode="r") \
+            if self.meta["label_tokens"] else np.empty(0, dtype=dtype)
+        self.lengths = np.diff(self.input_offsets[:self.limit + 1])
+
+    def __getstate__(self):
+        return {"path": self.path, "meta": self.meta, "limit": self.limit}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._open()
+
+    def __getitem__(self, idx):
+        return {
+            "input_ids": self.inputs[self.input_offsets[idx]:self.input_offsets[idx + 1]].tolist(),
+            "labels": self.labels[self.label_offsets[idx]:self.label_offsets[idx + 1]].tolist(),
+        }
+
+    def __len__(self):
+        return self.limit
+
+
+def main():
+    from transformers import AutoTokenizer
+
+    parser = argparse.ArgumentParser(description="Tokenize a training corpus into a memory-mapped cache")
+    parser.add_argument("--data", default="training_data.csv", help="CSV file or generate_training_data.py shard directory")
+    parser.add_argument("--tokenizer", default="t5-small", help="Tokenizer name or directory (the training --base-model)")
+    parser.add_argument("--max-length", type=int, default=512)
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    args = parser.parse_args()
+    tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
+    print(pretokenize(args.data, tokenizer, args.max_length, args.cache_dir))
+
+
+if __name__ == "__main__":
+    main()
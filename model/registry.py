@@ -0,0 +1,116 @@
+# registry.py
+# Process-wide registry of heavy resources (model weights, tokenizers, data
+# frames) shared by every app mounted in one process. Each resource is loaded
+# on first acquire, keyed by its resolved path so two apps pointing at the same
+# directory or file get the same object, and dropped when the last holder
+# releases it.
+
+import os
+import threading
+from typing import Any, Callable
+
+from transformers import AutoTokenizer
+
+from model.inference import BACKEND, load_seq2seq
+
+
+class Handle:
+    """
+    One reference to a registry entry. `value` is the shared object; call
+    `release()` when done with it (extra calls are ignored).
+    """
+
+    def __init__(self, registry: "Registry", key: tuple, value: Any):
+        self._registry = registry
+        self.key = key
+        self.value = value
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.value = None
+            self._registry._release(self.key)
+
+
+class _Entry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = None
+        self.loaded = False
+        self.refs = 0
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def acquire(self, key: tuple, loader: Callable[[], Any]) -> Handle:
+        """
+        Handle on the object for `key`, calling `loader` only if no holder has it loaded.
+        Concurrent first acquires of the same key wait for a single load.
+        """
+        with self._lock:
+            entry = self._entries.setdefault(key, _Entry())
+            entry.refs += 1
+        try:
+            with entry.lock:
+                if not entry.loaded:
+                    print(f"[registry] Loading {key}")
+                    entry.value = loader()
+                    entry.loaded = True
+                else:
+                    print(f"[registry] Sharing {key} ({entry.refs} holders)")
+        except BaseException:
+            self._release(key)
+            raise
+        return Handle(self, key, entry.value)
+
+    def _release(self, key: tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry.refs -= 1
+            if entry.refs <= 0:
+                del self._entries[key]
+                print(f"[registry] Released {key}")
+
+    def stats(self) -> list[dict]:
+        with self._lock:
+            return [{"key": list(key), "refs": entry.refs, "loaded": entry.loaded}
+                    for key, entry in self._entries.items()]
+
+
+registry = Registry()
+
+
+def _resolve(path: str) -> str:
+    return os.path.realpath(path)
+
+
+def acquire_model(model_dir: str, device="cpu", backend: str | None = None) -> Handle:
+    """
+    Seq2seq model for model_dir on `device`, shared per (directory, backend, device).
+    """
+    backend = backend or BACKEND
+    path = _resolve(model_dir)
+    return registry.acquire(("model", path, backend, str(device)),
+                            lambda: load_seq2seq(path, backend=backend, device=device))
+
+
+def acquire_tokenizer(model_dir: str) -> Handle:
+    """
+    Fast tokenizer for model_dir, shared per directory.
+    """
+    path = _resolve(model_dir)
+    return registry.acquire(("tokenizer", path), lambda: AutoTokenizer.from_pretrained(path))
+
+
+def acquire_data(path: str, loader: Callable[[str], Any], name: str = "data") -> Handle:
+    """
+    Dataset built by loader(path) (e.g. a DataFrame), shared per (name, file).
+    """
+    path = _resolve(path)
+    return registry.acquire((name, path), lambda: loader(path))
@@ -1,101 +1,357 @@
 # train_model.py
 # This script trains a T5 model to generate SQL queries.
+#
+# Batches are padded per batch (not to the longest example in the file), drawn
+# from length buckets so examples in a batch have similar lengths, and
+# accumulated over several steps to reach a useful effective batch size.
+#
+#   python -m model.train_model --data model/training_data.csv
+#   python -m model.train_model --data model/training_data.csv --batch-size 16 --accumulation 2 --workers 4 --bf16
+#
+# With --shards the examples are streamed from the shard directory written by
+# `generate_training_data.py --shards N` and tokenized on the fly by the loader
+# workers, so the training set never has to fit in memory.
+#
+#   python -m model.train_model --shards training_shards --workers 4
+#
+# By default the corpus (CSV or shards) is first tokenized into a memory-mapped
+# cache by pretokenize.py, keyed by tokenizer and data, so later runs on the
+# same data start immediately. --no-token-cache tokenizes in memory instead
+# (or, with --shards, on the fly in the loader workers).
+
+import argparse
+import json
+import os
+import random
+import time
 
 import pandas as pd
 import torch
-from torch.utils.data import Dataset, DataLoader
-from transformers import T5ForConditionalGeneration, T5Tokenizer
+from torch.utils.data import Dataset, DataLoader, IterableDataset, Sampler, get_worker_info
+from transformers import AutoTokenizer, DataCollatorForSeq2Seq, T5ForConditionalGeneration
 from torch.optim import AdamW
 
-device = "cuda" if torch.cuda.is_available() else "cpu"
-print(f"Using device: {device}")
-
-# --- 1. Load Data and Tokenizer ---
-try:
-    df = pd.read_csv("training_data.csv")
-    print("✅ Training data loaded.")
-except FileNotFoundError:
-    print("❌ Error: 'training_data.csv' not found. Please run 'generate_training_data.py' first.")
-    exit()
-
-# Load a pre-trained T5 model and its tokenizer from Hugging Face
-try:
-    tokenizer = T5Tokenizer.from_pretrained("t5-small")
-    model = T5ForConditionalGeneration.from_pretrained("t5-small").to(device)
-    print("✅ T5-small model and tokenizer loaded.")
-except Exception as e:
-    print(f"❌ Error loading model or tokenizer: {e}")
-    print("Please ensure you have an active internet connection to download the model.")
-    exit()
-
-# --- 2. Tokenize the Data ---
-# The tokenizer will convert our text data into numerical IDs that the model understands.
-tokenized_inputs = tokenizer(list(df['input']), return_tensors="pt", padding=True, truncation=True)
-tokenized_outputs = tokenizer(list(df['output']), return_tensors="pt", padding=True, truncation=True)
-
-# Set the labels for the model. We use the output tokens as the target.
-labels = tokenized_outputs.input_ids
-labels[labels == tokenizer.pad_token_id] = -100 # Important: tell the model to ignore padding in the loss calculation
-
-# --- 3. Prepare for Training ---
-# Create a custom dataset class to handle our data format.
+from model.pretokenize import CACHE_DIR, MemmapSQLDataset, pretokenize
+
+
+# --- Dataset and sampling ---
 class SQLDataset(Dataset):
-    def __init__(self, encodings, labels):
-        self.encodings = encodings
+    """
+    Unpadded token IDs per example; padding happens per batch in the collator.
+    """
+    def __init__(self, input_ids, labels):
+        self.input_ids = input_ids
         self.labels = labels
+        self.lengths = [len(ids) for ids in input_ids]
     def __getitem__(self, idx):
-        item = {key: val[idx] for key, val in self.encodings.items()}
-        item['labels'] = self.labels[idx]
-        return item
+        return {"input_ids": self.input_ids[idx], "labels": self.labels[idx]}
     def __len__(self):
         return len(self.labels)
 
-# Create the dataset and dataloader
-dataset = SQLDataset(tokenized_inputs, labels)
-# ⚙️ IMPORTANT CHANGE: We've reduced the batch size to 2 to solve the memory error.
-dataloader = DataLoader(dataset, batch_size=2)
-print(f"Using a batch size of {dataloader.batch_size} to conserve memory.")
-
-# Set up the optimizer. AdamW is a standard choice.
-optimizer = AdamW(model.parameters(), lr=1e-4)
-
-# --- 4. The Training Loop ---
-model.train() # Set the model to training mode
-print("🚀 Starting training...")
-
-for epoch in range(3):  # Train for 3 full passes over the dataset
-    print(f"--- Epoch {epoch + 1}/{3} ---")
-
-    # Use enumerate to get a count of the batches processed
-    for batch_num, batch in enumerate(dataloader):
-        optimizer.zero_grad() # Clear previous gradients
-        input_ids = batch['input_ids'].to(device)
-        attention_mask = batch['attention_mask'].to(device)
-        labels = batch['labels'].to(device)
-        
-        # Forward Pass: The model makes a prediction
-        outputs = model(input_ids=input_ids, attention_mask=attention_mask, labels=labels)
-        
-        # Calculate Loss: The loss tells us how wrong the model's prediction was
-        loss = outputs.loss
-        
-        # Backward Pass: The loss is sent back through the model to figure out what to adjust
-        loss.backward()
-        
-        # Optimizer Step: The optimizer adjusts the model's weights to reduce the loss
-        optimizer.step()
-        
-        # Print a progress update every 500 batches
-        if (batch_num + 1) % 500 == 0:
-            print(f"Processed batch {batch_num + 1}/{len(dataloader)}. Current Loss: {loss.item():.4f}")
-
-    print(f"🎉 Epoch {epoch + 1} complete. Final loss for this epoch: {loss.item():.4f}")
-
-# --- 5. Save the Trained Model ---
-# This is a critical step! It saves your trained model and its tokenizer to a folder.
-print("✅ Saving trained model...")
-model.save_pretrained("./trained_sql_model")
-tokenizer.save_pretrained("./trained_sql_model")
-
-print("✨ Training successful! Model saved to the 'trained_sql_model' directory.")
-print("You can now proceed to run 'api_with_model.py'.")
+
+class LengthBucketSampler(Sampler):
+    """
+    Yields batches of indices whose examples have similar lengths: the data is
+    shuffled, cut into buckets of `bucket_batches` batches, each bucket is
+    sorted by length and split into batches, and the batches are shuffled.
+    Batches stay random across epochs while carrying little padding.
+    """
+    def __init__(self, lengths, batch_size, bucket_batches=50, shuffle=True, seed=0):
+        self.lengths = lengths
+        self.batch_size = batch_size
+        self.bucket_size = batch_size * max(1, bucket_batches)
+        self.shuffle = shuffle
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __iter__(self):
+        rng = random.Random(self.seed + self.epoch)
+        indices = list(range(len(self.lengths)))
+        if self.shuffle:
+            rng.shuffle(indices)
+        batches = []
+        for start in range(0, len(indices), self.bucket_size):
+            bucket = sorted(indices[start:start + self.bucket_size], key=lambda i: self.lengths[i])
+            batches += [bucket[i:i + self.batch_size] for i in range(0, len(bucket), self.batch_size)]
+        if self.shuffle:
+            rng.shuffle(batches)
+        return iter(batches)
+
+    def __len__(self):
+        return (len(self.lengths) + self.batch_size - 1) // self.batch_size
+
+
+class ShardedSQLDataset(IterableDataset):
+    """
+    Streams the shards listed in a generate_training_data.py manifest. The
+    shard files are split between DataLoader workers; each worker passes its
+    rows through a shuffle buffer, tokenizes a bucket of `bucket_batches`
+    batches at a time and yields them as length-sorted batches in random
+    order, like LengthBucketSampler does for the in-memory dataset. Use it
+    with DataLoader(batch_size=None) so the collator pads each yielded batch.
+    """
+    def __init__(self, shard_dir, tokenizer, max_length, batch_size, bucket_batches=50,
+                 shuffle_buffer=10_000, seed=0, max_examples=0):
+        with open(os.path.join(shard_dir, "manifest.json")) as f:
+            manifest = json.load(f)
+        self.format = manifest["format"]
+        self.files = [os.path.join(shard_dir, shard["file"]) for shard in manifest["shards"]]
+        self.examples = manifest["examples"]
+        if max_examples:
+            self.examples = min(self.examples, max_examples)
+        self.tokenizer = tokenizer
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self.bucket_size = batch_size * max(1, bucket_batches)
+        self.shuffle_buffer = shuffle_buffer
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def _rows(self, files):
+        for path in files:
+            if self.format == "parquet":
+                import pyarrow.parquet as pq
+
+                for batch in pq.ParquetFile(path).iter_batches(columns=["input", "output"]):
+                    yield from zip(batch.column("input").to_pylist(), batch.column("output").to_pylist())
+            else:
+                with open(path, encoding="utf-8") as f:
+                    for line in f:
+                        row = json.loads(line)
+                        yield row["input"], row["output"]
+
+    def _shuffled(self, rows, rng):
+        buffer = []
+        for row in rows:
+            if len(buffer) < self.shuffle_buffer:
+                buffer.append(row)
+                continue
+            i = rng.randrange(len(buffer))
+            yield buffer[i]
+            buffer[i] = row
+        rng.shuffle(buffer)
+        yield from buffer
+
+    def _batches(self, bucket, rng):
+        inputs = self.tokenizer([row[0] for row in bucket], truncation=True, max_length=self.max_length)
+        targets = self.tokenizer(text_target=[row[1] for row in bucket], truncation=True, max_length=self.max_length)
+        order = sorted(range(len(bucket)), key=lambda i: len(inputs.input_ids[i]))
+        batches = [order[i:i + self.batch_size] for i in range(0, len(order), self.batch_size)]
+        rng.shuffle(batches)
+        for batch in batches:
+            yield [{"input_ids": inputs.input_ids[i], "labels": targets.input_ids[i]} for i in batch]
+
+    def __iter__(self):
+        info = get_worker_info()
+        worker, workers = (info.id, info.num_workers) if info else (0, 1)
+        # Every worker shuffles the file list the same way before taking its share.
+        files = list(self.files)
+        random.Random(f"{self.seed}:{self.epoch}").shuffle(files)
+        rng = random.Random(f"{self.seed}:{self.epoch}:{worker}")
+        limit = self.examples // workers + (worker < self.examples % workers)
+
+        bucket = []
+        for count, row in enumerate(self._shuffled(self._rows(files[worker::workers]), rng)):
+            if count >= limit:
+                break
+            bucket.append(row)
+            if len(bucket) == self.bucket_size:
+                yield from self._batches(bucket, rng)
+                bucket = []
+        if bucket:
+            yield from self._batches(bucket, rng)
+
+
+def tokenize_dataset(df, tokenizer, max_length):
+    """
+    Tokenizes inputs and target SQL without padding.
+    """
+    inputs = tokenizer(list(df['input']), truncation=True, max_length=max_length)
+    targets = tokenizer(text_target=list(df['output']), truncation=True, max_length=max_length)
+    return SQLDataset(inputs.input_ids, targets.input_ids)
+
+
+def build_dataloader(dataset, tokenizer, model, args):
+    # Pads input_ids/attention_mask with the pad token and labels with -100 (ignored by the loss).
+    collator = DataCollatorForSeq2Seq(tokenizer, model=model, label_pad_token_id=-100)
+    loader_kwargs = {
+        "collate_fn": collator,
+        "num_workers": args.workers,
+        "persistent_workers": args.workers > 0,
+        "pin_memory": args.device == "cuda",
+    }
+    if isinstance(dataset, IterableDataset):
+        # The dataset yields whole batches. Workers are restarted every epoch so
+        # they pick up the epoch set on the dataset.
+        loader_kwargs["persistent_workers"] = False
+        return DataLoader(dataset, batch_size=None, **loader_kwargs)
+    if args.bucket_batches > 0:
+        sampler = LengthBucketSampler(dataset.lengths, args.batch_size, args.bucket_batches, seed=args.seed)
+        return DataLoader(dataset, batch_sampler=sampler, **loader_kwargs)
+    return DataLoader(dataset, batch_size=args.batch_size, shuffle=True, **loader_kwargs)
+
+
+# --- Training loop ---
+def train(model, dataloader, args):
+    optimizer = AdamW(model.parameters(), lr=args.lr)
+    autocast = torch.autocast(device_type=args.device, dtype=torch.bfloat16, enabled=args.bf16)
+    model.train() # Set the model to training mode
+    print(f"🚀 Starting training: batch size {args.batch_size} x {args.accumulation} accumulation steps, "
+          f"{args.workers} loader workers, bf16 {'on' if args.bf16 else 'off'}, {torch.get_num_threads()} threads")
+
+    total_examples, total_time = 0, 0.0
+    for epoch in range(args.epochs):
+        print(f"--- Epoch {epoch + 1}/{args.epochs} ---")
+        for source in (dataloader.batch_sampler, dataloader.dataset):
+            if hasattr(source, "set_epoch"):
+                source.set_epoch(epoch)
+        # Streamed datasets have no length; only report a total when there is one.
+        total = f"/{len(dataloader)}" if not isinstance(dataloader.dataset, IterableDataset) else ""
+        optimizer.zero_grad()
+        epoch_start = window_start = time.perf_counter()
+        epoch_examples = window_examples = real_tokens = padded_tokens = 0
+        steps = pending = batch_num = 0
+        loss = None
+
+        def progress(now):
+            print(f"Processed batch {batch_num + 1}{total}. "
+                  f"Loss: {loss.item() * args.accumulation:.4f}, "
+                  f"{window_examples / (now - window_start):.1f} examples/s, "
+                  f"{real_tokens / max(padded_tokens, 1):.0%} of input tokens are real")
+
+        for batch_num, batch in enumerate(dataloader):
+            batch = {key: val.to(args.device) for key, val in batch.items()}
+            with autocast:
+                # The loss is averaged over the accumulated micro-batches.
+                loss = model(**batch).loss / args.accumulation
+            loss.backward()
+            pending += 1
+
+            size = batch["input_ids"].shape[0]
+            epoch_examples += size
+            window_examples += size
+            real_tokens += int(batch["attention_mask"].sum())
+            padded_tokens += batch["attention_mask"].numel()
+
+            if pending == args.accumulation:
+                optimizer.step()
+                optimizer.zero_grad()
+                steps += 1
+                pending = 0
+                if steps % args.log_every == 0:
+                    now = time.perf_counter()
+                    progress(now)
+                    window_start, window_examples = now, 0
+
+        # Step on the micro-batches left over at the end of the epoch. Their
+        # losses were divided by args.accumulation, so rescale the gradients
+        # to the mean over the `pending` micro-batches actually accumulated.
+        if pending:
+            if pending != args.accumulation:
+                for param in model.parameters():
+                    if param.grad is not None:
+                        param.grad.mul_(args.accumulation / pending)
+            optimizer.step()
+            optimizer.zero_grad()
+        if window_examples:
+            progress(time.perf_counter())
+
+        elapsed = time.perf_counter() - epoch_start
+        total_examples += epoch_examples
+        total_time += elapsed
+        # An empty loader (e.g. an empty CSV) leaves no loss to report.
+        final = f"final loss {loss.item() * args.accumulation:.4f}" if loss is not None else "no batches"
+        print(f"🎉 Epoch {epoch + 1} complete in {elapsed:.1f}s: {epoch_examples / elapsed:.1f} examples/s, {final}")
+    print(f"⏱️ Overall throughput: {total_examples / total_time:.1f} examples/s")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Fine-tune T5 to generate SQL")
+    parser.add_argument("--data", default="training_data.csv")
+    parser.add_argument("--shards", default=None,
+                        help="Stream from this generate_training_data.py shard directory instead of --data")
+    parser.add_argument("--token-cache", default=CACHE_DIR, help="Directory of pre-tokenized corpora")
+    parser.add_argument("--no-token-cache", action="store_true",
+                        help="Tokenize at startup (--data) or while streaming (--shards) instead of using the cache")
+    parser.add_argument("--shuffle-buffer", type=int, default=10_000,
+                        help="Rows per loader worker in the --shards shuffle buffer")
+    parser.add_argument("--base-model", default="t5-small")
+    parser.add_argument("--output", default="./trained_sql_model")
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--lr", type=float, default=1e-4)
+    parser.add_argument("--batch-size", type=int, default=8, help="Examples per forward pass")
+    parser.add_argument("--accumulation", type=int, default=4,
+                        help="Forward passes per optimizer step (effective batch = batch size x this)")
+    parser.add_argument("--bucket-batches", type=int, default=50,
+                        help="Batches per length bucket (0 = plain shuffled batches)")
+    parser.add_argument("--workers", type=int, default=2, help="DataLoader worker processes")
+    parser.add_argument("--threads", type=int, default=0, help="PyTorch CPU threads (0 = PyTorch default)")
+    parser.add_argument("--bf16", action="store_true", help="bfloat16 autocast (CPU or GPU)")
+    parser.add_argument("--max-length", type=int, default=512)
+    parser.add_argument("--max-examples", type=int, default=0, help="Train on the first N examples only")
+    parser.add_argument("--log-every", type=int, default=50, help="Optimizer steps between progress lines")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    args.device = "cuda" if torch.cuda.is_available() else "cpu"
+    print(f"Using device: {args.device}")
+    torch.manual_seed(args.seed)
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    # --- 1. Check the Data, Load the Tokenizer ---
+    data = args.shards or args.data
+    if not os.path.exists(os.path.join(args.shards, "manifest.json") if args.shards else args.data):
+        print(f"❌ Error: '{data}' not found. Please run 'generate_training_data.py' first.")
+        return
+
+    # Load a pre-trained T5 model and its (fast) tokenizer from Hugging Face
+    try:
+        tokenizer = AutoTokenizer.from_pretrained(args.base_model)
+        model = T5ForConditionalGeneration.from_pretrained(args.base_model).to(args.device)
+        print(f"✅ {args.base_model} model and tokenizer loaded.")
+    except Exception as e:
+        print(f"❌ Error loading model or tokenizer: {e}")
+        print("Please ensure you have an active internet connection to download the model.")
+        return
+
+    # --- 2. Tokenize the Data (unpadded) ---
+    if not args.no_token_cache:
+        dataset = MemmapSQLDataset(pretokenize(data, tokenizer, args.max_length, args.token_cache), args.max_examples)
+        print(f"✅ {len(dataset)} pre-tokenized examples mapped.")
+    elif args.shards:
+        dataset = ShardedSQLDataset(args.shards, tokenizer, args.max_length, args.batch_size,
+                                    max(1, args.bucket_batches), args.shuffle_buffer, args.seed, args.max_examples)
+        print(f"✅ Streaming {dataset.examples} examples from {len(dataset.files)} shards in '{args.shards}'.")
+    else:
+        df = pd.read_csv(args.data)
+        if args.max_examples:
+            df = df.head(args.max_examples)
+        print("✅ Training data loaded.")
+        dataset = tokenize_dataset(df, tokenizer, args.max_length)
+    dataloader = build_dataloader(dataset, tokenizer, model, args)
+
+    # --- 3. Train ---
+    train(model, dataloader, args)
+
+    # --- 4. Save the Trained Model ---
+    # This is a critical step! It saves your trained model and its tokenizer to a folder.
+    print("✅ Saving trained model...")
+    model.save_pretrained(args.output)
+    tokenizer.save_pretrained(args.output)
+
+    print(f"✨ Training successful! Model saved to the '{args.output}' directory.")
+    print("You can now proceed to run 'api_with_model.py'.")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,27 @@ class QueryRequest(BaseModel):
     month: str
     domain: str
     sub: str
+    stream: bool = False
+    limit: int | None = None
+    cursor: str | None = None
 class NaturalQueryRequest(BaseModel):
     crew_id: str
     month: str
     query: str
+    stream: bool = False
+    limit: int | None = None
+    cursor: str | None = None
+class MetricRef(BaseModel):
+    domain: str
+    sub: str
+class BatchQueryRequest(BaseModel):
+    crew_id: str
+    month: str
+    items: list[MetricRef] = []
+    domain: str | None = None
+class BulkQueryRequest(BaseModel):
+    domain: str
+    sub: str
+    month: str
+    crew_ids: list[str] = []
+    hq_code: str | None = None
@@ -1,26 +1,225 @@
 # nlp_model.py
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
 import torch
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+
+from model.constrained import DECODING, build_grammar
+from model.inference import BACKEND
+from model.registry import acquire_model, acquire_tokenizer
+from metrics import record
 
 #  Path to your fine-tuned model
-MODEL_DIR = "D:/Music/t5_sql_finetuned"  # ✅ Use forward slashes or raw string
+MODEL_DIR = os.environ.get("NL2SQL_MODEL_DIR", "D:/Music/t5_sql_finetuned")  # ✅ Use forward slashes or raw string
 
+# Micro-batching: requests arriving within MAX_WAIT_MS share one generate call.
+MAX_BATCH_SIZE = int(os.environ.get("NL2SQL_MAX_BATCH", "8"))
+MAX_WAIT_MS = float(os.environ.get("NL2SQL_MAX_WAIT_MS", "5"))
+# Number of distinct (normalized) questions whose SQL is kept.
+CACHE_SIZE = int(os.environ.get("NL2SQL_CACHE_SIZE", "1024"))
 
-# Load tokenizer + model once
-tokenizer = AutoTokenizer.from_pretrained(MODEL_DIR)
-model = AutoModelForSeq2SeqLM.from_pretrained(MODEL_DIR)
 
+# Loaded once by load_model(), normally on a background thread at startup
+tokenizer = None
+model = None
+grammar = None
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model = model.to(device)
 
-def nl_to_sql(nl_query: str) -> str:
+_ready = threading.Event()
+_load_lock = threading.Lock()
+# Registry handles for the tokenizer and model; shared with other apps in this process.
+_handles = []
+
+
+class ModelNotReady(RuntimeError):
+    pass
+
+
+def load_model(columns=()):
     """
-    Convert natural language query into SQL using fine-tuned T5.
+    Load tokenizer + model. Safe to call more than once; only the first call loads.
+    `columns` are the full_data column names allowed by constrained decoding.
+    """
+    global tokenizer, model, grammar
+    with _load_lock:
+        if _ready.is_set():
+            return
+        print(f"[nlp_model] Loading model from {MODEL_DIR} ({BACKEND} backend, {DECODING} decoding)")
+        tokenizer_handle = acquire_tokenizer(MODEL_DIR)
+        try:
+            model_handle = acquire_model(MODEL_DIR, device=device)
+        except Exception:
+            tokenizer_handle.release()
+            raise
+        _handles[:] = [tokenizer_handle, model_handle]
+        tokenizer, model = tokenizer_handle.value, model_handle.value
+        grammar = build_grammar(tokenizer, columns)
+        _ready.set()
+        print("[nlp_model] Model ready")
+
+
+def unload_model():
+    """
+    Drop this app's references to the tokenizer and model (freed once no other app holds them).
+    """
+    global tokenizer, model, grammar
+    with _load_lock:
+        _ready.clear()
+        tokenizer = model = grammar = None
+        for handle in _handles:
+            handle.release()
+        _handles.clear()
+        with _sql_cache_lock:
+            _sql_cache.clear()
+
+
+def _load_in_background(columns):
+    try:
+        load_model(columns)
+    except Exception as e:
+        print(f"[nlp_model] Model load failed: {e}")
+
+
+def start_background_load(columns=()):
+    threading.Thread(target=_load_in_background, args=(columns,), name="nl2sql-loader", daemon=True).start()
+
+
+def is_ready() -> bool:
+    return _ready.is_set()
+
+
+def generate_batch(nl_queries: list[str]) -> list[str]:
+    """
+    Convert a batch of natural language queries into SQL with one padded generate call.
     """
-    inp = f"NL2SQL: {nl_query}"
-    inputs = tokenizer([inp], return_tensors="pt", truncation=True).to(device)
+    inps = [f"NL2SQL: {q}" for q in nl_queries]
+    inputs = tokenizer(inps, return_tensors="pt", padding=True, truncation=True).to(device)
+    gen_kwargs = grammar.generate_kwargs() if grammar is not None else {"max_new_tokens": 128}
     with torch.no_grad():
-        outputs = model.generate(**inputs, max_new_tokens=128)
-    sql = tokenizer.decode(outputs[0], skip_special_tokens=True)
+        outputs = model.generate(**inputs, **gen_kwargs)
+    return tokenizer.batch_decode(outputs, skip_special_tokens=True)
+
+
+def is_valid_sql(sql: str) -> bool:
+    """
+    False if constrained decoding is on and the SQL falls outside its grammar
+    (only possible when generation hit max_new_tokens).
+    """
+    return grammar is None or grammar.is_valid(sql)
+
+
+class BatchQueue:
+    """
+    Collects concurrent requests and runs them through `fn` in batches on one
+    worker thread, so parallel callers share a forward pass instead of
+    competing for the same PyTorch threads. The thread starts on first use,
+    and again in a process forked from this one (see serve.py). Each caller
+    records its wait for a batch and the batch's run time as stages
+    "<name>_queue" and "<name>_generate".
+    """
+
+    def __init__(self, fn, max_batch_size: int, max_wait_ms: float, name: str = "nl2sql"):
+        self.fn = fn
+        self.name = name
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._reset()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._queue = queue.Queue()
+        self._start_lock = threading.Lock()
+        self._worker = None
+
+    def submit(self, item):
+        if self._worker is None:
+            with self._start_lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name=f"{self.name}-batcher", daemon=True)
+                    self._worker.start()
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        result = future.result()
+        waited, ran = future.timing
+        record(f"{self.name}_queue", waited)
+        record(f"{self.name}_generate", ran)
+        return result
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            start = time.perf_counter()
+            try:
+                results = self.fn([item for item, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            ran = time.perf_counter() - start
+            for (_, future, queued), result in zip(batch, results):
+                future.timing = (start - queued, ran)
+                future.set_result(result)
+
+
+_batcher = BatchQueue(generate_batch, MAX_BATCH_SIZE, MAX_WAIT_MS)
+
+
+# Generated SQL by normalize_query(question), least recently used first.
+_sql_cache = OrderedDict()
+_sql_cache_lock = threading.Lock()
+
+
+def normalize_query(nl_query: str) -> str:
+    """
+    Cache key for a question: whitespace collapsed and case folded.
+    """
+    return " ".join(nl_query.casefold().split())
+
+
+def _cached_nl_to_sql(nl_query: str) -> str:
+    """
+    Questions differing only in case or spacing share one cache entry. The
+    model still sees the original case, as column names and HQ codes are
+    upper case in its training inputs.
+    """
+    key = normalize_query(nl_query)
+    with _sql_cache_lock:
+        sql = _sql_cache.get(key)
+        if sql is not None:
+            _sql_cache.move_to_end(key)
+            return sql
+    sql = _batcher.submit(" ".join(nl_query.split()))
+    with _sql_cache_lock:
+        _sql_cache[key] = sql
+        if len(_sql_cache) > CACHE_SIZE:
+            _sql_cache.popitem(last=False)
     return sql
 
+
+def nl_to_sql(nl_query: str) -> str:
+    """
+    Convert natural language query into SQL using fine-tuned T5.
+    Repeated questions are answered from an LRU cache; the rest are micro-batched.
+    Raises ModelNotReady while the model is still loading.
+    """
+    if not _ready.is_set():
+        raise ModelNotReady("NL2SQL model is still loading")
+    return _cached_nl_to_sql(nl_query)
@@ -1,11 +1,24 @@
 # query_logic.py
+import base64
+import json
+import os
+import time
+import orjson
 import pandas as pd
 from fastapi import HTTPException
-from db import db_conn
+import db
+from metrics import record, stage
 from query_templates import query_templates
-from nlp_model import nl_to_sql
+from cube import parse_sum_template
+from nlp_model import nl_to_sql, is_valid_sql
+from result_cache import cache_key, result_cache
 
-MONTH_WHERE = "CREW_ID_V = :crew_id AND STRFTIME('%Y-%m', DATE_TIME_D) = :month"
+# MONTH is materialized by db.py as STRFTIME('%Y-%m', DATE_TIME_D) and indexed
+# together with CREW_ID_V, so this predicate is a single index range lookup.
+MONTH_WHERE = "CREW_ID_V = :crew_id AND MONTH = :month"
+# Server-side cap on rows returned by one streamed page (0 = no cap).
+MAX_STREAM_ROWS = int(os.environ.get("CMS_MAX_STREAM_ROWS", "0"))
+STREAM_BATCH_SIZE = 500
 
 
 def _needs_month(sql: str) -> bool:
@@ -28,31 +41,263 @@ def _finalize_sql_and_params(sql_template: str, crew_id: str, month: str | None)
     return sql, params
 
 
-def run_query(sql: str, params: dict) -> list[dict]:
+def fetch_rows(sql: str, params: dict) -> tuple[list[str], list[tuple]]:
+    """
+    Column names and row tuples straight from the cursor.
+    """
+    with db.read_connection() as conn, stage("sql"):
+        cursor = conn.execute(sql, params)
+        return [d[0] for d in cursor.description], cursor.fetchall()
+
+
+def _cached_records(sql: str, params: dict) -> list[dict]:
+    """
+    Execute through the result cache, which is dropped when the data version changes.
+    """
+    key = cache_key(sql, params)
+    version = db.data_version
+    records = result_cache.get(key, version)
+    if records is None:
+        columns, rows = fetch_rows(sql, params)
+        records = [dict(zip(columns, row)) for row in rows]
+        result_cache.put(key, version, records)
+    return records
+
+
+def run_query(sql: str, params: dict, as_frame: bool = False):
+    """
+    Result rows as dicts, or a DataFrame when as_frame=True.
+    """
     try:
-        df = pd.read_sql_query(sql, db_conn, params=params)
-        return df.to_dict(orient="records")
+        if as_frame:
+            with db.read_connection() as conn, stage("sql"):
+                return pd.read_sql_query(sql, conn, params=params)
+        return _cached_records(sql, params)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-def run_dynamic_query(domain: str, sub: str, crew_id: str, month: str | None):
+def iter_query(sql: str, params: dict, batch_size: int = 1000):
+    """
+    Yield result rows as dicts, fetching from the cursor in batches.
+    The pooled connection is held until the generator is exhausted or closed.
+    Only time spent in SQLite counts towards the "sql" stage.
+    """
+    with db.read_connection() as conn:
+        start = time.perf_counter()
+        cursor = conn.execute(sql, params)
+        columns = [d[0] for d in cursor.description]
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            record("sql", time.perf_counter() - start)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(zip(columns, row))
+            start = time.perf_counter()
+
+
+def encode_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(str(offset).encode()).decode()
+
+
+def decode_cursor(cursor: str | None) -> int:
+    if not cursor:
+        return 0
+    try:
+        offset = int(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return offset
+
+
+def page_limit(limit: int | None) -> int | None:
+    if limit is not None and limit <= 0:
+        raise HTTPException(status_code=400, detail="limit must be positive")
+    if MAX_STREAM_ROWS:
+        return min(limit or MAX_STREAM_ROWS, MAX_STREAM_ROWS)
+    return limit
+
+
+def stream_json(sql: str, params: dict, limit: int | None, offset: int, head: dict | None = None):
+    """
+    Stream {**head, "results": [...], "next_cursor": ...} as JSON chunks, reading
+    the cursor in batches. One extra row is fetched to know whether another
+    page exists. The query runs on the first next(), so errors surface before
+    any bytes are sent.
+    """
+    inner = sql.strip().rstrip(";")
+    paged = f"SELECT * FROM ({inner}) LIMIT :_limit OFFSET :_offset"
+    params = {**params, "_limit": limit + 1 if limit is not None else -1, "_offset": offset}
+    rows = iter_query(paged, params, batch_size=STREAM_BATCH_SIZE)
+    first = next(rows, None)
+
+    prefix = b"".join(orjson.dumps(k) + b":" + orjson.dumps(v, default=str) + b"," for k, v in (head or {}).items())
+    yield b"{" + prefix + b'"results":['
+    count = 0
+    chunk = []
+    row = first
+    while row is not None and (limit is None or count < limit):
+        chunk.append(orjson.dumps(row, default=str))
+        count += 1
+        if len(chunk) == STREAM_BATCH_SIZE:
+            yield (b"," if count > len(chunk) else b"") + b",".join(chunk)
+            chunk = []
+        row = next(rows, None)
+    if chunk:
+        yield (b"," if count > len(chunk) else b"") + b",".join(chunk)
+    next_cursor = encode_cursor(offset + count) if row is not None else None
+    rows.close()
+    yield b'],"next_cursor":' + orjson.dumps(next_cursor) + b"}"
+
+
+def _template_sql(domain: str, sub: str, crew_id: str, month: str | None):
     if domain not in query_templates:
         raise HTTPException(status_code=400, detail="Invalid domain")
     domain_dict = query_templates[domain]
     if sub not in domain_dict:
         raise HTTPException(status_code=400, detail=f"Invalid sub option in domain: {domain}")
-    sql_template = domain_dict[sub]
-    sql, params = _finalize_sql_and_params(sql_template, crew_id, month)
+    return _finalize_sql_and_params(domain_dict[sub], crew_id, month)
+
+
+def run_dynamic_query(domain: str, sub: str, crew_id: str, month: str | None):
+    sql, params = _template_sql(domain, sub, crew_id, month)
+    db.check_current()
+    cube = db.cube
+    if cube is not None and month and cube.serves(domain, sub):
+        with stage("cube"):
+            return cube.lookup(domain, sub, crew_id, month)
     return run_query(sql, params)
+
+
+def stream_dynamic_query(domain: str, sub: str, crew_id: str, month: str | None,
+                         limit: int | None = None, cursor: str | None = None):
+    sql, params = _template_sql(domain, sub, crew_id, month)
+    return stream_json(sql, params, page_limit(limit), decode_cursor(cursor))
+
+
+def _batch_items(items: list[tuple[str, str]], domain: str | None) -> list[tuple[str, str]]:
+    pairs = list(items)
+    if domain is not None:
+        if domain not in query_templates:
+            raise HTTPException(status_code=400, detail="Invalid domain")
+        pairs += [(domain, sub) for sub in query_templates[domain]]
+    for d, s in pairs:
+        if d not in query_templates:
+            raise HTTPException(status_code=400, detail="Invalid domain")
+        if s not in query_templates[d]:
+            raise HTTPException(status_code=400, detail=f"Invalid sub option in domain: {d}")
+    return list(dict.fromkeys(pairs))
+
+
+def run_batch_query(crew_id: str, month: str, items: list[tuple[str, str]], domain: str | None = None):
+    """
+    Answer several (domain, sub) templates for one crew/month together.
+    SUM templates come from the cube, or are merged into a single SELECT over
+    full_data when the cube is disabled; other templates run one by one.
+    """
+    pairs = _batch_items(items, domain)
+    if not month:
+        raise HTTPException(status_code=400, detail="Month is required for this query")
+    results = {}
+    merged = []
+    db.check_current()
+    cube = db.cube
+    for d, s in pairs:
+        if cube is not None and cube.serves(d, s):
+            with stage("cube"):
+                results[(d, s)] = cube.lookup(d, s, crew_id, month)
+            continue
+        parsed = parse_sum_template(query_templates[d][s])
+        if parsed is None:
+            results[(d, s)] = run_dynamic_query(d, s, crew_id, month)
+        else:
+            merged.append(((d, s), parsed))
+
+    if merged:
+        select = ", ".join(
+            f'SUM({expr}) AS "{d}_{s}_{alias}"' for (d, s), parsed in merged for expr, alias in parsed
+        )
+        sql = f"SELECT {select} FROM full_data WHERE {MONTH_WHERE}"
+        row = run_query(sql, {"crew_id": crew_id, "month": month})[0]
+        for (d, s), parsed in merged:
+            results[(d, s)] = [{alias: row[f"{d}_{s}_{alias}"] for _, alias in parsed}]
+
+    return [{"domain": d, "sub": s, "results": results[(d, s)]} for d, s in pairs]
+
+
+def bulk_query_sql(domain: str, sub: str, month: str, crew_ids: list[str], hq_code: str | None):
+    """
+    Rewrite a {where} template into one query grouped by CREW_ID_V, covering
+    either an explicit list of crew IDs or every crew at an HQ.
+    """
+    if domain not in query_templates:
+        raise HTTPException(status_code=400, detail="Invalid domain")
+    if sub not in query_templates[domain]:
+        raise HTTPException(status_code=400, detail=f"Invalid sub option in domain: {domain}")
+    sql = query_templates[domain][sub]
+    if "{where}" not in sql:
+        raise HTTPException(status_code=400, detail="Bulk queries support monthly templates only")
+    if not month:
+        raise HTTPException(status_code=400, detail="Month is required for this query")
+    if bool(crew_ids) == bool(hq_code):
+        raise HTTPException(status_code=400, detail="Give either crew_ids or hq_code")
+
+    params = {"month": month}
+    if crew_ids:
+        # json_each keeps this a single bound parameter however many IDs are sent.
+        where = "CREW_ID_V IN (SELECT value FROM json_each(:crew_ids)) AND MONTH = :month"
+        params["crew_ids"] = json.dumps(crew_ids)
+    else:
+        where = "HQ_CODE_C = :hq_code AND MONTH = :month"
+        params["hq_code"] = hq_code
+    sql = "SELECT CREW_ID_V, " + sql[len("SELECT "):].replace("{where}", where)
+    if " GROUP BY " in sql:
+        sql = sql.replace(" GROUP BY ", " GROUP BY CREW_ID_V, ")
+    else:
+        sql += " GROUP BY CREW_ID_V"
+    return sql + " ORDER BY CREW_ID_V", params
+
+
+def run_bulk_query(domain: str, sub: str, month: str, crew_ids: list[str], hq_code: str | None):
+    """
+    Stream the bulk result as NDJSON lines, one per crew (and group) row.
+    """
+    sql, params = bulk_query_sql(domain, sub, month, crew_ids, hq_code)
+    for row in iter_query(sql, params):
+        yield orjson.dumps(row, default=str).decode() + "\n"
+
+
+def generate_nl_sql(nl: str) -> str:
+    sql = nl_to_sql(nl)
+    if not is_valid_sql(sql):
+        raise HTTPException(status_code=422, detail=f"Generated SQL is outside the supported grammar: {sql}")
+    return sql
+
+
 def run_nl_query(nl: str):
     """
     Run a free-form natural language query using the fine-tuned T5 model.
     """
     try:
-        sql = nl_to_sql(nl)
-        print(f"[DEBUG] Generated SQL: {sql}")
-        df = pd.read_sql_query(sql, db_conn)
-        return {"sql": sql, "results": df.to_dict(orient="records")}
+        sql = generate_nl_sql(nl)
+        return {"sql": sql, "results": _cached_records(sql, {})}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"NL2SQL error: {e}")
+
+
+def stream_nl_query(nl: str, limit: int | None = None, cursor: str | None = None):
+    """
+    Streaming variant of run_nl_query: {"sql", "results", "next_cursor"} sent in chunks.
+    """
+    try:
+        sql = generate_nl_sql(nl)
+        return stream_json(sql, {}, page_limit(limit), decode_cursor(cursor), head={"sql": sql})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"NL2SQL error: {e}")
@@ -49,8 +49,63 @@ query_templates = {
 
     "6": {  # Location & Time Info
         "1": "SELECT HQ_CODE_C, SUM(TOTAL_DUTY) AS DUTY, SUM(TOTAL_KMS) AS KMS FROM full_data WHERE {where} GROUP BY HQ_CODE_C",
-        "2": "SELECT STRFTIME('%Y-%m', DATE_TIME_D) AS MONTH, SUM(TOTAL_DUTY) AS TOTAL_DUTY, SUM(TOTAL_KMS) AS TOTAL_KMS, SUM(NO_OF_TRIPS_N) AS TOTAL_TRIPS FROM full_data WHERE CREW_ID_V = :crew_id GROUP BY MONTH ORDER BY MONTH",
+        "2": "SELECT MONTH, SUM(TOTAL_DUTY) AS TOTAL_DUTY, SUM(TOTAL_KMS) AS TOTAL_KMS, SUM(NO_OF_TRIPS_N) AS TOTAL_TRIPS FROM full_data WHERE CREW_ID_V = :crew_id GROUP BY MONTH ORDER BY MONTH",
         "3": "SELECT NH_DATES, SUM(NH) AS NH_COUNT FROM full_data WHERE {where} GROUP BY NH_DATES",
         "4": "SELECT DISTINCT SLOT_NUMBER_N, MONTH_HRS_FROM_DATE_D, MONTH_HRS_TO_DATE_D FROM full_data WHERE CREW_ID_V = :crew_id"
     }
 }
+
+
+# Plain-language descriptions of each template, used by intent.py to route
+# free-text questions straight to a template.
+template_descriptions = {
+    "1": {
+        "1": "sick leave",
+        "2": "absent absence days",
+        "3": "other non leave",
+        "4": "leave days taken availed",
+        "5": "total leave all leaves"
+    },
+    "2": {
+        "1": "total duty hours minutes worked",
+        "2": "run running duty minutes",
+        "3": "non run running duty minutes",
+        "4": "stationary duty",
+        "5": "spare duty minutes spare kms",
+        "6": "breach of rest bor",
+        "7": "night duty",
+        "8": "test training",
+        "9": "rra running room allowance",
+        "10": "tentative flag",
+        "11": "shunting shunt duty count"
+    },
+    "3": {
+        "1": "total kms kilometres distance",
+        "2": "footplate foot plate kms",
+        "3": "freight goods kms",
+        "4": "nrda kms",
+        "5": "osra kms",
+        "6": "coach footplate kms coach run duty minutes",
+        "7": "off duty kms",
+        "8": "authorised leave kms alkm non leave",
+        "9": "alkm leave kms"
+    },
+    "4": {
+        "1": "number of trips",
+        "2": "trip count"
+    },
+    "5": {
+        "1": "crew name cadre designation mobile number hq profile",
+        "2": "au code pf code li id",
+        "3": "organisation type traction ipas alcohol flag",
+        "4": "inactive status reason",
+        "5": "validity valid from to dates",
+        "6": "employee number emp no crew base id"
+    },
+    "6": {
+        "1": "hq headquarters wise duty kms",
+        "2": "monthly month wise trend history duty kms trips",
+        "3": "national holiday nh dates count",
+        "4": "slot number month hours dates"
+    }
+}
@@ -0,0 +1,19 @@
+# responses.py
+import orjson
+from starlette.responses import Response
+
+from metrics import stage
+
+
+class ORJSONResponse(Response):
+    """
+    JSON response rendered with orjson, timed as the "serialize" stage.
+    Endpoints return it directly, which also skips FastAPI's jsonable_encoder
+    pass over the result rows. Values orjson has no encoding for (Decimal,
+    bytes, other objects) are sent as their str().
+    """
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        with stage("serialize"):
+            return orjson.dumps(content, default=str, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
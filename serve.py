@@ -0,0 +1,178 @@
+# serve.py
+# Production launcher: loads the T5 model, tokenizer, mileage frame and data
+# snapshot once in this process, then forks the uvicorn workers, which share
+# those pages copy-on-write instead of each loading their own copy. Reports
+# RSS / PSS per process from /proc so the savings can be checked.
+#
+#   python serve.py --workers 4 --port 8000
+#
+# Needs fork() (Linux/macOS). On Windows run `uvicorn unified_main:app --workers N`.
+import argparse
+import gc
+import importlib
+import os
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+
+
+def memory_mb(pid: int) -> dict | None:
+    """
+    RSS, PSS, shared and private memory of a process in MB (Linux smaps_rollup).
+    PSS splits each shared page between the processes mapping it, so the PSS
+    of all workers adds up to what they really use together.
+    """
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line and not line[0].isdigit())
+    except OSError:
+        return None
+    kb = {name: int(value.split()[0]) for name, value in fields.items()}
+    return {
+        "rss": kb.get("Rss", 0) / 1024,
+        "pss": kb.get("Pss", 0) / 1024,
+        "shared": (kb.get("Shared_Clean", 0) + kb.get("Shared_Dirty", 0)) / 1024,
+        "private": (kb.get("Private_Clean", 0) + kb.get("Private_Dirty", 0)) / 1024,
+    }
+
+
+def report(parent: int, workers: list[int]):
+    rows = [("parent", parent)] + [(f"worker {i}", pid) for i, pid in enumerate(workers)]
+    print(f"[serve] {'process':10s} {'pid':>7s} {'rss_mb':>8s} {'pss_mb':>8s} {'shared_mb':>10s} {'private_mb':>11s}")
+    total_rss = total_pss = 0.0
+    for name, pid in rows:
+        mem = memory_mb(pid)
+        if mem is None:
+            continue
+        total_rss += mem["rss"]
+        total_pss += mem["pss"]
+        print(f"[serve] {name:10s} {pid:7d} {mem['rss']:8.1f} {mem['pss']:8.1f} "
+              f"{mem['shared']:10.1f} {mem['private']:11.1f}")
+    print(f"[serve] total RSS {total_rss:.1f} MB, total PSS {total_pss:.1f} MB "
+          f"({total_rss - total_pss:.1f} MB counted more than once by RSS)")
+
+
+def preload(app_path: str):
+    """
+    Import the app and load everything its startup handlers would otherwise
+    load in each worker. Their later startup calls find it already loaded.
+    """
+    module_name, _, attr = app_path.partition(":")
+    app = getattr(importlib.import_module(module_name), attr)
+    # Only the CMS chat app imports db; the model app imports nlp_model for its MODEL_DIR alone.
+    if "db" in sys.modules:
+        import db
+        import nlp_model
+
+        db.load()
+        nlp_model.load_model(db.columns)
+    if "model.api_with_model" in sys.modules:
+        from model import api_with_model
+
+        api_with_model.load_resources()
+    # Move everything loaded so far out of the collector's reach: the GC would
+    # otherwise write to those objects' headers in every worker and un-share their pages.
+    gc.collect()
+    gc.freeze()
+    return app
+
+
+def bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock: socket.socket, torch_threads: int, log_level: str):
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    if torch_threads and "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(torch_threads)
+    server = uvicorn.Server(uvicorn.Config(app, log_level=log_level))
+    server.run(sockets=[sock])
+
+
+def spawn(app, sock, args) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            if "db" in sys.modules:
+                sys.modules["db"]._reopen_after_fork()
+            run_worker(app, sock, args.torch_threads, args.log_level)
+        except BaseException as e:
+            print(f"[serve] worker {os.getpid()} failed: {e}")
+            code = 1
+        os._exit(code)
+    return pid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Preload the app, then fork uvicorn workers that share it")
+    parser.add_argument("--app", default="unified_main:app")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--torch-threads", type=int, default=0,
+                        help="PyTorch threads per worker (default: cores / workers)")
+    parser.add_argument("--report-interval", type=float, default=60,
+                        help="Seconds between memory reports (0 = only once, after startup)")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    if not hasattr(os, "fork"):
+        sys.exit("serve.py needs fork(); on Windows run `uvicorn unified_main:app --workers N` instead")
+    if not args.torch_threads:
+        args.torch_threads = max(1, (os.cpu_count() or 1) // args.workers)
+
+    start = time.perf_counter()
+    app = preload(args.app)
+    print(f"[serve] Preloaded {args.app} in {time.perf_counter() - start:.1f}s")
+    sock = bind(args.host, args.port)
+    workers = [spawn(app, sock, args) for _ in range(args.workers)]
+    print(f"[serve] Listening on http://{args.host}:{args.port} with {len(workers)} workers")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    next_report = time.monotonic() + (args.report_interval or 10)
+    while workers:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid in workers:
+            index = workers.index(pid)
+            if stopping:
+                workers.pop(index)
+            else:
+                print(f"[serve] worker {pid} exited ({status}); starting a replacement")
+                workers[index] = spawn(app, sock, args)
+            continue
+        if pid:
+            continue
+        if next_report is not None and time.monotonic() >= next_report and not stopping:
+            report(os.getpid(), workers)
+            next_report = time.monotonic() + args.report_interval if args.report_interval else None
+        time.sleep(0.5)
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
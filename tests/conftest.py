@@ -0,0 +1,65 @@
+import sqlite3
+from contextlib import nullcontext
+
+import numpy as np
+import pytest
+
+import db
+from benchmarks.bench_suite import HQS, crew_ids, make_crew, make_mileage, make_slots, months_list
+from cube import build_cube
+
+CREWS = 6
+MONTHS = 3
+
+
+def synthetic_sources(rows: int = 72, seed: int = 0):
+    """
+    (mileage sheets, crew biodata, slot data) shaped like the workbooks, from
+    the benchmark's synthetic generators: every crew has rows in every month.
+    """
+    periods = months_list(MONTHS)
+    crew = make_crew(crew_ids(CREWS), np.random.default_rng(seed))
+    mileage = make_mileage(0, rows, crew["CREW_ID_V"].to_numpy(dtype=object),
+                           crew["EMP_NO_V"].to_numpy(dtype=object), periods, seed)
+    sheets = {hq: mileage[mileage["HQ_CODE_C"] == hq].reset_index(drop=True) for hq in HQS}
+    return sheets, crew, make_slots(periods)
+
+
+@pytest.fixture
+def full_data_conn():
+    """
+    In-memory database with full_data, its indexes and the cube, as a snapshot has them.
+    """
+    sheets, crew, slots = synthetic_sources()
+    conn = sqlite3.connect(":memory:")
+    db.merge_frames(list(sheets.items()), crew, slots).to_sql("full_data", conn, index=False)
+    db.create_indexes(conn)
+    build_cube(conn)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def client():
+    """
+    TestClient for main.app with a valid bearer token. Startup hooks do not
+    run, so the snapshot and the model are only loaded if a test needs them.
+    """
+    from fastapi.testclient import TestClient
+
+    from auth import create_access_token
+    from main import app
+
+    client = TestClient(app)
+    client.headers["Authorization"] = f"Bearer {create_access_token({'sub': 'admin'})}"
+    return client
+
+
+@pytest.fixture
+def serve_from(monkeypatch):
+    """
+    serve_from(conn) routes db.read_connection() to `conn`.
+    """
+    def route(conn):
+        monkeypatch.setattr(db, "read_connection", lambda: nullcontext(conn))
+    return route
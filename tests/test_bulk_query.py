@@ -0,0 +1,69 @@
+from contextlib import nullcontext
+
+import orjson
+import pytest
+from fastapi import HTTPException
+
+import db
+from query_logic import MONTH_WHERE, bulk_query_sql, run_bulk_query
+from query_templates import query_templates
+
+
+def _rows(conn, sql, params):
+    cursor = conn.execute(sql, params)
+    return [dict(zip([d[0] for d in cursor.description], row)) for row in cursor]
+
+
+def _per_crew(conn, domain, sub, crew_ids, month):
+    """
+    The rows N single-crew template queries would return, tagged with the crew.
+    """
+    sql = query_templates[domain][sub].replace("{where}", MONTH_WHERE)
+    return [{"CREW_ID_V": crew_id, **row} for crew_id in sorted(crew_ids)
+            for row in _rows(conn, sql, {"crew_id": crew_id, "month": month})]
+
+
+def test_bulk_by_crew_ids_matches_single_crew_queries(full_data_conn):
+    crew_ids = [row[0] for row in full_data_conn.execute("SELECT DISTINCT CREW_ID_V FROM full_data ORDER BY 1")]
+    month = full_data_conn.execute("SELECT MAX(MONTH) FROM full_data").fetchone()[0]
+    wanted = crew_ids[::2]
+    for domain, sub in [("3", "1"), ("2", "5"), ("6", "3")]:
+        sql, params = bulk_query_sql(domain, sub, month, wanted + ["NOBODY"], None)
+        # One bound parameter however many crew IDs are asked for.
+        assert set(params) == {"month", "crew_ids"} and orjson.loads(params["crew_ids"]) == wanted + ["NOBODY"]
+        assert _rows(full_data_conn, sql, params) == pytest.approx(_per_crew(full_data_conn, domain, sub, wanted, month))
+
+
+def test_bulk_by_hq_covers_every_crew_at_the_hq(full_data_conn):
+    month = full_data_conn.execute("SELECT MIN(MONTH) FROM full_data").fetchone()[0]
+    tdl = [row[0] for row in full_data_conn.execute(
+        "SELECT DISTINCT CREW_ID_V FROM full_data WHERE HQ_CODE_C = 'TDL' AND MONTH = ?", (month,))]
+    assert tdl
+    sql, params = bulk_query_sql("2", "7", month, [], "TDL")
+    assert params == {"month": month, "hq_code": "TDL"}
+    rows = _rows(full_data_conn, sql, params)
+    assert [row["CREW_ID_V"] for row in rows] == sorted(tdl)
+    assert rows == _per_crew(full_data_conn, "2", "7", tdl, month)
+
+
+@pytest.mark.parametrize("args, detail", [
+    (("3", "1", "2025-06", ["TDL1000"], "TDL"), "Give either crew_ids or hq_code"),
+    (("3", "1", "2025-06", [], None), "Give either crew_ids or hq_code"),
+    (("3", "1", None, ["TDL1000"], None), "Month is required for this query"),
+    (("5", "1", "2025-06", ["TDL1000"], None), "Bulk queries support monthly templates only"),
+    (("9", "1", "2025-06", ["TDL1000"], None), "Invalid domain"),
+])
+def test_bulk_rejects_bad_requests(args, detail):
+    with pytest.raises(HTTPException) as info:
+        bulk_query_sql(*args)
+    assert info.value.status_code == 400
+    assert info.value.detail == detail
+
+
+def test_run_bulk_query_streams_ndjson(full_data_conn, monkeypatch):
+    monkeypatch.setattr(db, "read_connection", lambda: nullcontext(full_data_conn))
+    month = full_data_conn.execute("SELECT MAX(MONTH) FROM full_data").fetchone()[0]
+    lines = list(run_bulk_query("3", "1", month, [], "BSP"))
+    assert lines and all(line.endswith("\n") for line in lines)
+    sql, params = bulk_query_sql("3", "1", month, [], "BSP")
+    assert [orjson.loads(line) for line in lines] == _rows(full_data_conn, sql, params)
@@ -0,0 +1,121 @@
+import random
+
+import pytest
+
+from model.constrained import SQLGrammar, sql_pattern
+from model.generate_training_data import generate_examples, generate_sql_query
+
+COLUMNS = ["CREW_ID_V", "HQ_CODE_C", "TOTAL_KMS", "NGHT", "SOURCE_SHEET"]
+
+
+@pytest.fixture(scope="module")
+def tokenizer():
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers, processors, trainers
+    from transformers import PreTrainedTokenizerFast
+
+    corpus = [e["output"] for e in generate_examples(500, random.Random(0))] + [" ".join(COLUMNS)]
+    backend = Tokenizer(models.Unigram())
+    backend.pre_tokenizer = pre_tokenizers.Metaspace()
+    backend.decoder = decoders.Metaspace()
+    backend.train_from_iterator(corpus, trainers.UnigramTrainer(
+        vocab_size=300, special_tokens=["<pad>", "</s>", "<unk>"], unk_token="<unk>"))
+    backend.post_processor = processors.TemplateProcessing(single="$A </s>", special_tokens=[("</s>", 1)])
+    return PreTrainedTokenizerFast(tokenizer_object=backend, pad_token="<pad>", eos_token="</s>", unk_token="<unk>")
+
+
+@pytest.fixture(scope="module")
+def grammar(tokenizer):
+    return SQLGrammar(tokenizer, COLUMNS)
+
+
+def test_sql_pattern_accepts_training_statements():
+    pattern = sql_pattern()
+    for example in generate_examples(300, random.Random(1)):
+        assert pattern.match(example["output"]), example["output"]
+
+
+def test_sql_pattern_rejects_malformed_statements():
+    pattern = sql_pattern(COLUMNS)
+    valid = generate_sql_query({"select_column": "TOTAL_KMS", "hq_code": "TDL", "min_value": 100,
+                                "max_value": 900, "sort_by": "TOTAL_DUTY", "sort_order": "DESC"})
+    assert pattern.match(valid)
+    for sql in [
+        valid[:-1],                                           # no ';'
+        "SELECT TOTAL_KMS;",                                  # no FROM
+        "SELECT FROM TDL_MILEAGE_DATA;",                      # no column
+        "SELECT TOTAL_KMS FROM TDL_MILEAGE_DATA WHERE;",      # empty WHERE
+        "SELECT TOTAL_KMS FROM OTHER_TABLE;",                 # unknown table
+        "SELECT UNKNOWN_COL FROM TDL_MILEAGE_DATA;",          # unknown column
+        "SELECT TOTAL_KMS FROM TDL_MILEAGE_DATA ORDER BY TOTAL_KMS;",  # no direction
+        "SELECT TOTAL_KMS FROM TDL_MILEAGE_DATA WHERE HQ_CODE_C = 'XYZ';",
+        "SELECT TOTAL_KMS FROM TDL_MILEAGE_DATA; DROP TABLE full_data;",
+    ]:
+        assert not pattern.match(sql), sql
+    assert pattern.match("SELECT NGHT FROM full_data WHERE NGHT >= 5;")
+
+
+def _walk(grammar, tokenizer, sql):
+    """Allowed tokens before each token of `sql`'s own tokenization, and after the last."""
+    ids = tokenizer(sql, add_special_tokens=False).input_ids
+    steps = [grammar.allowed_tokens(grammar.state(ids[:n])) for n in range(len(ids) + 1)]
+    return ids, steps
+
+
+def test_grammar_allows_every_token_of_valid_statements(grammar, tokenizer):
+    for example in generate_examples(100, random.Random(2)):
+        ids, steps = _walk(grammar, tokenizer, example["output"])
+        for token, allowed in zip(ids, steps):
+            assert token in allowed, (example["output"], tokenizer.convert_ids_to_tokens(token))
+        assert steps[-1] == [tokenizer.eos_token_id]
+
+
+def test_grammar_follows_statement_order(grammar, tokenizer):
+    def texts(prefix):
+        state = grammar.state(tokenizer(prefix, add_special_tokens=False).input_ids)
+        return {tokenizer.convert_ids_to_tokens(i).replace("▁", " ") for i in grammar.allowed_tokens(state)}
+
+    start = texts("")
+    assert start and all("SELECT ".startswith(t.lstrip()) or t.lstrip().startswith("SELECT ") for t in start)
+    # After the column only FROM can follow, not WHERE or ';'.
+    after_column = texts("SELECT TOTAL_KMS")
+    assert after_column and all(" FROM ".startswith(t) or t.startswith(" FROM ") for t in after_column)
+    # After the table: WHERE, ORDER BY or the end.
+    after_table = texts("SELECT TOTAL_KMS FROM TDL_MILEAGE_DATA")
+    assert any(t.startswith(";") for t in after_table)
+    assert not any(t.strip().startswith("SELECT") for t in after_table)
+    # Numbers only where a number goes.
+    assert all(t.strip().isdigit() for t in texts("SELECT TOTAL_KMS FROM CREW_MILEAGE_DATA WHERE TOTAL_KMS >= "))
+    # Real columns from the schema are allowed, unknown ones are not.
+    assert grammar.state(tokenizer("SELECT SOURCE_SHEET", add_special_tokens=False).input_ids)
+    assert not grammar.state(tokenizer("SELECT SOURCE_SHEETS", add_special_tokens=False).input_ids)
+
+
+def test_grammar_stop_ids_and_kwargs(grammar, tokenizer):
+    assert grammar.stop_ids[0] == tokenizer.eos_token_id
+    pieces = {i: tokenizer.convert_ids_to_tokens(i) for i in grammar.stop_ids[1:]}
+    assert pieces and all(piece.endswith(";") for piece in pieces.values())
+    assert {i for i, t in enumerate(tokenizer.convert_ids_to_tokens(list(range(len(tokenizer)))))
+            if t.endswith(";")} == set(pieces)
+    kwargs = grammar.generate_kwargs()
+    assert kwargs["eos_token_id"] == grammar.stop_ids
+    longest = "SELECT SOURCE_SHEET FROM CREW_MILEAGE_DATA WHERE HQ_CODE_C = 'TDL' " \
+              "AND SOURCE_SHEET BETWEEN 100000 AND 100000 ORDER BY SOURCE_SHEET DESC;"
+    assert kwargs["max_new_tokens"] >= len(tokenizer(longest).input_ids)
+
+
+def test_constrained_generation_stays_in_grammar(grammar, tokenizer):
+    import torch
+    from transformers import T5Config, T5ForConditionalGeneration
+
+    torch.manual_seed(0)
+    model = T5ForConditionalGeneration(T5Config(
+        vocab_size=len(tokenizer), d_model=32, d_ff=64, num_layers=1, num_heads=2, d_kv=16,
+        decoder_start_token_id=0, pad_token_id=0, eos_token_id=1))
+    inputs = tokenizer(["total kms in TDL", "night duty"], return_tensors="pt", padding=True)
+    with torch.no_grad():
+        outputs = model.generate(**inputs, num_beams=2, **grammar.generate_kwargs())
+    for row in outputs.tolist():
+        state = grammar.state(row[1:])
+        # Either a complete statement, or cut off by max_new_tokens while still a valid prefix.
+        sql = tokenizer.decode(row, skip_special_tokens=True)
+        assert grammar.is_valid(sql) or (state and len(row) - 1 >= grammar.max_new_tokens), sql
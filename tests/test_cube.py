@@ -0,0 +1,60 @@
+import pytest
+
+from cube import Cube, cube_spec, parse_sum_template, refresh_cube
+from query_logic import MONTH_WHERE
+from query_templates import query_templates
+
+
+def _sql_rows(conn, domain, sub, crew_id, month):
+    cursor = conn.execute(query_templates[domain][sub].replace("{where}", MONTH_WHERE),
+                          {"crew_id": crew_id, "month": month})
+    return [dict(zip([d[0] for d in cursor.description], row)) for row in cursor]
+
+
+def test_parse_sum_template():
+    assert parse_sum_template(query_templates["2"]["5"]) == [
+        ("SPARE_DUTY_MINS_N", "SPARE_DUTY_MINS"), ("SPARE_KMS_N", "SPARE_KMS")]
+    assert parse_sum_template(query_templates["3"]["3"]) == [("TOTAL_KMS - COALESCE(FOOT_PLT_KM, 0)", "FREIGHT_KMS")]
+    assert parse_sum_template(query_templates["2"]["10"]) is None
+
+
+def test_cube_matches_sql_sums(full_data_conn):
+    cube = Cube(full_data_conn)
+    _, served = cube_spec()
+    assert ("3", "1") in served and ("2", "10") not in served
+    pairs = full_data_conn.execute("SELECT DISTINCT CREW_ID_V, MONTH FROM full_data ORDER BY 1, 2").fetchall()
+    assert len(pairs) > 1
+    for crew_id, month in pairs[:4]:
+        for domain, sub in served:
+            expected = _sql_rows(full_data_conn, domain, sub, crew_id, month)
+            got = cube.lookup(domain, sub, crew_id, month)
+            assert len(got) == len(expected) == 1
+            assert list(got[0]) == list(expected[0])
+            assert got[0] == pytest.approx(expected[0]), (domain, sub, crew_id, month)
+
+
+def test_cube_miss_is_a_null_row_like_sql(full_data_conn):
+    cube = Cube(full_data_conn)
+    crew_id = full_data_conn.execute("SELECT CREW_ID_V FROM full_data LIMIT 1").fetchone()[0]
+    for crew, month in [(crew_id, "1999-01"), ("NOBODY", "2025-06")]:
+        for domain, sub in [("1", "5"), ("2", "5"), ("3", "1")]:
+            expected = _sql_rows(full_data_conn, domain, sub, crew, month)
+            assert all(v is None for v in expected[0].values())
+            assert cube.lookup(domain, sub, crew, month) == expected
+
+
+def test_cube_does_not_serve_other_templates(full_data_conn):
+    cube = Cube(full_data_conn)
+    assert not cube.serves("2", "10")
+    assert cube.lookup("2", "10", "TDL1000", "2025-06") is None
+
+
+def test_refresh_cube_follows_changed_month(full_data_conn):
+    crew_id, month = full_data_conn.execute("SELECT CREW_ID_V, MONTH FROM full_data LIMIT 1").fetchone()
+    full_data_conn.execute("UPDATE full_data SET TOTAL_KMS = TOTAL_KMS + 10 WHERE CREW_ID_V = ? AND MONTH = ?",
+                           (crew_id, month))
+    stale = Cube(full_data_conn).lookup("3", "1", crew_id, month)
+    refresh_cube(full_data_conn, [month])
+    fresh = Cube(full_data_conn).lookup("3", "1", crew_id, month)
+    assert fresh == _sql_rows(full_data_conn, "3", "1", crew_id, month)
+    assert fresh[0]["TOTAL_KMS"] > stale[0]["TOTAL_KMS"]
@@ -0,0 +1,40 @@
+import os
+import subprocess
+import sys
+
+import db
+import main
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Importing db (and the app on top of it) must not open or build a snapshot:
+# spawned ingest workers re-import the main script. The first read of the
+# snapshot state does load it, which fails here as the data dir is empty.
+SCRIPT = """
+import db, main
+assert not set(db._SNAPSHOT_STATE) & set(vars(db)), sorted(set(db._SNAPSHOT_STATE) & set(vars(db)))
+try:
+    db.columns
+except FileNotFoundError:
+    print("loaded on first use")
+"""
+
+
+def test_import_builds_nothing(tmp_path):
+    data_dir, snapshot_dir = tmp_path / "data", tmp_path / "snapshots"
+    data_dir.mkdir()
+    env = {**os.environ, "CMS_DATA_DIR": str(data_dir), "CMS_SNAPSHOT_DIR": str(snapshot_dir), "PYTHONPATH": ROOT}
+    env.pop("CMS_SNAPSHOT_FILE", None)
+    proc = subprocess.run([sys.executable, "-c", SCRIPT], cwd=ROOT, env=env, capture_output=True, text=True, timeout=300)
+    assert proc.returncode == 0, proc.stderr
+    assert proc.stdout.strip().splitlines()[-1] == "loaded on first use"
+    assert not os.listdir(data_dir) and not snapshot_dir.exists()
+
+
+def test_startup_loads_the_snapshot_before_the_model(monkeypatch):
+    calls = []
+    monkeypatch.setitem(vars(db), "columns", ["CREW_ID_V", "TOTAL_KMS"])
+    monkeypatch.setattr(db, "load", lambda: calls.append("load"))
+    monkeypatch.setattr(main, "start_background_load", lambda columns: calls.append(("model", columns)))
+    main.start_model_loading()
+    assert calls == ["load", ("model", ["CREW_ID_V", "TOTAL_KMS"])]
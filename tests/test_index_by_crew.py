@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+
+from model.api_with_model import index_by_crew
+
+
+def test_index_by_crew_groups_rows_in_original_order():
+    df = pd.DataFrame({"CREW_ID_V": ["B", "A", "B", "A"], "TOTAL_KMS": [1, 2, 3, 4]})
+    df, index = index_by_crew(df)
+    assert set(index) == {"A", "B"}
+    assert df.iloc[index["A"]]["TOTAL_KMS"].tolist() == [2, 4]
+    assert df.iloc[index["B"]]["TOTAL_KMS"].tolist() == [1, 3]
+
+
+def test_index_by_crew_skips_missing_crew_ids():
+    df = pd.DataFrame({"CREW_ID_V": ["B", np.nan, "A", "B", None], "TOTAL_KMS": [1, 2, 3, 4, 5]})
+    df, index = index_by_crew(df)
+    assert set(index) == {"A", "B"}
+    assert df.iloc[index["A"]]["TOTAL_KMS"].tolist() == [3]
+    assert df.iloc[index["B"]]["TOTAL_KMS"].tolist() == [1, 4]
+    assert len(df) == 5
+
+
+def test_index_by_crew_all_missing():
+    df = pd.DataFrame({"CREW_ID_V": pd.Categorical([np.nan, np.nan], categories=["A"]), "TOTAL_KMS": [1, 2]})
+    assert index_by_crew(df)[1] == {}
+
+
+def test_index_by_crew_empty():
+    df = pd.DataFrame({"CREW_ID_V": pd.Series([], dtype="category"), "TOTAL_KMS": pd.Series([], dtype=int)})
+    assert index_by_crew(df)[1] == {}
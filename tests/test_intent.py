@@ -0,0 +1,49 @@
+import pytest
+
+from intent import IntentIndex, tokenize
+
+DESCRIPTIONS = {"1": {"1": "sick leave", "2": "leave days"}, "2": {"1": "night duty"}}
+
+
+def test_tokenize_maps_synonyms_and_plurals():
+    assert tokenize("How many kilometers did I do?") == ["kms"]
+    assert tokenize("my nights and absences") == ["night", "and", "absent"]
+
+
+def test_routes_clear_questions_to_templates():
+    index = IntentIndex()
+    assert index.classify("sick leave this month")[:2] == ("1", "1")
+    assert index.classify("how many night duty")[:2] == ("2", "7")
+    assert index.classify("my total kilometres")[:2] == ("3", "1")
+
+
+def test_ranking_and_filter_questions_go_to_the_model():
+    index = IntentIndex(threshold=0.0, margin=0.0)
+    for question in ["which crew has the most total kms", "crew with total duty above 500", "top night duty"]:
+        assert index.classify(question) is None
+
+
+def test_threshold():
+    score = IntentIndex(DESCRIPTIONS, threshold=0.0, margin=0.0).classify("night")[2]
+    assert 0 < score < 1
+    assert IntentIndex(DESCRIPTIONS, threshold=score, margin=0.0).classify("night")[:2] == ("2", "1")
+    assert IntentIndex(DESCRIPTIONS, threshold=score + 0.01, margin=0.0).classify("night") is None
+    # Nothing in common with any description.
+    assert IntentIndex(DESCRIPTIONS, margin=0.0).classify("pension") is None
+
+
+def test_margin_over_the_runner_up():
+    # "leave" scores the two leave templates equally: too close to call.
+    (best, _), (second, _) = IntentIndex(DESCRIPTIONS).scores("leave")[:2]
+    assert best == pytest.approx(second) and best >= 0.5
+    assert IntentIndex(DESCRIPTIONS, threshold=0.5, margin=0.1).classify("leave") is None
+    assert IntentIndex(DESCRIPTIONS, threshold=0.5, margin=0.0).classify("leave") is not None
+    # "sick leave" clears the margin.
+    assert IntentIndex(DESCRIPTIONS, threshold=0.5, margin=0.1).classify("sick leave")[:2] == ("1", "1")
+
+
+def test_hit_rate():
+    index = IntentIndex(DESCRIPTIONS)
+    index.classify("sick leave")
+    index.classify("leave")
+    assert index.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5}
@@ -0,0 +1,76 @@
+import re
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import metrics
+from metrics import Histogram, TimingMiddleware, metrics_response, record, stage
+
+
+@pytest.fixture
+def app():
+    app = FastAPI()
+    app.add_middleware(TimingMiddleware, name="timing-test")
+
+    @app.get("/items/{item_id}")
+    def item(item_id: int):
+        with stage("sql"):
+            time.sleep(0.002)
+        record("cube", 0.001)
+        with stage("sql"):
+            pass
+        return {"item_id": item_id}
+
+    return app
+
+
+def _header_stages(value):
+    return {name: float(dur) for name, dur in re.findall(r"(\w+);dur=([\d.]+)", value)}
+
+
+def test_server_timing_header_lists_stages_and_total(app):
+    response = TestClient(app).get("/items/1")
+    assert response.status_code == 200
+    header = response.headers["Server-Timing"]
+    assert [part.split(";")[0] for part in header.split(", ")] == ["sql", "cube", "total"]
+    stages = _header_stages(header)
+    assert stages["sql"] >= 2.0 and stages["cube"] == 1.0
+    assert stages["total"] >= stages["sql"]
+
+
+def test_server_timing_can_be_turned_off(app, monkeypatch):
+    monkeypatch.setattr(metrics, "SERVER_TIMING", False)
+    assert "Server-Timing" not in TestClient(app).get("/items/1").headers
+
+
+def test_requests_feed_histograms_by_route(app):
+    metrics.REQUEST_SECONDS.clear()
+    metrics.STAGE_SECONDS.clear()
+    client = TestClient(app)
+    client.get("/items/1")
+    client.get("/items/2")
+    client.get("/missing")
+    text = metrics_response().body.decode()
+    assert 'cms_request_duration_seconds_count{app="timing-test",endpoint="/items/{item_id}",method="GET",status="200"} 2' in text
+    assert 'cms_request_duration_seconds_count{app="timing-test",endpoint="unmatched",method="GET",status="404"} 1' in text
+    assert 'cms_stage_duration_seconds_count{app="timing-test",endpoint="/items/{item_id}",stage="sql"} 2' in text
+
+
+def test_main_app_sends_server_timing(client):
+    response = client.get("/cache/stats")
+    assert response.status_code == 200
+    assert "total" in _header_stages(response.headers["Server-Timing"])
+
+
+def test_histogram_buckets_are_cumulative():
+    hist = Histogram("h", "help", ("stage",), buckets=(0.1, 1.0))
+    for seconds in [0.05, 0.5, 0.5, 5.0]:
+        hist.observe(seconds, "sql")
+    lines = hist.render()
+    assert 'h_bucket{stage="sql",le="0.1"} 1' in lines
+    assert 'h_bucket{stage="sql",le="1.0"} 3' in lines
+    assert 'h_bucket{stage="sql",le="+Inf"} 4' in lines
+    assert 'h_count{stage="sql"} 4' in lines
+    assert lines[-2] == 'h_sum{stage="sql"} 6.05'
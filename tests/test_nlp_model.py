@@ -0,0 +1,22 @@
+import threading
+
+import nlp_model
+from nlp_model import BatchQueue, normalize_query
+
+
+def test_normalize_query_folds_case_and_spacing():
+    assert normalize_query("  Total KMS \n in TDL ") == normalize_query("total kms in tdl") == "total kms in tdl"
+
+
+def test_questions_differing_in_case_share_one_generate(monkeypatch):
+    calls = []
+    batcher = BatchQueue(lambda batch: calls.extend(batch) or [f"SQL {q}" for q in batch], 4, 1, name="test")
+    monkeypatch.setattr(nlp_model, "_batcher", batcher)
+    monkeypatch.setattr(nlp_model, "_sql_cache", nlp_model.OrderedDict())
+    monkeypatch.setattr(nlp_model, "_ready", threading.Event())
+    nlp_model._ready.set()
+    assert nlp_model.nl_to_sql("Total KMS in  TDL") == "SQL Total KMS in TDL"
+    assert nlp_model.nl_to_sql("total kms in tdl") == "SQL Total KMS in TDL"
+    # The model is given the question in its original case.
+    assert calls == ["Total KMS in TDL"]
+    assert batcher._worker.name == "test-batcher"
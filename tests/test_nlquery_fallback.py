@@ -0,0 +1,20 @@
+import logging
+
+from fastapi import HTTPException
+
+import main
+
+
+def test_model_failure_is_logged_and_falls_back_to_keywords(client, monkeypatch, caplog):
+    def fail(nl):
+        raise HTTPException(status_code=422, detail="Generated SQL is outside the supported grammar")
+
+    monkeypatch.setattr(main, "classify", lambda text: None)
+    monkeypatch.setattr(main, "model_ready", lambda: True)
+    monkeypatch.setattr(main, "run_nl_query", fail)
+    monkeypatch.setattr(main, "run_dynamic_query", lambda domain, sub, crew_id, month: [{"template": [domain, sub]}])
+    with caplog.at_level(logging.DEBUG, logger="main"):
+        response = client.post("/nlquery", json={"crew_id": "TDL1000", "month": "2025-06", "query": "night hours"})
+    assert response.status_code == 200
+    assert response.json() == [{"template": ["2", "7"]}]
+    assert "run_nl_query failed" in caplog.text and "outside the supported grammar" in caplog.text
@@ -0,0 +1,71 @@
+import sqlite3
+import threading
+
+import pytest
+
+import db
+
+
+def _snapshot(path, rows=3):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE full_data (CREW_ID_V TEXT, TOTAL_KMS INTEGER)")
+    conn.executemany("INSERT INTO full_data VALUES (?, ?)", [(f"TDL{1000 + i}", i) for i in range(rows)])
+    conn.commit()
+    conn.close()
+    return str(path)
+
+
+def _file(conn):
+    return conn.execute("PRAGMA database_list").fetchone()[2]
+
+
+def test_connections_are_read_only_and_not_shared(tmp_path):
+    pool = db.ReadPool(_snapshot(tmp_path / "a.sqlite"), size=2)
+    with pool.connection() as first, pool.connection() as second:
+        assert first is not second
+        assert first.execute("SELECT COUNT(*) FROM full_data").fetchone() == (3,)
+        with pytest.raises(sqlite3.OperationalError):
+            second.execute("DELETE FROM full_data")
+    pool.close()
+
+
+def test_close_waits_for_borrowed_connections(tmp_path):
+    pool = db.ReadPool(_snapshot(tmp_path / "a.sqlite"), size=2)
+    closed = []
+    with pool.connection() as conn:
+        pool.close(lambda: closed.append(True))
+        # The reader holding a connection finishes its query on the old file.
+        assert not closed
+        assert conn.execute("SELECT COUNT(*) FROM full_data").fetchone() == (3,)
+    assert closed == [True]
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.execute("SELECT 1")
+
+
+def test_close_with_nothing_borrowed_calls_back_at_once(tmp_path):
+    pool = db.ReadPool(_snapshot(tmp_path / "a.sqlite"), size=1)
+    closed = []
+    pool.close(lambda: closed.append(True))
+    assert closed == [True]
+
+
+def test_waiting_reader_moves_to_the_replacement_pool(tmp_path, monkeypatch):
+    old = db.ReadPool(_snapshot(tmp_path / "old.sqlite"), size=1)
+    new = db.ReadPool(_snapshot(tmp_path / "new.sqlite", rows=5), size=1)
+    monkeypatch.setitem(vars(db), "pool", new)
+    seen = []
+
+    def reader():
+        with old.connection() as conn:
+            seen.append((_file(conn), conn.execute("SELECT COUNT(*) FROM full_data").fetchone()[0]))
+
+    with old.connection():
+        thread = threading.Thread(target=reader)
+        thread.start()
+        # The only connection is borrowed, so the reader waits until close() releases it.
+        thread.join(0.1)
+        assert thread.is_alive()
+        old.close()
+        thread.join(5)
+    assert seen == [(str((tmp_path / "new.sqlite").resolve()), 5)]
+    new.close()
@@ -0,0 +1,93 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pandas as pd
+
+from conftest import synthetic_sources
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loads the snapshot for the workbooks in CMS_DATA_DIR, swaps in the mileage
+# workbook given as argv[1], refreshes, and prints both versions and the result.
+SCRIPT = """
+import json, shutil, sys
+import db
+db.load()
+first = db.data_version
+shutil.copy(sys.argv[1], db.MILEAGE_FILE)
+result = db.refresh()
+print(json.dumps({"first": first, "result": result, "again": db.refresh()["mode"]}))
+"""
+
+
+def _write_mileage(path, sheets):
+    with pd.ExcelWriter(path) as writer:
+        for sheet, df in sheets.items():
+            df.to_excel(writer, sheet_name=sheet, index=False)
+
+
+def _snapshot_rows(path, sql, params=()):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+
+def test_refresh_rebuilds_only_changed_months(tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    sheets, crew, slots = synthetic_sources()
+    _write_mileage(data_dir / "1_TDL_BSP_5Month_MILEAGE_DATA.xlsx", sheets)
+    crew.to_excel(data_dir / "1_TDL_BSP_Crew_Biodata.xlsx", index=False)
+    slots.to_excel(data_dir / "Month_SLOT_DATA.xlsx", index=False)
+
+    # New export: more TDL kilometres in the last month, the first BSP month withdrawn.
+    months = {sheet: pd.to_datetime(df["DATE_TIME_D"]).dt.strftime("%Y-%m") for sheet, df in sheets.items()}
+    first, last = min(months["TDL"]), max(months["TDL"])
+    tdl = sheets["TDL"].copy()
+    tdl.loc[months["TDL"] == last, "TOTAL_KMS"] += 100
+    bsp = sheets["BSP"][months["BSP"] != first]
+    _write_mileage(tmp_path / "new_mileage.xlsx", {"TDL": tdl, "BSP": bsp})
+
+    env = {**os.environ, "CMS_DATA_DIR": str(data_dir), "CMS_INGEST_WORKERS": "0", "PYTHONPATH": ROOT}
+    env.pop("CMS_SNAPSHOT_FILE", None)
+    env.pop("CMS_SNAPSHOT_DIR", None)
+    proc = subprocess.run([sys.executable, "-c", SCRIPT, str(tmp_path / "new_mileage.xlsx")],
+                          cwd=ROOT, env=env, capture_output=True, text=True, timeout=300)
+    assert proc.returncode == 0, proc.stderr
+    out = json.loads(proc.stdout.strip().splitlines()[-1])
+    result = out["result"]
+
+    assert result["mode"] == "incremental"
+    assert result["previous"] == out["first"] != result["version"]
+    assert result["changed"] == [["TDL", last]]
+    assert result["removed"] == [["BSP", first]]
+    assert out["again"] == "none"
+
+    snapshots = data_dir / "snapshots"
+    assert (snapshots / "CURRENT").read_text() == result["version"]
+    old_path = str(snapshots / f"full_data_{out['first']}.sqlite")
+    new_path = str(snapshots / f"full_data_{result['version']}.sqlite")
+    manifest = "SELECT SHEET, MONTH, ROW_HASH, ROWS FROM ingest_manifest ORDER BY SHEET, MONTH"
+    old_manifest = {(s, m): (h, n) for s, m, h, n in _snapshot_rows(old_path, manifest)}
+    new_manifest = {(s, m): (h, n) for s, m, h, n in _snapshot_rows(new_path, manifest)}
+    assert set(new_manifest) == set(old_manifest) - {("BSP", first)}
+    assert new_manifest[("TDL", last)][0] != old_manifest[("TDL", last)][0]
+    assert all(new_manifest[key] == old_manifest[key] for key in new_manifest if key != ("TDL", last))
+
+    group_kms = "SELECT SUM(TOTAL_KMS), COUNT(*) FROM full_data WHERE SOURCE_SHEET = ? AND MONTH = ?"
+    old_kms, rows = _snapshot_rows(old_path, group_kms, ("TDL", last))[0]
+    assert _snapshot_rows(new_path, group_kms, ("TDL", last))[0] == (old_kms + 100 * rows, rows)
+    assert _snapshot_rows(new_path, group_kms, ("BSP", first))[0] == (None, 0)
+    # Unchanged groups keep their rows, and the cube follows full_data.
+    for key in [("TDL", first), ("BSP", last)]:
+        assert _snapshot_rows(new_path, group_kms, key) == _snapshot_rows(old_path, group_kms, key)
+    cube_vs_sql = ("SELECT c.TOTAL_KMS, (SELECT SUM(TOTAL_KMS) FROM full_data f "
+                   "WHERE f.CREW_ID_V = c.CREW_ID_V AND f.MONTH = c.MONTH) FROM crew_month_cube c")
+    assert all(cube == sql for cube, sql in _snapshot_rows(new_path, cube_vs_sql))
+    assert not _snapshot_rows(new_path, "SELECT 1 FROM crew_month_cube c WHERE c.MONTH = ? AND c.CREW_ID_V IN "
+                              "(SELECT CREW_ID_V FROM crew_data WHERE HQ_CODE_C = 'BSP')", (first,))
@@ -0,0 +1,26 @@
+import datetime
+import decimal
+
+import numpy as np
+import orjson
+
+from responses import ORJSONResponse
+
+
+def test_orjson_response_falls_back_to_str():
+    body = ORJSONResponse([{
+        "amount": decimal.Decimal("12.50"),
+        "raw": b"abc",
+        "day": datetime.date(2025, 6, 1),
+        "kms": np.int64(7),
+        "row": np.array([1, 2]),
+        1: "int key",
+    }]).body
+    assert orjson.loads(body) == [{"amount": "12.50", "raw": "b'abc'", "day": "2025-06-01",
+                                   "kms": 7, "row": [1, 2], "1": "int key"}]
+
+
+def test_orjson_response_media_type():
+    response = ORJSONResponse({"ok": True})
+    assert response.media_type == "application/json"
+    assert response.headers["content-type"] == "application/json"
@@ -0,0 +1,68 @@
+import json
+
+from result_cache import ResultCache, cache_key
+
+
+def _size(value):
+    return len(json.dumps(value, default=str))
+
+
+def test_cache_key_normalizes_whitespace_and_param_order():
+    assert cache_key("SELECT  1\n FROM full_data", {"b": 2, "a": 1}) == cache_key("SELECT 1 FROM full_data", {"a": 1, "b": 2})
+    assert cache_key("SELECT 1", None) == cache_key("SELECT 1", {})
+    assert cache_key("SELECT 1", {"a": 1}) != cache_key("SELECT 1", {"a": 2})
+
+
+def test_hits_and_misses():
+    cache = ResultCache()
+    assert cache.get("k", "v1") is None
+    cache.put("k", "v1", [{"TOTAL_KMS": 10}])
+    assert cache.get("k", "v1") == [{"TOTAL_KMS": 10}]
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+    assert stats["hit_rate"] == 0.5
+
+
+def test_evicts_least_recently_used_by_entry_count():
+    cache = ResultCache(max_entries=2)
+    cache.put("a", "v1", [1])
+    cache.put("b", "v1", [2])
+    assert cache.get("a", "v1") == [1]  # "b" is now the least recently used
+    cache.put("c", "v1", [3])
+    assert cache.get("b", "v1") is None
+    assert cache.get("a", "v1") == [1] and cache.get("c", "v1") == [3]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_evicts_by_bytes_and_skips_oversized_values():
+    row = [{"CREW_ID_V": "TDL1000", "TOTAL_KMS": 1234}]
+    cache = ResultCache(max_bytes=2 * _size(row) + 1)
+    cache.put("a", "v1", row)
+    cache.put("b", "v1", row)
+    cache.put("c", "v1", row)
+    stats = cache.stats()
+    assert stats["entries"] == 2 and stats["bytes"] == 2 * _size(row) and stats["evictions"] == 1
+    assert cache.get("a", "v1") is None
+
+    cache.put("big", "v1", [row[0]] * 10)
+    assert cache.get("big", "v1") is None
+    assert cache.stats()["entries"] == 2
+
+
+def test_replacing_a_key_keeps_the_byte_count():
+    cache = ResultCache()
+    cache.put("a", "v1", [1, 2, 3])
+    cache.put("a", "v1", [1])
+    assert cache.stats()["bytes"] == _size([1])
+
+
+def test_version_change_drops_everything():
+    cache = ResultCache()
+    cache.put("a", "v1", [1])
+    cache.put("b", "v1", [2])
+    assert cache.get("a", "v2") is None
+    stats = cache.stats()
+    assert stats["version"] == "v2" and stats["entries"] == 0 and stats["bytes"] == 0
+    # Entries written under the new version are kept.
+    cache.put("a", "v2", [10])
+    assert cache.get("a", "v2") == [10]
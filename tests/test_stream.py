@@ -0,0 +1,79 @@
+import base64
+
+import orjson
+import pytest
+from fastapi import HTTPException
+
+import query_logic
+from query_logic import decode_cursor, encode_cursor, page_limit, stream_dynamic_query, stream_json
+
+
+def _pages(make_stream):
+    """
+    Follow next_cursor from the first page to the last; returns the parsed pages.
+    """
+    pages, cursor = [], None
+    while True:
+        page = orjson.loads(b"".join(make_stream(cursor)))
+        pages.append(page)
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+def test_cursor_round_trip():
+    for offset in [0, 1, 500, 10**9]:
+        assert decode_cursor(encode_cursor(offset)) == offset
+    assert decode_cursor(None) == 0 and decode_cursor("") == 0
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", base64.urlsafe_b64encode(b"ten").decode(),
+                                    base64.urlsafe_b64encode(b"-5").decode(), "/w=="])
+def test_invalid_cursor_is_400(cursor):
+    with pytest.raises(HTTPException) as info:
+        decode_cursor(cursor)
+    assert info.value.status_code == 400 and info.value.detail == "Invalid cursor"
+
+
+def test_page_limit(monkeypatch):
+    assert page_limit(None) is None and page_limit(10) == 10
+    with pytest.raises(HTTPException) as info:
+        page_limit(0)
+    assert info.value.status_code == 400
+    monkeypatch.setattr(query_logic, "MAX_STREAM_ROWS", 25)
+    assert page_limit(None) == 25 and page_limit(10) == 10 and page_limit(100) == 25
+
+
+def test_pages_cover_the_result_exactly_once(full_data_conn, serve_from, monkeypatch):
+    serve_from(full_data_conn)
+    # Several batches per page, and a last page that is not full.
+    monkeypatch.setattr(query_logic, "STREAM_BATCH_SIZE", 7)
+    sql = "SELECT CREW_ID_V, MONTH, TOTAL_KMS FROM full_data ORDER BY rowid"
+    pages = _pages(lambda cursor: stream_json(sql, {}, 20, decode_cursor(cursor), head={"sql": sql}))
+    assert [len(page["results"]) for page in pages] == [20, 20, 20, 12]
+    assert all(page["sql"] == sql for page in pages)
+    cursor = full_data_conn.execute(sql)
+    expected = [dict(zip([d[0] for d in cursor.description], row)) for row in cursor]
+    assert [row for page in pages for row in page["results"]] == expected
+
+
+def test_unlimited_stream_is_one_page(full_data_conn, serve_from):
+    serve_from(full_data_conn)
+    pages = _pages(lambda cursor: stream_json("SELECT CREW_ID_V FROM full_data;", {}, None, decode_cursor(cursor)))
+    assert len(pages) == 1 and len(pages[0]["results"]) == 72
+
+
+def test_template_stream_pages(full_data_conn, serve_from):
+    serve_from(full_data_conn)
+    crew_id = full_data_conn.execute("SELECT CREW_ID_V FROM full_data LIMIT 1").fetchone()[0]
+    pages = _pages(lambda cursor: stream_dynamic_query("6", "2", crew_id, "2025-06", limit=2, cursor=cursor))
+    assert [len(page["results"]) for page in pages] == [2, 1]
+    months = [row["MONTH"] for page in pages for row in page["results"]]
+    assert months == sorted(months) and len(set(months)) == 3
+
+
+def test_invalid_cursor_over_http_is_400(client):
+    response = client.post("/query", json={"crew_id": "TDL1000", "month": "2025-06", "domain": "3", "sub": "1",
+                                           "stream": True, "cursor": "not base64!"})
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Invalid cursor"}
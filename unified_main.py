@@ -1,4 +1,5 @@
 # unified_main.py
+import inspect
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -6,6 +7,7 @@ from fastapi.middleware.cors import CORSMiddleware
 # This assumes cmschat/main.py and model/main.py each have an 'app' instance.
 from cmschat.main import app as cmschat_app
 from model.api_with_model import app as uditi_app
+from model.registry import registry
 
 # Create the unified FastAPI app. This will be the main application instance
 # that the server (uvicorn) runs.
@@ -33,6 +35,35 @@ app.add_middleware(
 app.mount("/cmschat", cmschat_app)
 app.mount("/model", uditi_app)
 
+# Starlette does not run the startup/shutdown handlers of mounted apps, so
+# forward them. Both apps then get their model, tokenizer and data from
+# model.registry, which loads each one once for the whole process.
+async def run_handlers(handlers):
+    for handler in handlers:
+        result = handler()
+        if inspect.isawaitable(result):
+            await result
+
+
+@app.on_event("startup")
+async def start_mounted_apps():
+    for sub_app in (cmschat_app, uditi_app):
+        await run_handlers(sub_app.router.on_startup)
+
+
+@app.on_event("shutdown")
+async def stop_mounted_apps():
+    for sub_app in (cmschat_app, uditi_app):
+        await run_handlers(sub_app.router.on_shutdown)
+
+
+@app.get("/resources")
+def shared_resources():
+    """
+    What the shared registry currently holds and how many apps use each entry.
+    """
+    return registry.stats()
+
 # Root endpoint for the unified app. This is the endpoint that
 # shows the status and available sub-endpoints.
 @app.get("/")